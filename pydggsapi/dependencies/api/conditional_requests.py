@@ -0,0 +1,125 @@
+# Conditional requests (ETag / If-None-Match / Last-Modified / If-Modified-Since)
+#
+# The ETag is derived from the normalized request and the version tokens of the datasources of the collections
+# involved, so that a request can be answered with 304 before running any query.
+# The version tokens are cached for DATASOURCE_VERSION_TTL seconds (default 5) to avoid a lookup per request.
+# The format of the routes is negotiated with the Accept header, the validators are sent with 'Vary: Accept' (200 and
+# 304) so that the validators of a representation are not used for another one.
+
+from pydggsapi.schemas.api.collections import Collection
+from pydggsapi.schemas.api.collection_providers import CollectionProviderGetVersionReturn
+from pydggsapi.dependencies.collections_providers.abstract_collection_provider import AbstractCollectionProvider
+from pydggsapi.dependencies.api.response_cache import response_cache_key
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+from fastapi import Request, Response
+import threading
+import logging
+import time
+import os
+
+logger = logging.getLogger()
+
+_versions: Dict[Tuple[int, str], Tuple[float, Optional[CollectionProviderGetVersionReturn]]] = {}
+_versions_lock = threading.Lock()
+
+
+@dataclass
+class Validators:
+    etag: str
+    last_modified: Optional[datetime] = None
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        headers = {'ETag': self.etag, 'Vary': 'Accept'}
+        if (self.last_modified is not None):
+            headers['Last-Modified'] = format_datetime(self.last_modified.replace(microsecond=0), usegmt=True)
+        return headers
+
+
+def get_datasource_version(cp: AbstractCollectionProvider, datasource_id: str) -> Optional[CollectionProviderGetVersionReturn]:
+    ttl = float(os.environ.get('DATASOURCE_VERSION_TTL', 5))
+    key = (id(cp), datasource_id)
+    now = time.monotonic()
+    with _versions_lock:
+        cached = _versions.get(key)
+    if (cached is not None and cached[0] > now):
+        return cached[1]
+    try:
+        version = cp.get_version(datasource_id)
+    except Exception as e:
+        logger.warning(f'{__name__} {datasource_id} get version failed: {e}')
+        version = None
+    with _versions_lock:
+        _versions[key] = (now + ttl, version)
+    return version
+
+
+def get_collections_version(
+    collections: Dict[str, Collection],
+    collection_providers: Dict[str, AbstractCollectionProvider],
+) -> Optional[CollectionProviderGetVersionReturn]:
+    # combined version of the collections, None if any of them has no version
+    versions, last_modified = [], []
+    for cid in sorted(collections.keys()):
+        c = collections[cid].collection_provider
+        version = get_datasource_version(collection_providers[c.providerId], c.datasource_id)
+        if (version is None):
+            return None
+        versions.append((cid, version.version))
+        if (version.last_modified is not None):
+            last_modified.append(version.last_modified)
+    if (len(versions) == 0):
+        return None
+    return CollectionProviderGetVersionReturn(version=response_cache_key(*versions),
+                                              last_modified=max(last_modified) if (len(last_modified) > 0) else None)
+
+
+def get_validators(version: Optional[CollectionProviderGetVersionReturn], *request_parts: Any) -> Optional[Validators]:
+    if (version is None):
+        return None
+    etag = f'"{response_cache_key(version.version, *request_parts)[:32]}"'
+    return Validators(etag=etag, last_modified=version.last_modified)
+
+
+def _etag_match(if_none_match: str, etag: str) -> bool:
+    # weak comparison as required for If-None-Match
+    if (if_none_match.strip() == '*'):
+        return True
+    tags = [t.strip() for t in if_none_match.split(',')]
+    tags = [t[2:] if (t.startswith('W/')) else t for t in tags]
+    return etag in tags
+
+
+def not_modified(req: Request, validators: Optional[Validators]) -> Optional[Response]:
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110, 13.1.3)
+    if (validators is None):
+        return None
+    if_none_match = req.headers.get('if-none-match')
+    if (if_none_match is not None):
+        if (_etag_match(if_none_match, validators.etag)):
+            return Response(status_code=304, headers=validators.headers)
+        return None
+    if_modified_since = req.headers.get('if-modified-since')
+    if (if_modified_since is not None and validators.last_modified is not None):
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return None
+        since = since if (since.tzinfo is not None) else since.replace(tzinfo=timezone.utc)
+        if (validators.last_modified.replace(microsecond=0) <= since):
+            return Response(status_code=304, headers=validators.headers)
+    return None
+
+
+def set_validators(response: Response, validators: Optional[Validators]):
+    if (validators is not None):
+        headers = validators.headers
+        vary = [v.strip() for v in response.headers.get('vary', '').split(',') if (v.strip() != '')]
+        if ('accept' not in [v.lower() for v in vary]):
+            vary.append('Accept')
+        headers['Vary'] = ', '.join(vary)
+        response.headers.update(headers)
@@ -0,0 +1,180 @@
+# Bounded executor layer for the blocking parts of the API (DGGRID, DuckDB, ClickHouse, zarr ...)
+#
+# The heavy routes (zone-info, zones list and zones data) dispatch their work into a named pool instead of
+# running it on the event loop. Pools are named after the DGGRS provider class handling the request, so that
+# each provider type can be sized independently. The configuration is taken from the EXECUTOR_POOLS
+# environment variable (JSON), ex:
+#
+#   EXECUTOR_POOLS='{"default": {"workers": 8, "max_queue": 32},
+#                    "IGEO7Provider": {"workers": 4, "max_queue": 8, "process_workers": 2}}'
+#
+#   - workers         : number of threads of the pool
+#   - max_queue       : number of requests allowed to wait for a thread, further requests are rejected (503)
+#   - process_workers : size of the optional process pool (0 to disable), only for picklable CPU bound jobs, the
+#                       processes are started by a fork server (or spawned), not forked from the multithreaded server
+#   - retry_after     : value (seconds) of the Retry-After header returned with the 503 response
+#
+# The "fanout" pool runs the independent provider calls of an already admitted request concurrently
+# (ex. one get_data per collection and zone level), its queue is not bounded.
+
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+import multiprocessing
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import threading
+import asyncio
+import atexit
+import logging
+import json
+import os
+
+logger = logging.getLogger()
+
+default_pool_config = {
+    'default': {'workers': min(32, (os.cpu_count() or 1) + 4), 'max_queue': 64, 'process_workers': 0, 'retry_after': 1},
+    # DGGRID runs are limited by the DGGRID worker pool (DGGRID_WORKERS)
+    'IGEO7Provider': {'workers': 4},
+    'fanout': {'workers': 16},
+}
+fanout_pool_name = 'fanout'
+
+
+class ExecutorSaturatedError(Exception):
+
+    def __init__(self, name: str, retry_after: int):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f'executor pool {name} is saturated, retry after {retry_after}s')
+
+
+@dataclass
+class ExecutorPoolConfig:
+    workers: int = 4
+    max_queue: int = 64
+    process_workers: int = 0
+    retry_after: int = 1
+
+
+@dataclass
+class ExecutorPool:
+    name: str
+    config: ExecutorPoolConfig
+    inflight: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    thread_executor: Optional[ThreadPoolExecutor] = None
+    process_executor: Optional[ProcessPoolExecutor] = None
+
+    def __post_init__(self):
+        self.thread_executor = ThreadPoolExecutor(max_workers=self.config.workers,
+                                                  thread_name_prefix=f'pydggsapi-{self.name}')
+
+    @property
+    def capacity(self) -> int:
+        return self.config.workers + self.config.max_queue
+
+    def acquire(self):
+        with self.lock:
+            if (self.inflight >= self.capacity):
+                raise ExecutorSaturatedError(self.name, self.config.retry_after)
+            self.inflight += 1
+
+    def release(self):
+        with self.lock:
+            self.inflight -= 1
+
+    def get_process_executor(self) -> Optional[ProcessPoolExecutor]:
+        if (self.config.process_workers <= 0):
+            return None
+        with self.lock:
+            if (self.process_executor is None):
+                self.process_executor = ProcessPoolExecutor(max_workers=self.config.process_workers,
+                                                            mp_context=_process_context())
+        return self.process_executor
+
+    def shutdown(self):
+        self.thread_executor.shutdown(wait=False, cancel_futures=True)
+        if (self.process_executor is not None):
+            self.process_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _process_context() -> multiprocessing.context.BaseContext:
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if ('forkserver' in methods) else 'spawn')
+
+
+_pools: Dict[str, ExecutorPool] = {}
+_pools_lock = threading.Lock()
+_fanout_local = threading.local()
+
+
+def get_executor_pool_configs() -> Dict[str, Dict[str, Any]]:
+    configs = {k: v.copy() for k, v in default_pool_config.items()}
+    try:
+        user_configs = json.loads(os.environ.get('EXECUTOR_POOLS') or '{}')
+    except json.JSONDecodeError as e:
+        logger.error(f'{__name__} EXECUTOR_POOLS is not a valid JSON: {e}')
+        raise Exception(f'{__name__} EXECUTOR_POOLS is not a valid JSON: {e}')
+    for name, config in user_configs.items():
+        configs.setdefault(name, {}).update(config)
+    return configs
+
+
+def get_executor_pool(name: str) -> ExecutorPool:
+    with _pools_lock:
+        pool = _pools.get(name)
+        if (pool is None):
+            configs = get_executor_pool_configs()
+            config = configs['default'].copy()
+            config.update(configs.get(name, {}))
+            pool = ExecutorPool(name, ExecutorPoolConfig(**config))
+            logger.info(f'{__name__} executor pool {name} created with {pool.config}')
+            _pools[name] = pool
+        return pool
+
+
+def get_process_executor(name: str) -> Optional[Executor]:
+    return get_executor_pool(name).get_process_executor()
+
+
+async def run_in_executor(name: str, func: Callable, *args, **kwargs) -> Any:
+    pool = get_executor_pool(name)
+    pool.acquire()
+    try:
+        future = pool.thread_executor.submit(partial(func, *args, **kwargs))
+    except Exception:
+        pool.release()
+        raise
+    # released when the job completes, even if the request was cancelled in the meantime
+    future.add_done_callback(lambda f: pool.release())
+    return await asyncio.wrap_future(future)
+
+
+def _fan_out_task(func: Callable, args: tuple) -> Any:
+    _fanout_local.active = True
+    try:
+        return func(*args)
+    finally:
+        _fanout_local.active = False
+
+
+def fan_out(func: Callable, args_list: Iterable[tuple]) -> List[Any]:
+    # run func for each args concurrently, the results are returned in the same order as args_list.
+    args_list = list(args_list)
+    # nested fan-out runs inline, waiting on the same pool from its own workers could dead-lock
+    if (len(args_list) <= 1 or getattr(_fanout_local, 'active', False)):
+        return [func(*args) for args in args_list]
+    executor = get_executor_pool(fanout_pool_name).thread_executor
+    futures = [executor.submit(_fan_out_task, func, args) for args in args_list]
+    try:
+        return [f.result() for f in futures]
+    finally:
+        [f.cancel() for f in futures]
+
+
+@atexit.register
+def shutdown_executors():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown()
+        _pools.clear()
@@ -0,0 +1,236 @@
+# Zone presence index
+#
+# Optional index of the zones that have data, one compressed bitmap per collection and refinement level over the
+# uint64 zone keys (see AbstractDGGRSProvider.zone_id_keys). Zone queries without a CQL filter are answered from
+# the bitmap instead of querying the datasource. It is enabled per collection in the collection provider settings:
+#
+#   "presence_index": "prebuilt"  - the bitmaps are read from PRESENCE_INDEX_DIR, built offline with
+#                                   `pydggsapi-presence-index`, the datasource is queried for the missing ones
+#   "presence_index": "lazy"      - the missing or outdated bitmaps are built from the datasource on first use,
+#                                   and saved into PRESENCE_INDEX_DIR if set
+#
+# A bitmap is bound to the version of the datasource (AbstractCollectionProvider.get_version) it was built from,
+# the version is checked again every PRESENCE_INDEX_CHECK_INTERVAL seconds (default 60). A bitmap is checked or built
+# by one thread at a time, the other requests are meanwhile answered with the previous bitmap (or the datasource).
+#
+# The bitmaps follow the roaring layout: the keys are grouped by their upper 48 bits, each group stores the lower
+# 16 bits either as a sorted uint16 array (up to 4096 keys) or as a 65536 bits bitset.
+
+from pydggsapi.dependencies.collections_providers.abstract_collection_provider import AbstractCollectionProvider
+from pydggsapi.dependencies.dggrs_providers.abstract_dggrs_provider import AbstractDGGRSProvider
+from pydggsapi.schemas.api.collections import Collection
+
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import threading
+import argparse
+import logging
+import time
+import os
+
+logger = logging.getLogger()
+
+array_container_max = 4096
+bitset_bytes = 1 << 13
+
+
+class ZonePresenceBitmap:
+
+    def __init__(self, containers: np.ndarray, is_bitset: np.ndarray, array_values: np.ndarray,
+                 array_counts: np.ndarray, bitsets: np.ndarray, cardinality: int):
+        self.containers = containers        # sorted upper 48 bits of the keys
+        self.is_bitset = is_bitset          # container kind
+        self.array_values = array_values    # lower 16 bits of the array containers, concatenated
+        self.array_counts = array_counts    # number of values of each array container
+        self.bitsets = bitsets              # (bitset containers, 8192) uint8
+        self.cardinality = cardinality
+        # rank of each container within its kind
+        self._rank = np.where(is_bitset, np.cumsum(is_bitset) - 1, np.cumsum(~is_bitset) - 1)
+        # the array containers are searched at once with (rank << 16 | low) keys, sorted by construction
+        self._array_keys = ((np.repeat(np.arange(len(array_counts), dtype=np.uint64), array_counts) << np.uint64(16))
+                            | array_values.astype(np.uint64))
+
+    def __len__(self) -> int:
+        return self.cardinality
+
+    @classmethod
+    def from_keys(cls, keys: np.ndarray) -> 'ZonePresenceBitmap':
+        keys = np.unique(np.asarray(keys, dtype=np.uint64))
+        high, low = keys >> np.uint64(16), (keys & np.uint64(0xFFFF)).astype(np.uint16)
+        containers, counts = np.unique(high, return_counts=True)
+        is_bitset = counts > array_container_max
+        in_bitset = np.repeat(is_bitset, counts)
+        bitset_low = low[in_bitset]
+        bitset_rows = np.repeat(np.arange(is_bitset.sum()), counts[is_bitset])
+        bitsets = np.zeros((is_bitset.sum(), bitset_bytes), dtype=np.uint8)
+        np.bitwise_or.at(bitsets, (bitset_rows, bitset_low >> 3), (1 << (bitset_low & 7)).astype(np.uint8))
+        return cls(containers, is_bitset, low[~in_bitset], counts[~is_bitset], bitsets, len(keys))
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        keys = np.asarray(keys, dtype=np.uint64)
+        high, low = keys >> np.uint64(16), keys & np.uint64(0xFFFF)
+        result = np.zeros(len(keys), dtype=bool)
+        if (len(self.containers) == 0 or len(keys) == 0):
+            return result
+        idx = np.minimum(np.searchsorted(self.containers, high), len(self.containers) - 1)
+        found = np.flatnonzero(self.containers[idx] == high)
+        idx, low = idx[found], low[found]
+        bitset = self.is_bitset[idx]
+        rank = self._rank[idx]
+        # bitset containers
+        rows, bits = rank[bitset], low[bitset]
+        result[found[bitset]] = ((self.bitsets[rows, bits >> np.uint64(3)] >> (bits & np.uint64(7)).astype(np.uint8)) & 1) == 1
+        # array containers
+        probe = (rank[~bitset].astype(np.uint64) << np.uint64(16)) | low[~bitset]
+        pos = np.minimum(np.searchsorted(self._array_keys, probe), max(len(self._array_keys) - 1, 0))
+        result[found[~bitset]] = (self._array_keys[pos] == probe) if (len(self._array_keys) > 0) else False
+        return result
+
+    def save(self, path: str, version: Optional[str] = None):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, containers=self.containers, is_bitset=self.is_bitset, array_values=self.array_values,
+                     array_counts=self.array_counts, bitsets=self.bitsets, cardinality=np.array(self.cardinality),
+                     version=np.array('' if (version is None) else version))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Tuple['ZonePresenceBitmap', Optional[str]]:
+        with np.load(path) as f:
+            bitmap = cls(f['containers'], f['is_bitset'], f['array_values'], f['array_counts'], f['bitsets'],
+                         int(f['cardinality']))
+            version = str(f['version'])
+        return bitmap, (version if (version != '') else None)
+
+
+# (collection id, refinement level) -> (version, bitmap or None, checked at)
+_bitmaps: Dict[Tuple[str, int], Tuple[Optional[str], Optional[ZonePresenceBitmap], float]] = {}
+# one lock per (collection id, refinement level)
+_build_locks: Dict[Tuple[str, int], threading.Lock] = {}
+_build_locks_lock = threading.Lock()
+
+
+def get_presence_index_path(collection_id: str, res: int, directory: Optional[str] = None) -> Optional[str]:
+    directory = directory if (directory is not None) else os.environ.get('PRESENCE_INDEX_DIR')
+    if (directory is None):
+        return None
+    return os.path.join(directory, collection_id, f'{res}.npz')
+
+
+def _get_version(collection: Collection, cp: AbstractCollectionProvider) -> Optional[str]:
+    version = cp.get_version(collection.collection_provider.datasource_id)
+    return version.version if (version is not None) else None
+
+
+def build_presence_bitmap(collection: Collection, cp: AbstractCollectionProvider, dggrs_provider: AbstractDGGRSProvider,
+                          res: int) -> ZonePresenceBitmap:
+    zone_id_repr = collection.collection_provider.dggrs_zoneid_repr
+    zoneIds = cp.get_zone_ids(res, collection.collection_provider.datasource_id)
+    if (zone_id_repr == 'int'):
+        keys = np.asarray(zoneIds, dtype=np.uint64)
+    else:
+        if (zone_id_repr != 'textual'):
+            zoneIds = dggrs_provider.zone_id_to_textual(np.asarray(zoneIds), zone_id_repr, res)
+        keys = dggrs_provider.zone_id_keys(np.asarray(zoneIds).tolist())
+    if (keys is None):
+        raise ValueError(f'{__name__} {collection.collection_provider.dggrsId} has no integer zone id representation')
+    return ZonePresenceBitmap.from_keys(keys)
+
+
+def _load_or_build(collection_id: str, collection: Collection, cp: AbstractCollectionProvider,
+                   dggrs_provider: AbstractDGGRSProvider, res: int, version: Optional[str]) -> Optional[ZonePresenceBitmap]:
+    path = get_presence_index_path(collection_id, res)
+    if (path is not None and os.path.exists(path)):
+        bitmap, bitmap_version = ZonePresenceBitmap.load(path)
+        if (version is None or bitmap_version == version):
+            logger.info(f'{__name__} {collection_id} level {res} presence index loaded: {len(bitmap)} zones')
+            return bitmap
+        logger.warning(f'{__name__} {collection_id} level {res} presence index is outdated ({bitmap_version} != {version})')
+    if (collection.collection_provider.presence_index != 'lazy'):
+        return None
+    bitmap = build_presence_bitmap(collection, cp, dggrs_provider, res)
+    logger.info(f'{__name__} {collection_id} level {res} presence index built: {len(bitmap)} zones')
+    if (path is not None):
+        try:
+            bitmap.save(path, version)
+        except OSError as e:
+            logger.warning(f'{__name__} {collection_id} level {res} presence index save failed: {e}')
+    return bitmap
+
+
+def get_presence_bitmap(collection_id: str, collection: Collection, cp: AbstractCollectionProvider,
+                        dggrs_provider: AbstractDGGRSProvider, res: int) -> Optional[ZonePresenceBitmap]:
+    # None if the collection has no presence index for the level, the datasource must then be queried
+    if (collection.collection_provider.presence_index is None):
+        return None
+    key = (collection_id, res)
+    interval = float(os.environ.get('PRESENCE_INDEX_CHECK_INTERVAL', 60))
+    entry = _bitmaps.get(key)
+    if (entry is not None and time.monotonic() - entry[2] < interval):
+        return entry[1]
+    with _build_locks_lock:
+        lock = _build_locks.setdefault(key, threading.Lock())
+    if (not lock.acquire(blocking=False)):
+        # checked or built by another thread
+        return entry[1] if (entry is not None) else None
+    try:
+        entry = _bitmaps.get(key)
+        if (entry is not None and time.monotonic() - entry[2] < interval):
+            return entry[1]
+        try:
+            version = _get_version(collection, cp)
+            bitmap = entry[1] if (entry is not None and entry[0] == version and version is not None) else None
+            if (bitmap is None):
+                bitmap = _load_or_build(collection_id, collection, cp, dggrs_provider, res, version)
+        except Exception as e:
+            logger.error(f'{__name__} {collection_id} level {res} presence index failed: {e}')
+            version, bitmap = None, None
+        _bitmaps[key] = (version, bitmap, time.monotonic())
+        return bitmap
+    finally:
+        lock.release()
+
+
+def build_presence_index(collections: Dict[str, Collection], collection_providers: Dict[str, AbstractCollectionProvider],
+                         dggrs_providers: Dict[str, AbstractDGGRSProvider], output: str,
+                         collection_ids: Optional[List[str]] = None, levels: Optional[List[int]] = None) -> List[str]:
+    # builds and saves the bitmaps of the collections (default: the ones with a presence index), returns their paths
+    collection_ids = collection_ids if (collection_ids is not None) else [
+        k for k, v in collections.items() if (v.collection_provider.presence_index is not None)]
+    paths = []
+    for collection_id in collection_ids:
+        collection = collections[collection_id]
+        cp = collection_providers[collection.collection_provider.providerId]
+        dggrs_provider = dggrs_providers[collection.collection_provider.dggrsId]
+        version = _get_version(collection, cp)
+        collection_levels = levels if (levels is not None) else range(collection.collection_provider.min_refinement_level,
+                                                                       collection.collection_provider.max_refinement_level + 1)
+        for res in collection_levels:
+            bitmap = build_presence_bitmap(collection, cp, dggrs_provider, res)
+            path = get_presence_index_path(collection_id, res, output)
+            bitmap.save(path, version)
+            logger.info(f'{__name__} {collection_id} level {res}: {len(bitmap)} zones, {os.path.getsize(path)} bytes -> {path}')
+            paths.append(path)
+    return paths
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Build the zone presence index of the collections into PRESENCE_INDEX_DIR.')
+    parser.add_argument('-c', '--collection', action='append', default=None,
+                        help='collection id (repeatable), default: the collections with a presence index')
+    parser.add_argument('-l', '--level', action='append', type=int, default=None,
+                        help='refinement level (repeatable), default: all the levels of the collection')
+    parser.add_argument('-o', '--output', default=os.environ.get('PRESENCE_INDEX_DIR'),
+                        help='output directory, default: PRESENCE_INDEX_DIR')
+    args = parser.parse_args(argv)
+    if (args.output is None):
+        parser.error('the output directory is required (--output or PRESENCE_INDEX_DIR)')
+    logging.basicConfig(level=logging.INFO)
+    # the collections and the providers of the API configuration (dggs_api_config)
+    from pydggsapi.routers.dggs_api import collections, collection_providers, dggrs_providers
+    build_presence_index(collections, collection_providers, dggrs_providers, args.output, args.collection, args.level)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+# Response cache for the data-retrieval routes
+#
+# Two tiers are available, both are disabled by default:
+#   - RESPONSE_CACHE_MAX_BYTES : size of the in-process LRU (bytes of the cached bodies), 0 to disable.
+#   - RESPONSE_CACHE_DIR       : directory of the on-disk tier, it can be shared by the gunicorn workers.
+#   - RESPONSE_CACHE_DIR_MAX_BYTES : size limit of the on-disk tier, 0 for unlimited.
+#   - RESPONSE_CACHE_TTL       : default time to live (seconds) of the cached responses,
+#                                it can be overridden per collection with `cache_ttl` of the collection provider.
+#   - RESPONSE_CACHE_STREAM_MAX_BYTES : size limit of the cached streaming responses (default 64 MiB), the larger
+#                                streams (ex. zarr zip, DGGS-JSON) are sent without being buffered nor cached.
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import cache
+from typing import Any, AsyncIterator, Dict, List, Optional
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+import threading
+import tempfile
+import hashlib
+import logging
+import json
+import time
+import os
+
+logger = logging.getLogger()
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    status_code: int = 200
+    headers: Dict[str, str] = field(default_factory=dict)
+    expires: float = 0
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+    @property
+    def expired(self) -> bool:
+        return (self.expires > 0 and self.expires < time.time())
+
+    def to_response(self) -> Response:
+        response = Response(content=self.body, status_code=self.status_code, headers=self.headers)
+        response.headers['X-Cache'] = 'HIT'
+        return response
+
+
+class AbstractResponseCache(ABC):
+
+    @property
+    def max_body_bytes(self) -> float:
+        # size of the largest body the cache keeps
+        return float('inf')
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[CachedResponse]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, key: str, response: CachedResponse):
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self):
+        raise NotImplementedError
+
+
+class MemoryResponseCache(AbstractResponseCache):
+    # LRU bounded by the total size of the cached bodies
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._items: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_body_bytes(self) -> float:
+        return self.max_bytes
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            response = self._items.get(key)
+            if (response is None):
+                return None
+            if (response.expired):
+                self._pop(key)
+                return None
+            self._items.move_to_end(key)
+            return response
+
+    def set(self, key: str, response: CachedResponse):
+        if (response.size > self.max_bytes):
+            return
+        with self._lock:
+            self._pop(key)
+            self._items[key] = response
+            self.current_bytes += response.size
+            while (self.current_bytes > self.max_bytes):
+                self._pop(next(iter(self._items)))
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+
+    def _pop(self, key: str):
+        response = self._items.pop(key, None)
+        if (response is not None):
+            self.current_bytes -= response.size
+
+
+class DiskResponseCache(AbstractResponseCache):
+    # one response per raw body file ({key}.body) and JSON header file ({key}.json: status, headers, expiry, size),
+    # written atomically so that several processes can share the directory. Nothing is unpickled from it.
+
+    def __init__(self, directory: str, max_bytes: int = 0, prune_interval: int = 100):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.prune_interval = prune_interval
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def max_body_bytes(self) -> float:
+        return self.max_bytes if (self.max_bytes > 0) else float('inf')
+
+    def _path(self, key: str) -> str:
+        # without extension
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        path = self._path(key)
+        try:
+            with open(f'{path}.json', 'r', encoding='utf-8') as f:
+                header = json.load(f)
+            with open(f'{path}.body', 'rb') as f:
+                body = f.read()
+            response = CachedResponse(body, int(header['status_code']), dict(header['headers']), float(header['expires']))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f'{__name__} failed to read cached response {path}: {e}')
+            return None
+        if (response.size != header.get('size')):
+            # the body of another write of the key
+            return None
+        if (response.expired):
+            self._remove(f'{path}.json')
+            self._remove(f'{path}.body')
+            return None
+        return response
+
+    def set(self, key: str, response: CachedResponse):
+        if (response.size > self.max_body_bytes):
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        header = json.dumps({'status_code': response.status_code, 'headers': response.headers,
+                             'expires': response.expires, 'size': response.size}).encode('utf-8')
+        # the header is written last, a response is complete once it exists
+        for suffix, content in (('.body', response.body), ('.json', header)):
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(content)
+                os.replace(tmp_path, f'{path}{suffix}')
+            except Exception as e:
+                logger.warning(f'{__name__} failed to write cached response {path}{suffix}: {e}')
+                self._remove(tmp_path)
+                return
+        self._writes += 1
+        if (self.max_bytes > 0 and self._writes % self.prune_interval == 0):
+            self.prune()
+
+    def prune(self):
+        # remove the least recently written responses until the size fits
+        responses = {}
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                base, ext = os.path.splitext(name)
+                if (ext in ('.json', '.body')):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    mtime, size = responses.get(os.path.join(root, base), (0, 0))
+                    responses[os.path.join(root, base)] = (max(mtime, stat.st_mtime), size + stat.st_size)
+        total = sum([r[1] for r in responses.values()])
+        for path, (_, size) in sorted(responses.items(), key=lambda r: r[1][0]):
+            if (total <= self.max_bytes):
+                break
+            self._remove(f'{path}.json')
+            self._remove(f'{path}.body')
+            total -= size
+
+    def clear(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                self._remove(os.path.join(root, name))
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class TieredResponseCache(AbstractResponseCache):
+
+    def __init__(self, tiers: List[AbstractResponseCache]):
+        self.tiers = tiers
+
+    @property
+    def max_body_bytes(self) -> float:
+        return max([t.max_body_bytes for t in self.tiers])
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        for i, tier in enumerate(self.tiers):
+            response = tier.get(key)
+            if (response is not None):
+                # promote to the faster tiers
+                [t.set(key, response) for t in self.tiers[:i]]
+                return response
+        return None
+
+    def set(self, key: str, response: CachedResponse):
+        [t.set(key, response) for t in self.tiers]
+
+    def clear(self):
+        [t.clear() for t in self.tiers]
+
+
+def get_response_cache_default_ttl() -> int:
+    return int(os.environ.get('RESPONSE_CACHE_TTL', 300))
+
+
+def get_response_cache_stream_max_bytes() -> int:
+    return int(os.environ.get('RESPONSE_CACHE_STREAM_MAX_BYTES', 64 * 1024 * 1024))
+
+
+@cache
+def get_response_cache() -> Optional[AbstractResponseCache]:
+    tiers = []
+    max_bytes = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 0))
+    if (max_bytes > 0):
+        tiers.append(MemoryResponseCache(max_bytes))
+    directory = os.environ.get('RESPONSE_CACHE_DIR')
+    if (directory):
+        tiers.append(DiskResponseCache(directory, int(os.environ.get('RESPONSE_CACHE_DIR_MAX_BYTES', 0))))
+    if (len(tiers) == 0):
+        return None
+    logger.info(f'{__name__} response cache enabled with {[type(t).__name__ for t in tiers]}')
+    return tiers[0] if (len(tiers) == 1) else TieredResponseCache(tiers)
+
+
+def response_cache_key(*parts: Any) -> str:
+    # the parts are serialized in a normalized form, objects without JSON representation (ex. CQL AST) use their repr
+    normalized = json.dumps(parts, sort_keys=True, default=repr, separators=(',', ':'))
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def _cacheable_headers(response: Response) -> Dict[str, str]:
+    return {k: v for k, v in response.headers.items() if (k.lower() not in ('content-length', 'x-cache'))}
+
+
+async def cache_response(
+    response_cache: AbstractResponseCache,
+    key: str,
+    result: Any,
+    ttl: int,
+) -> Any:
+    # store the result in cache and return the response to send, the cache is written in the thread pool (disk tier)
+    # the result can be a pydantic model (rendered the same way as FastAPI does), a Response, or a streaming response
+    if (ttl <= 0 or result is None):
+        return result
+    expires = time.time() + ttl
+    if (isinstance(result, BaseModel)):
+        result = JSONResponse(content=jsonable_encoder(result))
+    if (isinstance(result, StreamingResponse)):
+        result.body_iterator = _tee_body_iterator(response_cache, key, result, result.body_iterator, expires)
+        result.headers['X-Cache'] = 'MISS'
+        return result
+    if (not isinstance(result, Response) or result.status_code != 200):
+        return result
+    await run_in_threadpool(response_cache.set, key,
+                            CachedResponse(bytes(result.body), result.status_code, _cacheable_headers(result), expires))
+    result.headers['X-Cache'] = 'MISS'
+    return result
+
+
+async def _tee_body_iterator(
+    response_cache: AbstractResponseCache,
+    key: str,
+    response: StreamingResponse,
+    body_iterator: AsyncIterator,
+    expires: float,
+) -> AsyncIterator[bytes]:
+    # the chunks are kept until the body is larger than the cache accepts, then only streamed
+    max_bytes = min(response_cache.max_body_bytes, get_response_cache_stream_max_bytes())
+    chunks, size = [], 0
+    async for chunk in body_iterator:
+        chunk = chunk if (isinstance(chunk, bytes)) else chunk.encode(response.charset)
+        if (chunks is not None):
+            size += len(chunk)
+            if (size <= max_bytes):
+                chunks.append(chunk)
+            else:
+                chunks = None
+        yield chunk
+    if (chunks is not None and response.status_code == 200):
+        await run_in_threadpool(response_cache.set, key,
+                                CachedResponse(b''.join(chunks), response.status_code, _cacheable_headers(response), expires))
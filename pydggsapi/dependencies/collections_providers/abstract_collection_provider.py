@@ -1,12 +1,15 @@
 from pydggsapi.schemas.api.collection_providers import (
     CollectionProviderGetDataDictReturn,
     CollectionProviderGetDataReturn,
+    CollectionProviderGetVersionReturn,
 )
 from dataclasses import dataclass, field
 from abc import ABC, abstractmethod
 from typing import List, Dict, Optional, Any
+from datetime import datetime, timezone
 from pygeofilter.ast import AstType
 import numpy as np
+import pandas as pd
 
 
 @dataclass
@@ -45,5 +48,44 @@ class AbstractCollectionProvider(ABC):
     def get_datadictionary(self, datasource_id: str, include_zone_id: bool = True) -> CollectionProviderGetDataDictReturn:
         raise NotImplementedError
 
+    # Existence probe, returns the distinct zone IDs (in the datasource repr) of zoneIds that have data at
+    # the resolution and match the cql filter. No property is returned, the providers should override it with a
+    # projection of the zone ID column only, the default falls back to get_data.
+    def has_data(
+        self,
+        zoneIds: List[str],
+        res: int,
+        datasource_id: str,
+        cql_filter: AstType | None = None,
+        include_datetime: bool = False,
+    ) -> np.ndarray:
+        result = self.get_data(zoneIds, res, datasource_id, cql_filter, include_datetime, input_zoneIds_padding=False)
+        return pd.unique(np.asarray(result.zoneIds))
+
+    # All the distinct zone IDs (in the datasource repr) of the resolution, used to build the zone presence index.
+    def get_zone_ids(self, res: int, datasource_id: str) -> np.ndarray:
+        raise NotImplementedError(f'{__name__} get_zone_ids is not supported by {type(self).__name__}')
+
+    # Version token of the datasource, used to build the ETag / Last-Modified validators of the responses.
+    # Return None if the version cannot be determined, the responses are then sent without validators.
+    def get_version(self, datasource_id: str) -> Optional[CollectionProviderGetVersionReturn]:
+        return None
+
+
+def get_fsspec_info_modified(info: Dict[str, Any]) -> Optional[datetime]:
+    # modification time from the file info of the different fsspec filesystems (local, s3, gcs, http ...)
+    modified = info.get('mtime', info.get('LastModified', info.get('last_modified', info.get('updated'))))
+    if (isinstance(modified, (int, float))):
+        return datetime.fromtimestamp(modified, tz=timezone.utc)
+    if (isinstance(modified, str)):
+        try:
+            modified = datetime.fromisoformat(modified.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if (isinstance(modified, datetime)):
+        return modified if (modified.tzinfo is not None) else modified.replace(tzinfo=timezone.utc)
+    return None
+
+
 class DatetimeNotDefinedError(ValueError):
     pass
@@ -3,8 +3,13 @@ from pydggsapi.dependencies.collections_providers.abstract_collection_provider i
     AbstractDatasourceInfo,
     DatetimeNotDefinedError
 )
-from pydggsapi.schemas.api.collection_providers import CollectionProviderGetDataReturn, CollectionProviderGetDataDictReturn
+from pydggsapi.schemas.api.collection_providers import (
+    CollectionProviderGetDataReturn,
+    CollectionProviderGetDataDictReturn,
+    CollectionProviderGetVersionReturn
+)
 from pydggsapi.schemas.ogc_dggs.dggrs_zones import zone_datetime_placeholder
+from pydggsapi.dependencies.api.utils import getCQLAttributes
 
 from pygeofilter.ast import AstType
 from pygeofilter.ast import Attribute as pygeofilter_ats
@@ -12,8 +17,10 @@ from pygeofilter.backends.sql import to_sql_where
 from ordered_set import OrderedSet
 from dataclasses import dataclass
 from clickhouse_driver import Client
-from typing import List
+from typing import List, Optional
+from datetime import datetime, timezone
 import numpy as np
+import threading
 import logging
 
 logger = logging.getLogger()
@@ -23,6 +30,9 @@ logger = logging.getLogger()
 class ClickhouseDatasourceInfo(AbstractDatasourceInfo):
     table: str = "data"
     aggregation: str = "mode"
+    # column used as data version (ex. an update timestamp or a version number),
+    # if not given, the modification time of the active table parts is used
+    version_col: str = None
 
 
 class ClickhouseCollectionProvider(AbstractCollectionProvider):
@@ -39,9 +49,10 @@ class ClickhouseCollectionProvider(AbstractCollectionProvider):
         self.password: str = connection.get("password", "user")
         self.database: str = connection.get("database", "default")
         self.compression: bool = connection.get("compression", False)
+        # clickhouse_driver's Client is not thread-safe, each executor thread gets its own client
+        self._local = threading.local()
         try:
-            self.db = Client(host=self.host, port=self.port, user=self.user, password=self.password,
-                             database=self.database, compression=self.compression)
+            self._local.db = self._create_client()
             datasources.pop("connection")
             for k, v in datasources.items():
                 self.datasources[k] = ClickhouseDatasourceInfo(**v)
@@ -49,6 +60,17 @@ class ClickhouseCollectionProvider(AbstractCollectionProvider):
             logger.error(f'{__name__} create datasource failed: {e}')
             raise Exception(f'{__name__} create datasource failed: {e}')
 
+    def _create_client(self) -> Client:
+        return Client(host=self.host, port=self.port, user=self.user, password=self.password,
+                      database=self.database, compression=self.compression)
+
+    @property
+    def db(self) -> Client:
+        db = getattr(self._local, 'db', None)
+        if (db is None):
+            db = self._local.db = self._create_client()
+        return db
+
     def get_data(self, zoneIds: List[str], res: int, datasource_id: str,
                  cql_filter: AstType = None, include_datetime: bool = False,
                  include_properties: List[str] = None,
@@ -99,6 +121,62 @@ class ClickhouseCollectionProvider(AbstractCollectionProvider):
             result.zoneIds, result.cols_meta, result.data = zoneIds, cols_meta, data
         return result
 
+    def has_data(self, zoneIds: List[str], res: int, datasource_id: str,
+                 cql_filter: AstType = None, include_datetime: bool = False) -> np.ndarray:
+        try:
+            datasource = self.datasources[datasource_id]
+        except KeyError:
+            logger.error(f'{__name__} datasource_id not found: {datasource_id}')
+            raise Exception(f'{__name__} datasource_id not found: {datasource_id}')
+        try:
+            res_col = datasource.zone_groups[str(res)]
+        except KeyError as e:
+            logger.error(f'{__name__} get zone_groups for resolution {res} failed: {e}')
+            return np.array([])
+        if (cql_filter is None):
+            query = f'select distinct {res_col} from {datasource.table} where {res_col} in (%(cellid_list)s)'
+        else:
+            fieldmapping = self.get_datadictionary(datasource_id).data
+            fieldmapping = {k: k for k, v in fieldmapping.items()}
+            if (include_datetime and datasource.datetime_col is None):
+                raise DatetimeNotDefinedError(f"{__name__} filter by datetime is not supported: datetime_col is none")
+            if (include_datetime):
+                fieldmapping.update({zone_datetime_placeholder: datasource.datetime_col})
+            # the having clause is evaluated on the aggregated values as in get_data,
+            # only the columns of the filter are aggregated
+            filter_cols = OrderedSet(datasource.data_cols) & set(fieldmapping.get(a, a) for a in getCQLAttributes(cql_filter))
+            if (include_datetime):
+                filter_cols.add(datasource.datetime_col)
+            cols = [f'arrayMax(topK(1)({c})) as {c}' for c in filter_cols] + [res_col]
+            cql_sql = to_sql_where(cql_filter, fieldmapping).replace('"', "")
+            query = (f'select {",".join(cols)} from {datasource.table} where {res_col} in (%(cellid_list)s) '
+                     f'group by {res_col} having {cql_sql}')
+        try:
+            db_result = self.db.execute(query, {'cellid_list': zoneIds}, with_column_types=True)
+        except Exception as e:
+            logger.error(f'{__name__} has_data failed : {e}')
+            raise Exception(f'{__name__} has_data failed : {e}')
+        zone_idx = [i for i, r in enumerate(db_result[1]) if (r[0] == res_col)][0]
+        return np.array([r[zone_idx] for r in db_result[0]])
+
+    def get_zone_ids(self, res: int, datasource_id: str) -> np.ndarray:
+        try:
+            datasource = self.datasources[datasource_id]
+        except KeyError:
+            logger.error(f'{__name__} datasource_id not found: {datasource_id}')
+            raise Exception(f'{__name__} datasource_id not found: {datasource_id}')
+        try:
+            res_col = datasource.zone_groups[str(res)]
+        except KeyError as e:
+            logger.error(f'{__name__} get zone_groups for resolution {res} failed: {e}')
+            raise ValueError(f'{__name__} get zone_groups for resolution {res} failed: {e}')
+        try:
+            db_result = self.db.execute(f'select distinct {res_col} from {datasource.table}', columnar=True)
+        except Exception as e:
+            logger.error(f'{__name__} get_zone_ids failed : {e}')
+            raise Exception(f'{__name__} get_zone_ids failed : {e}')
+        return np.array(db_result[0]) if (len(db_result) > 0) else np.array([])
+
     def get_datadictionary(self, datasource_id: str, include_zone_id: bool = True) -> CollectionProviderGetDataDictReturn:
         try:
             datasource = self.datasources[datasource_id]
@@ -115,3 +193,31 @@ class ClickhouseCollectionProvider(AbstractCollectionProvider):
         if include_zone_id:
             data.update({'zone_id': 'string'})
         return CollectionProviderGetDataDictReturn(data=data)
+
+    def get_version(self, datasource_id: str) -> Optional[CollectionProviderGetVersionReturn]:
+        try:
+            datasource = self.datasources[datasource_id]
+        except KeyError:
+            logger.error(f'{__name__} datasource_id not found: {datasource_id}')
+            raise Exception(f'{__name__} datasource_id not found: {datasource_id}')
+        if (datasource.version_col is not None):
+            query = f'select max({datasource.version_col}), count() from {datasource.table}'
+            params = {}
+        else:
+            database, table = datasource.table.split('.', 1) if ('.' in datasource.table) else (None, datasource.table)
+            database_cond = '%(database)s' if (database is not None) else 'currentDatabase()'
+            query = ('select max(modification_time), count() from system.parts '
+                     f'where active and database = {database_cond} and table = %(table)s')
+            params = {'database': database, 'table': table}
+        try:
+            version, count = self.db.execute(query, params)[0]
+        except Exception as e:
+            logger.warning(f'{__name__} {datasource_id} get version failed: {e}')
+            return None
+        if (count == 0 and datasource.version_col is None):
+            # not a MergeTree table, the version cannot be determined
+            return None
+        last_modified = None
+        if (isinstance(version, datetime)):
+            last_modified = version if (version.tzinfo is not None) else version.replace(tzinfo=timezone.utc)
+        return CollectionProviderGetVersionReturn(version=f'{datasource.table}:{version}:{count}', last_modified=last_modified)
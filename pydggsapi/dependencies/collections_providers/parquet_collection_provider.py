@@ -1,11 +1,13 @@
 from pydggsapi.dependencies.collections_providers.abstract_collection_provider import (
     AbstractCollectionProvider,
     AbstractDatasourceInfo,
-    DatetimeNotDefinedError
+    DatetimeNotDefinedError,
+    get_fsspec_info_modified
 )
 from pydggsapi.schemas.api.collection_providers import (
     CollectionProviderGetDataReturn,
-    CollectionProviderGetDataDictReturn
+    CollectionProviderGetDataDictReturn,
+    CollectionProviderGetVersionReturn
 )
 from pydggsapi.schemas.ogc_dggs.dggrs_zones import zone_datetime_placeholder
 from pydggsapi.schemas.ogc_dggs.dggrs_zones_data import Dimension, DimensionGrid
@@ -16,7 +18,10 @@ from ordered_set import OrderedSet
 import duckdb
 import pandas as pd
 import numpy as np
-from typing import List, Any
+from typing import List, Any, Optional
+import hashlib
+import fsspec
+import glob
 import logging
 
 logger = logging.getLogger()
@@ -89,16 +94,10 @@ class ParquetCollectionProvider(AbstractCollectionProvider):
         sql = f"""select {cols} from read_parquet('{datasource.filepath}')
                   where {datasource.id_col} in (SELECT UNNEST(?))"""
         if (cql_filter is not None):
-            fieldmapping = self.get_datadictionary(datasource_id).data
-            fieldmapping = {k: k for k, v in fieldmapping.items()}
-            if (include_datetime and datasource.datetime_col is None):
-                raise DatetimeNotDefinedError(f"{__name__} filter by datetime is not supported: datetime_col is none")
-            if (include_datetime):
-                fieldmapping.update({zone_datetime_placeholder: datasource.datetime_col})
-            cql_sql = to_sql_where(cql_filter, fieldmapping)
-            sql += f" AND {cql_sql}"
+            sql += f" AND {self._cql_where(datasource_id, cql_filter, include_datetime)}"
         try:
-            result_df = datasource.conn.sql(sql, params=[zoneIds]).df()
+            # a cursor per query, the connection is shared by the executor threads
+            result_df = datasource.conn.cursor().sql(sql, params=[zoneIds]).df()
         except Exception as e:
             logger.error(f'{__name__} {datasource_id} query data error: {e}')
             raise Exception(f'{__name__} {datasource_id} query data error: {e}')
@@ -148,6 +147,49 @@ class ParquetCollectionProvider(AbstractCollectionProvider):
         result.dimensions = cols_dims
         return result
 
+    def has_data(self, zoneIds: List[Any], res: int, datasource_id: str,
+                 cql_filter: AstType = None, include_datetime: bool = False) -> np.ndarray:
+        try:
+            datasource = self.datasources[datasource_id]
+        except KeyError:
+            logger.error(f'{__name__} {datasource_id} not found')
+            raise Exception(f'{__name__} {datasource_id} not found')
+        # only the zone ID column is read, the filter columns are only used by the predicate
+        sql = f"""select distinct {datasource.id_col} from read_parquet('{datasource.filepath}')
+                  where {datasource.id_col} in (SELECT UNNEST(?))"""
+        if (cql_filter is not None):
+            sql += f" AND {self._cql_where(datasource_id, cql_filter, include_datetime)}"
+        try:
+            result_df = datasource.conn.cursor().sql(sql, params=[zoneIds]).df()
+        except Exception as e:
+            logger.error(f'{__name__} {datasource_id} query has data error: {e}')
+            raise Exception(f'{__name__} {datasource_id} query has data error: {e}')
+        return result_df[datasource.id_col].to_numpy()
+
+    def get_zone_ids(self, res: int, datasource_id: str) -> np.ndarray:
+        try:
+            datasource = self.datasources[datasource_id]
+        except KeyError:
+            logger.error(f'{__name__} {datasource_id} not found')
+            raise Exception(f'{__name__} {datasource_id} not found')
+        sql = f"""select distinct {datasource.id_col} from read_parquet('{datasource.filepath}')"""
+        try:
+            result_df = datasource.conn.cursor().sql(sql).df()
+        except Exception as e:
+            logger.error(f'{__name__} {datasource_id} query zone ids error: {e}')
+            raise Exception(f'{__name__} {datasource_id} query zone ids error: {e}')
+        return result_df[datasource.id_col].to_numpy()
+
+    def _cql_where(self, datasource_id: str, cql_filter: AstType, include_datetime: bool) -> str:
+        datasource = self.datasources[datasource_id]
+        fieldmapping = self.get_datadictionary(datasource_id).data
+        fieldmapping = {k: k for k, v in fieldmapping.items()}
+        if (include_datetime and datasource.datetime_col is None):
+            raise DatetimeNotDefinedError(f"{__name__} filter by datetime is not supported: datetime_col is none")
+        if (include_datetime):
+            fieldmapping.update({zone_datetime_placeholder: datasource.datetime_col})
+        return to_sql_where(cql_filter, fieldmapping)
+
     def get_datadictionary(self, datasource_id: str, include_zone_id: bool = True) -> CollectionProviderGetDataReturn:
         result = CollectionProviderGetDataDictReturn(data={})
         try:
@@ -165,7 +207,7 @@ class ParquetCollectionProvider(AbstractCollectionProvider):
             cols = f"{','.join(cols_intersection)}{incl}"
         sql = f"""select {cols} from read_parquet('{datasource.filepath}') limit 1"""
         try:
-            result_df = datasource.conn.sql(sql).df()
+            result_df = datasource.conn.cursor().sql(sql).df()
         except Exception as e:
             logger.error(f'{__name__} {datasource_id} query error: {e}')
             raise Exception(f'{__name__} {datasource_id} query error: {e}')
@@ -174,3 +216,26 @@ class ParquetCollectionProvider(AbstractCollectionProvider):
             data[k] = str(v) if (type(v).__name__ != "ObjectDType") else "string"
         result.data = data
         return result
+
+    def get_version(self, datasource_id: str) -> Optional[CollectionProviderGetVersionReturn]:
+        try:
+            datasource = self.datasources[datasource_id]
+        except KeyError:
+            logger.error(f'{__name__} {datasource_id} not found.')
+            raise Exception(f'{__name__} {datasource_id} not found.')
+        # size and modification time (or etag) of the parquet file(s)
+        try:
+            fs, path = fsspec.core.url_to_fs(datasource.filepath)
+            files = sorted(fs.glob(path)) if (glob.has_magic(path)) else [path]
+            infos = [fs.info(f) for f in files]
+        except Exception as e:
+            logger.warning(f'{__name__} {datasource_id} get version failed: {e}')
+            return None
+        if (len(infos) == 0):
+            return None
+        modified = [get_fsspec_info_modified(info) for info in infos]
+        tokens = [f"{info['name']}:{info.get('size')}:{info.get('ETag', m.timestamp() if (m is not None) else '')}"
+                  for info, m in zip(infos, modified)]
+        modified = [m for m in modified if (m is not None)]
+        return CollectionProviderGetVersionReturn(version=hashlib.sha256('|'.join(tokens).encode()).hexdigest(),
+                                                  last_modified=max(modified) if (len(modified) > 0) else None)
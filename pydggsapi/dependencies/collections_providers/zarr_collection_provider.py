@@ -1,11 +1,17 @@
 from pydggsapi.dependencies.collections_providers.abstract_collection_provider import (
     AbstractCollectionProvider,
     AbstractDatasourceInfo,
-    DatetimeNotDefinedError
+    DatetimeNotDefinedError,
+    get_fsspec_info_modified
+)
+from pydggsapi.schemas.api.collection_providers import (
+    CollectionProviderGetDataReturn,
+    CollectionProviderGetDataDictReturn,
+    CollectionProviderGetVersionReturn
 )
-from pydggsapi.schemas.api.collection_providers import CollectionProviderGetDataReturn, CollectionProviderGetDataDictReturn
 from pydggsapi.schemas.ogc_dggs.dggrs_zones_data import Dimension, DimensionGrid
 from pydggsapi.schemas.ogc_dggs.dggrs_zones import zone_datetime_placeholder
+from pydggsapi.dependencies.api.utils import getCQLAttributes
 
 from pygeofilter.ast import AstType
 from pygeofilter.backends.sql import to_sql_where
@@ -14,13 +20,19 @@ import xarray as xr
 import xarray_sql as xql
 import numpy as np
 import pandas as pd
-from typing import List, Any
+from typing import List, Any, Optional
 from dataclasses import dataclass
+import hashlib
+import fsspec
 import logging
 
 logger = logging.getLogger()
 
 
+# root metadata of the zarr store (v3, v2 consolidated, v2)
+zarr_metadata_files = ['zarr.json', '.zmetadata', '.zgroup']
+
+
 @dataclass
 class ZarrDatasourceInfo(AbstractDatasourceInfo):
     filepath: str = ""
@@ -140,6 +152,58 @@ class ZarrCollectionProvider(AbstractCollectionProvider):
         result.datetimes = zone_dates
         return result
 
+    def has_data(self, zoneIds: List[Any], res: int, datasource_id: str,
+                 cql_filter: AstType = None, include_datetime: bool = False) -> np.ndarray:
+        try:
+            datasource = self.datasources[datasource_id]
+        except KeyError:
+            logger.error(f'{__name__} {datasource_id} not found')
+            raise ValueError(f'{__name__} {datasource_id} not found')
+        try:
+            zone_grp = datasource.zone_groups[str(res)]
+        except KeyError as e:
+            logger.error(f'{__name__} get zone_grp for resolution {res} failed: {e}')
+            return np.array([])
+        id_col = datasource.id_col if (datasource.id_col != "") else zone_grp
+        datatree = datasource.filehandle[zone_grp]
+        zone_coord = datatree[id_col].values
+        if (cql_filter is None):
+            # the zone ID coordinate is enough, no data variable is loaded
+            return pd.unique(zone_coord[np.isin(zone_coord, np.array(zoneIds, dtype=zone_coord.dtype))])
+        fieldmapping = self.get_datadictionary(datasource_id).data
+        fieldmapping = {k: k for k, v in fieldmapping.items()}
+        if (include_datetime and datasource.datetime_col is None):
+            raise DatetimeNotDefinedError(f"{__name__} filter by datetime is not supported: datetime_col is none")
+        if (include_datetime):
+            fieldmapping.update({zone_datetime_placeholder: datasource.datetime_col})
+        cql_sql = to_sql_where(cql_filter, fieldmapping)
+        # only the variables of the filter are exposed to the query
+        filter_vars = [v for v in datatree.data_vars if (v in set(fieldmapping.get(a, a) for a in getCQLAttributes(cql_filter)))]
+        if (include_datetime and datasource.datetime_col in datatree.data_vars):
+            filter_vars.append(datasource.datetime_col)
+        try:
+            ctx = xql.XarrayContext()
+            ctx.from_dataset('ds', datatree.to_dataset()[filter_vars].chunk('auto'))
+            sql = f"""select distinct "{id_col}" from ds where ("{id_col}" in ({', '.join(f"'{z}'" for z in zoneIds)})) and ({cql_sql}) """
+            return ctx.sql(sql).to_pandas()[id_col].to_numpy()
+        except Exception as e:
+            logger.error(f'{__name__} {datasource_id} has data failed: {e}')
+            return np.array([])
+
+    def get_zone_ids(self, res: int, datasource_id: str) -> np.ndarray:
+        try:
+            datasource = self.datasources[datasource_id]
+        except KeyError:
+            logger.error(f'{__name__} {datasource_id} not found')
+            raise ValueError(f'{__name__} {datasource_id} not found')
+        try:
+            zone_grp = datasource.zone_groups[str(res)]
+        except KeyError as e:
+            logger.error(f'{__name__} get zone_grp for resolution {res} failed: {e}')
+            raise ValueError(f'{__name__} get zone_grp for resolution {res} failed: {e}')
+        id_col = datasource.id_col if (datasource.id_col != "") else zone_grp
+        return pd.unique(datasource.filehandle[zone_grp][id_col].values)
+
     def get_datadictionary(self, datasource_id: str, include_zone_id: bool = True) -> CollectionProviderGetDataDictReturn:
         try:
             datatree = self.datasources[datasource_id]
@@ -151,3 +215,24 @@ class ZarrCollectionProvider(AbstractCollectionProvider):
         if include_zone_id:
             data.update({'zone_id': 'string'})
         return CollectionProviderGetDataDictReturn(data=data)
+
+    def get_version(self, datasource_id: str) -> Optional[CollectionProviderGetVersionReturn]:
+        try:
+            datasource = self.datasources[datasource_id]
+        except KeyError as e:
+            logger.error(f'{__name__} {datasource_id} not found: {e}.')
+            raise Exception(f'{__name__} {datasource_id} not found: {e}.')
+        # content and modification time of the store root metadata
+        try:
+            fs, path = fsspec.core.url_to_fs(datasource.filepath)
+            for metadata_file in zarr_metadata_files:
+                metadata_path = f"{path.rstrip('/')}/{metadata_file}"
+                if (fs.exists(metadata_path)):
+                    content = fs.cat_file(metadata_path)
+                    modified = get_fsspec_info_modified(fs.info(metadata_path))
+                    version = hashlib.sha256(content)
+                    version.update(str(modified.timestamp() if (modified is not None) else '').encode())
+                    return CollectionProviderGetVersionReturn(version=version.hexdigest(), last_modified=modified)
+        except Exception as e:
+            logger.warning(f'{__name__} {datasource_id} get version failed: {e}')
+        return None
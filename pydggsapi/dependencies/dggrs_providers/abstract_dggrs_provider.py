@@ -4,6 +4,8 @@ from abc import ABC, abstractmethod
 from typing import Any, Dict, List, Literal, Optional, Tuple, Union
 from pydggsapi.schemas.api.dggrs_providers import (
     ZoneIdRepresentationType,
+    ZonesListGeometryMode,
+    ZonesGeometry,
     DGGRSProviderZonesElement,
     DGGRSProviderZoneInfoReturn,
     DGGRSProviderZonesListReturn,
@@ -13,6 +15,7 @@ from pydggsapi.schemas.api.dggrs_providers import (
 from pydggsapi.schemas.ogc_dggs.common_ogc_dggs_api import ReturnGeometryTypes
 from pydantic import BaseModel
 from shapely.geometry import box
+import numpy as np
 
 
 class conversion_properties(BaseModel):
@@ -22,6 +25,8 @@ class conversion_properties(BaseModel):
 class AbstractDGGRSProvider(ABC):
 
     dggrs_conversion: Optional[Dict[str, conversion_properties]] = {}
+    # key of the provider geometry in the zone geometry cache and store, the DGGRS and the settings changing it
+    geometry_cache_id: Optional[str] = None
 
     @abstractmethod
     def zone_id_from_textual(self, cellIds: List[str], zone_id_repr: ZoneIdRepresentationType) -> List[Any]:
@@ -31,6 +36,14 @@ class AbstractDGGRSProvider(ABC):
     def zone_id_to_textual(self, cellIds: List[Any], zone_id_repr: ZoneIdRepresentationType, refinement_level=None) -> List[str]:
         raise NotImplementedError
 
+    # uint64 keys of the textual zone IDs, used to match large zone lists in bulk
+    # None if the DGGRS has no integer zone ID representation
+    def zone_id_keys(self, cellIds: List[str]) -> Optional[np.ndarray]:
+        try:
+            return np.asarray(self.zone_id_from_textual(cellIds, 'int'), dtype=np.uint64)
+        except (ValueError, TypeError, OverflowError, NotImplementedError):
+            return None
+
     @abstractmethod
     # return unit km
     def get_cls_by_zone_level(self, zone_level: int) -> float:
@@ -40,8 +53,9 @@ class AbstractDGGRSProvider(ABC):
     def get_zone_level_by_cls(self, cls_km: float) -> int:
         raise NotImplementedError
 
+    # the refinement level of each zone, int8 array
     @abstractmethod
-    def get_cells_zone_level(self, cellIds: List[str]) -> List[int]:
+    def get_cells_zone_level(self, cellIds: List[str]) -> np.ndarray:
         raise NotImplementedError
 
     # for each zone level, the len of zoneId list and geometry must be equal
@@ -50,15 +64,31 @@ class AbstractDGGRSProvider(ABC):
                                 geometry: Optional[ReturnGeometryTypes] = "zone-region") -> DGGRSProviderGetRelativeZoneLevelsReturn:
         raise NotImplementedError
 
+    # relative zone levels of several zones of the same refinement level, keyed by zone ID
+    # providers can override it to resolve all the zones in a single pass
+    def get_relative_zonelevels_batch(self, cellIds: List[str], base_level: int, zone_levels: List[int],
+                                      geometry: Optional[ReturnGeometryTypes] = "zone-region") -> Dict[str, DGGRSProviderGetRelativeZoneLevelsReturn]:
+        return {cellId: self.get_relative_zonelevels(cellId, base_level, zone_levels, geometry) for cellId in cellIds}
+
+    # geometry_mode 'none' and 'lazy' skip the geometry generation of the zones list (see ZonesListGeometryMode)
     @abstractmethod
     def zoneslist(self, bbox: Union[box, None], zone_level: int, parent_zone: Union[str, int, None],
-                  returngeometry: ReturnGeometryTypes, compact: bool = True) -> DGGRSProviderZonesListReturn:
+                  returngeometry: ReturnGeometryTypes, compact: bool = True,
+                  geometry_mode: ZonesListGeometryMode = 'eager') -> DGGRSProviderZonesListReturn:
         raise NotImplementedError
 
     @abstractmethod
     def zonesinfo(self, cellIds: List[str]) -> DGGRSProviderZoneInfoReturn:
         raise NotImplementedError
 
+    # all the zone IDs of a refinement level, used to build the geometry store
+    def level_zone_ids(self, zone_level: int) -> List[str]:
+        raise NotImplementedError
+
+    # geometry of the zones generated without the geometry cache, used to build the geometry store
+    def generate_zones_geometry(self, cellIds: List[str], returngeometry: ReturnGeometryTypes) -> ZonesGeometry:
+        raise NotImplementedError
+
     @abstractmethod
     def convert(self, zoneIds: List[str], targetdggrs: str,
                 zone_id_repr: ZoneIdRepresentationType = 'textual') -> DGGRSProviderConversionReturn:
@@ -0,0 +1,85 @@
+# Authalic / geodetic latitude conversion
+#
+# DGGRID works on the authalic sphere, the providers converting to WGS84 change the latitude of every vertex. The
+# conversion runs on the flat coordinates of a whole batch of geometry (shapely.transform, get_coordinates and
+# set_coordinates on copies of the geometry), the longitudes are kept.
+#
+# Both directions are Fourier sine series of the latitude, x' = x + sum c_k sin(2 k x). The coefficients are computed
+# once per ellipsoid (get_latitude_converter) from the closed form of the authalic latitude, by a discrete sine
+# transform over a quarter period, the inverse is solved by fixed point iterations. 8 terms are accurate to 1e-12 deg
+# for WGS84. The series are evaluated with the Clenshaw summation.
+
+from functools import lru_cache
+from typing import Any
+import numpy as np
+import shapely
+
+wgs84_a = 6378137.0
+wgs84_f = 1 / 298.257223563
+_samples = 256
+
+
+def _clenshaw_sin(coefficients: np.ndarray, x: np.ndarray) -> np.ndarray:
+    # sum c_k sin(2 k x) for k = 1..len(coefficients)
+    cos2x = 2 * np.cos(2 * x)
+    b1, b2 = np.zeros_like(x), np.zeros_like(x)
+    for c in coefficients[::-1]:
+        b1, b2 = c + cos2x * b1 - b2, b1
+    return b1 * np.sin(2 * x)
+
+
+def _sine_coefficients(x: np.ndarray, delta: np.ndarray, terms: int) -> np.ndarray:
+    # c_k = 4 / pi * integral over [0, pi/2] of delta(x) sin(2 k x), on the uniform grid x (rectangle rule, spectral
+    # accuracy as delta is smooth and odd)
+    k = np.arange(1, terms + 1)
+    return 4 / (2 * len(x)) * (delta[None, :] * np.sin(2 * k[:, None] * x[None, :])).sum(axis=1)
+
+
+class LatitudeConverter:
+
+    def __init__(self, a: float = wgs84_a, f: float = wgs84_f, terms: int = 8):
+        e2 = f * (2 - f)
+        e = np.sqrt(e2)
+
+        def q(phi):
+            s = np.sin(phi)
+            return (1 - e2) * (s / (1 - e2 * s * s) - np.log((1 - e * s) / (1 + e * s)) / (2 * e))
+
+        x = (np.arange(_samples) + 0.5) * (np.pi / 2) / _samples
+        authalic = np.arcsin(np.clip(q(x) / q(np.pi / 2), -1, 1))
+        self.to_authalic_coefficients = _sine_coefficients(x, authalic - x, terms)
+        # geodetic latitude of the authalic latitudes x, phi = x - sum c_k sin(2 k phi)
+        phi = x.copy()
+        for _ in range(50):
+            phi = x - _clenshaw_sin(self.to_authalic_coefficients, phi)
+        self.to_geodetic_coefficients = _sine_coefficients(x, phi - x, terms)
+        self.a, self.f = a, f
+
+    def to_authalic(self, lat: np.ndarray) -> np.ndarray:
+        # degrees
+        lat = np.radians(np.asarray(lat, dtype=np.float64))
+        return np.degrees(lat + _clenshaw_sin(self.to_authalic_coefficients, lat))
+
+    def to_geodetic(self, lat: np.ndarray) -> np.ndarray:
+        # degrees
+        lat = np.radians(np.asarray(lat, dtype=np.float64))
+        return np.degrees(lat + _clenshaw_sin(self.to_geodetic_coefficients, lat))
+
+    def _transform(self, geometry: Any, func) -> Any:
+        def convert(coords):
+            coords = coords.copy()
+            coords[:, 1] = func(coords[:, 1])
+            return coords
+        return shapely.transform(geometry, convert)
+
+    def geometry_to_authalic(self, geometry: Any) -> Any:
+        # a shapely geometry or an array of geometry (None kept), lon / lat coordinates
+        return self._transform(geometry, self.to_authalic)
+
+    def geometry_to_geodetic(self, geometry: Any) -> Any:
+        return self._transform(geometry, self.to_geodetic)
+
+
+@lru_cache(maxsize=None)
+def get_latitude_converter(a: float = wgs84_a, f: float = wgs84_f) -> LatitudeConverter:
+    return LatitudeConverter(a, f)
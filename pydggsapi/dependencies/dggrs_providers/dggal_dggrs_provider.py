@@ -1,9 +1,26 @@
 # here should be DGGRID related functions and methods
 # DGGRID ISEA7H resolutions
+#
+# Thread safety: DGGAL runs on the eC runtime shared by the whole process, which is not thread-safe. The providers
+# call their grid through _SerializedDGGRS, that runs one DGGAL call at a time for all the providers of the process
+# (dggal_lock). The DGGAL objects (Array, GeoExtent, CRS ...) are created, changed and read under dggal_lock too,
+# the batch helpers take it per chunk of _lock_chunk_zones zones, so that the other threads are not held for a whole
+# batch. A DGGALProvider can then be shared by the threads of the executor pools. The worker processes are spawned (see ExecutorPool.get_process_executor), not forked from the server.
+#
+# The geometry is generated in batches: the refined vertices (or the centroids) of the zones are copied from the
+# DGGAL buffers ((lat, lon) in radians) into one contiguous coordinates buffer and the shapes are built at once. The
+# zone lists of DGGAL_PROCESS_MIN_ZONES zones or more (default 20000) are partitioned across the processes of the
+# DGGALProvider executor pool (EXECUTOR_POOLS process_workers, disabled by default), each process with its own DGGAL
+# runtime and grid.
 
 from pydggsapi.dependencies.dggrs_providers.abstract_dggrs_provider import AbstractDGGRSProvider, ZoneIdRepresentationType
+from pydggsapi.dependencies.dggrs_providers.geometry_cache import get_geometry_cache
+from pydggsapi.dependencies.dggrs_providers.z7_index import z7_keys_to_textual
+from pydggsapi.dependencies.api.executors import get_executor_pool
 from pydggsapi.schemas.common_geojson import GeoJSONPolygon, GeoJSONPoint
 from pydggsapi.schemas.api.dggrs_providers import (
+    ZonesListGeometryMode,
+    ZonesGeometry,
     DGGRSProviderZoneInfoReturn,
     DGGRSProviderZonesListReturn,
     DGGRSProviderGetRelativeZoneLevelsReturn,
@@ -12,11 +29,15 @@ from pydggsapi.schemas.api.dggrs_providers import (
 )
 from pydggsapi.schemas.ogc_dggs.common_ogc_dggs_api import ReturnGeometryTypes
 
+import os
 import shapely
 import logging
-from dggal import Application, pydggal_setup, CRS, ogc, epsg, GeoExtent, Array, GeoPoint
+import threading
+import numpy as np
+from ecrt import ffi
+from dggal import Application, pydggal_setup, CRS, ogc, epsg, GeoExtent, Array, GeoPoint, nullZone, wholeWorld
 from dggal import IVEA7H, ISEA7H_Z7, rHEALPix, HEALPix
-from typing import Any, List, Union, Optional, get_args
+from typing import Any, Dict, List, Union, Optional, Tuple, get_args
 
 logger = logging.getLogger()
 supported_grids = {'IVEA7H': IVEA7H,
@@ -24,9 +45,45 @@ supported_grids = {'IVEA7H': IVEA7H,
                    'ISEA7H_Z7': ISEA7H_Z7,
                    'HEALPIX': HEALPix}
 
+dggal_process_min_zones = int(os.environ.get('DGGAL_PROCESS_MIN_ZONES', 20000))
+dggal_lock = threading.RLock()
+# number of zones generated each time dggal_lock is taken
+_lock_chunk_zones = 256
+# size of a GeoPoint in the DGGAL buffers, (lat, lon) float64 radians
+_geopoint_bytes = 16
+
+
+class _SerializedDGGRS:
+    # the methods of the DGGAL grid, called one at a time
+
+    def __init__(self, dggrs):
+        self.dggrs = dggrs
+
+    def __getattr__(self, name):
+        attr = getattr(self.dggrs, name)
+        if (not callable(attr)):
+            return attr
+
+        def call(*args, **kwargs):
+            with dggal_lock:
+                return attr(*args, **kwargs)
+        return call
+
+
+def _zones_array(zones) -> np.ndarray:
+    # the zones of a DGGAL Array as uint64, copied from its buffer
+    if (zones is None or zones.count == 0):
+        return np.zeros(0, dtype=np.uint64)
+    return np.frombuffer(bytes(ffi.buffer(zones.array, zones.count * 8)), dtype=np.uint64)
+
 
 # helper function to generate geometry geojson of a zoneId
 def generateZoneGeometry(dggrs, zone, crs=None, centroids: bool = False) -> GeoJSONPoint | GeoJSONPolygon | None:
+    with dggal_lock:
+        return _generateZoneGeometry(dggrs, zone, crs, centroids)
+
+
+def _generateZoneGeometry(dggrs, zone, crs=None, centroids: bool = False) -> GeoJSONPoint | GeoJSONPolygon | None:
     if (crs is None) or crs == CRS(ogc, 84) or crs == CRS(epsg, 4326):
         if centroids:
             centroid = dggrs.getZoneWGS84Centroid(zone)
@@ -56,24 +113,107 @@ def generateZoneGeometry(dggrs, zone, crs=None, centroids: bool = False) -> GeoJ
             return None
 
 
+# helper function to generate the coordinates of several zones at once: the (lon, lat) coordinates of the closed
+# rings (or the centroids), the number of coordinates and the mask of the zones with a geometry
+def generateZonesCoordinates(dggrs, zones, crs=None, centroids: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    chunks = []
+    for i in range(0, max(len(zones), 1), _lock_chunk_zones):
+        with dggal_lock:
+            chunks.append(_generateZonesCoordinates(dggrs, zones[i:i + _lock_chunk_zones], crs, centroids))
+    if (len(chunks) == 1):
+        return chunks[0]
+    return tuple(np.concatenate(parts) for parts in zip(*chunks))
+
+
+def _generateZonesCoordinates(dggrs, zones, crs=None, centroids: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    wgs84 = (crs is None) or crs == CRS(ogc, 84) or crs == CRS(epsg, 4326)
+    if (not wgs84):
+        return _crsZonesCoordinates(dggrs, zones, crs, centroids)
+    if centroids:
+        data = b''.join([bytes(ffi.buffer(dggrs.getZoneWGS84Centroid(z).impl, _geopoint_bytes)) for z in zones])
+        latlon = np.degrees(np.frombuffer(data, dtype=np.float64).reshape(-1, 2))
+        return latlon[:, ::-1], np.ones(len(zones), dtype=np.int64), np.ones(len(zones), dtype=bool)
+    parts, counts, valid = [], [], np.zeros(len(zones), dtype=bool)
+    for i, z in enumerate(zones):
+        vertices = dggrs.getZoneRefinedWGS84Vertices(z, 0)
+        if vertices and vertices.count > 0:
+            parts.append(bytes(ffi.buffer(vertices.array, vertices.count * _geopoint_bytes)))
+            counts.append(vertices.count)
+            valid[i] = True
+    latlon = np.degrees(np.frombuffer(b''.join(parts), dtype=np.float64).reshape(-1, 2))
+    counts = np.array(counts, dtype=np.int64)
+    # closed rings, the first vertex is repeated after the last one
+    ends = np.cumsum(counts)
+    coords = np.insert(latlon[:, ::-1], ends, latlon[ends - counts, ::-1], axis=0)
+    return coords, counts + 1, valid
+
+
+def _crsZonesCoordinates(dggrs, zones, crs, centroids: bool) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    if centroids:
+        points = [dggrs.getZoneCRSCentroid(z, crs) for z in zones]
+        coords = np.array([(p.lon.value, p.lat.value) for p in points], dtype=np.float64).reshape(-1, 2)
+        return coords, np.ones(len(zones), dtype=np.int64), np.ones(len(zones), dtype=bool)
+    coords, counts, valid = [], [], np.zeros(len(zones), dtype=bool)
+    for i, z in enumerate(zones):
+        vertices = dggrs.getZoneRefinedCRSVertices(z, crs, 0)
+        if vertices:
+            ring = [(vertices[i].x.value, vertices[i].y.value) for i in range(vertices.count)]
+            coords += ring + [ring[0]]
+            counts.append(len(ring) + 1)
+            valid[i] = True
+    return np.array(coords, dtype=np.float64).reshape(-1, 2), np.array(counts, dtype=np.int64), valid
+
+
+def _coordinatesToGeometry(coords: np.ndarray, counts: np.ndarray, valid: np.ndarray, centroids: bool) -> ZonesGeometry:
+    if centroids:
+        return ZonesGeometry(shapely.points(coords))
+    geometry = np.full(len(valid), None, dtype=object)
+    if (valid.any()):
+        ring_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        geometry[valid] = shapely.from_ragged_array(shapely.GeometryType.POLYGON, np.ascontiguousarray(coords),
+                                                    (ring_offsets, np.arange(len(ring_offsets), dtype=np.int64)))
+    return ZonesGeometry(geometry)
+
+
+# helper function to generate the geometry of several zones at once from the flat coordinates buffer
+def generateZonesGeometry(dggrs, zones, crs=None, centroids: bool = False) -> ZonesGeometry:
+    return _coordinatesToGeometry(*generateZonesCoordinates(dggrs, zones, crs, centroids), centroids)
+
+
+# DGGAL runtime and grids of the executor pool processes
+_process_grids: Dict[str, Any] = {}
+
+
+def _processZonesCoordinates(grid_name: str, zones: List[int], centroids: bool) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    if (grid_name not in _process_grids):
+        app = Application(appGlobals=globals())
+        pydggal_setup(app)
+        _process_grids[grid_name] = (app, supported_grids[grid_name]())
+    return generateZonesCoordinates(_process_grids[grid_name][1], zones, None, centroids)
+
+
 def generateZoneExtent(dggrs, zoneId):
-    geoextent = GeoExtent()
-    dggrs.getZoneWGS84Extent(zoneId, geoextent)
-    minx, miny, maxx, maxy = geoextent.ll.lon.value, geoextent.ll.lat.value, geoextent.ur.lon.value, geoextent.ur.lat.value
+    with dggal_lock:
+        geoextent = GeoExtent()
+        dggrs.getZoneWGS84Extent(zoneId, geoextent)
+        minx, miny, maxx, maxy = geoextent.ll.lon.value, geoextent.ll.lat.value, geoextent.ur.lon.value, geoextent.ur.lat.value
     extent = shapely.box(minx, miny, maxx, maxy)
     return extent
 
 
 class DGGALProvider(AbstractDGGRSProvider):
     def __init__(self, **params):
-        self.app = Application(appGlobals=globals())
-        pydggal_setup(self.app)
         self.grid_name = params.get('grid', 'IVEA7H').upper()
         try:
-            self.mygrid = supported_grids[self.grid_name]()
+            with dggal_lock:
+                self.app = Application(appGlobals=globals())
+                pydggal_setup(self.app)
+                self.mygrid = _SerializedDGGRS(supported_grids[self.grid_name]())
         except KeyError:
             logger.error(f'{__name__} grid: {self.grid_name} not supported')
             raise Exception(f'{__name__} grid: {self.grid_name} not supported')
+        self.geometry_cache = get_geometry_cache()
+        self.geometry_cache_id = f'dggal:{self.grid_name}'
 
     def convert(self, zoneIds: List[str], targedggrs: str,
                 zone_id_repr: ZoneIdRepresentationType = 'textual') -> DGGRSProviderConversionReturn:
@@ -99,11 +239,8 @@ class DGGALProvider(AbstractDGGRSProvider):
         if (zone_id_repr == "textual"):
             return cellIds
         if (zone_id_repr == "int"):
-            # get_data return zone id in string format
-            if (isinstance(cellIds[0], str)):
-                return [self.mygrid.getZoneTextID(int(z)) for z in cellIds]
-            else:
-                return [self.mygrid.getZoneTextID(z) for z in cellIds]
+            # get_data return zone id in string format, or numpy integers
+            return [self.mygrid.getZoneTextID(int(z)) for z in cellIds]
         if (zone_id_repr == "hexstring"):
             raise ValueError("{__name__} dggal doesn't support hexstring zone id representation")
 
@@ -113,9 +250,11 @@ class DGGALProvider(AbstractDGGRSProvider):
     def get_zone_level_by_cls(self, cls_km: float):
         return self.mygrid.getLevelFromMetersPerSubZone(cls_km * 1000, 0)
 
-    def get_cells_zone_level(self, cellIds: List[str]) -> List[int]:
-        cellId = self.mygrid.getZoneFromTextID(cellIds[0])
-        return [self.mygrid.getZoneLevel(cellId)]
+    def get_cells_zone_level(self, cellIds: List[str]) -> np.ndarray:
+        zones = [self.mygrid.getZoneFromTextID(cellId) for cellId in cellIds]
+        if (nullZone in zones):
+            raise Exception(f'{__name__} invalid zone id {[c for c, z in zip(cellIds, zones) if (z == nullZone)]}')
+        return np.array([self.mygrid.getZoneLevel(z) for z in zones], dtype=np.int8)
 
     def get_relative_zonelevels(self, cellId: str, base_level: int, zone_levels: List[int],
                                 geometry: Optional[ReturnGeometryTypes] = 'zone-region') -> DGGRSProviderGetRelativeZoneLevelsReturn:
@@ -123,26 +262,22 @@ class DGGALProvider(AbstractDGGRSProvider):
         geometry = geometry.lower() if (geometry is not None) else geometry
         cellId = self.mygrid.getZoneFromTextID(cellId)
         for z in zone_levels:
-            subzoneIds = self.mygrid.getSubZones(cellId, (z - base_level))
+            with dggal_lock:
+                subzoneIds = _zones_array(self.mygrid.getSubZones(cellId, (z - base_level)))
             subzones_geometry = None
             if (geometry is not None):
-                subzones_geometry = [generateZoneGeometry(self.mygrid, cellId, None, False if (geometry == 'zone-region') else True)
-                                     for cellId in subzoneIds]
-            subzoneIds = [self.mygrid.getZoneTextID(id_) for id_ in subzoneIds]
+                subzones_geometry = self._zones_geometry(subzoneIds, geometry)
+            subzoneIds = self._zone_text_ids(subzoneIds)
             children[z] = DGGRSProviderZonesElement(**{'zoneIds': subzoneIds,
                                                        'geometry': subzones_geometry})
         return DGGRSProviderGetRelativeZoneLevelsReturn(relative_zonelevels=children)
 
     def zonesinfo(self, cellIds: List[str]) -> DGGRSProviderZoneInfoReturn:
-        zone_level = self.get_cells_zone_level(cellIds)[0]
+        zone_level = int(self.get_cells_zone_level(cellIds[:1])[0])
         cellIds = [self.mygrid.getZoneFromTextID(cellId) for cellId in cellIds]
         try:
-            centroids = [generateZoneGeometry(self.mygrid, cellId, None, True)
-                         for cellId in cellIds]
-            #centroids = [GeoJSONPoint(**eval(shapely.to_geojson(c))) for c in centroids]
-            hex_vertices = [generateZoneGeometry(self.mygrid, cellId, None, False)
-                            for cellId in cellIds]
-            #hex_vertices = [GeoJSONPolygon(**eval(shapely.to_geojson(g))) for g in hex_vertices]
+            centroids = self._zones_geometry(cellIds, 'zone-centroid')
+            hex_vertices = self._zones_geometry(cellIds, 'zone-region')
             extents = [generateZoneExtent(self.mygrid, cellId) for cellId in cellIds]
             extents = [b.bounds for b in extents]
         except Exception as e:
@@ -153,38 +288,79 @@ class DGGALProvider(AbstractDGGRSProvider):
                                               'areaMetersSquare': self.mygrid.getRefZoneArea(zone_level)})
 
     def zoneslist(self, bbox: Union[shapely.box, None], zone_level: int, parent_zone: Union[str, int, None],
-                  returngeometry: ReturnGeometryTypes, compact: bool = True) -> List[str]:
+                  returngeometry: ReturnGeometryTypes, compact: bool = True,
+                  geometry_mode: ZonesListGeometryMode = 'eager') -> DGGRSProviderZonesListReturn:
         if (bbox is not None):
             try:
                 bbox = shapely.bounds(bbox)
-                geoextent = GeoExtent(GeoPoint(bbox[1], bbox[0]), GeoPoint(bbox[3], bbox[2]))
-                zones_list = self.mygrid.listZones(zone_level, geoextent)
-                zones_list = set(int(z) for z in zones_list)
+                with dggal_lock:
+                    geoextent = GeoExtent(GeoPoint(bbox[1], bbox[0]), GeoPoint(bbox[3], bbox[2]))
+                    zones_list = _zones_array(self.mygrid.listZones(zone_level, geoextent))
             except Exception as e:
                 logger.error(f'{__name__} query zones list, bbox: {bbox} dggrid convert failed :{e}')
                 raise Exception(f"{__name__} query zones list, bbox: {bbox} dggrid convert failed {e}")
             logger.info(f'{__name__} query zones list, number of hexagons: {len(zones_list)}')
         if (parent_zone is not None):
             try:
-                parent_zone_level = self.get_cells_zone_level([parent_zone])[0]
+                parent_zone_level = int(self.get_cells_zone_level([parent_zone])[0])
                 parent_zone = self.mygrid.getZoneFromTextID(parent_zone)
-                subzones_list = self.mygrid.getSubZones(parent_zone, (zone_level - parent_zone_level))
-                subzones_list = set(int(z) for z in subzones_list)
-                zones_list = (zones_list & subzones_list) if (bbox is not None) else subzones_list
+                with dggal_lock:
+                    subzones_list = _zones_array(self.mygrid.getSubZones(parent_zone, (zone_level - parent_zone_level)))
+                zones_list = np.intersect1d(zones_list, subzones_list) if (bbox is not None) else subzones_list
             except Exception as e:
                 logger.error(f'{__name__} query zones list, parent_zone: {parent_zone} get children failed {e}')
                 raise Exception(f'parent_zone: {parent_zone} get children failed {e}')
         if (len(zones_list) == 0):
             raise Exception(f"{__name__} Parent zone {parent_zone} is not with in bbox: {bbox} at zone level {zone_level}")
         if (compact):
-            compact_list = Array("<DGGRSZone>")
-            [compact_list.add(int(z)) for z in zones_list]
-            self.mygrid.compactZones(compact_list)
-            zones_list = [int(z) for z in compact_list]
+            with dggal_lock:
+                compact_list = Array("<DGGRSZone>")
+                [compact_list.add(z) for z in np.unique(zones_list).tolist()]
+                self.mygrid.compactZones(compact_list)
+                zones_list = _zones_array(compact_list)
             logger.info(f'{__name__} query zones list, compact : {len(zones_list)}')
-        zones_geometry = [generateZoneGeometry(self.mygrid, z, None, False if (returngeometry == 'zone-region') else True) for z in zones_list]
-        returnedAreaMetersSquare = [self.mygrid.getZoneArea(z) for z in zones_list]
-        zones_list = [self.mygrid.getZoneTextID(z) for z in zones_list]
-        return DGGRSProviderZonesListReturn(**{'zones': zones_list,
-                                               'geometry': zones_geometry,
-                                               'returnedAreaMetersSquare': returnedAreaMetersSquare})
+        zones_geometry = None
+        if (geometry_mode == 'eager'):
+            zones_geometry = self._zones_geometry(zones_list, returngeometry)
+        returnedAreaMetersSquare = [self.mygrid.getZoneArea(z) for z in zones_list.tolist()]
+        zones_list = self._zone_text_ids(zones_list)
+        result = DGGRSProviderZonesListReturn(**{'zones': zones_list,
+                                                 'geometry': zones_geometry,
+                                                 'returnedAreaMetersSquare': returnedAreaMetersSquare})
+        if (geometry_mode == 'lazy'):
+            result.set_geometry_loader(lambda cellIds: self._zones_geometry([self.mygrid.getZoneFromTextID(c) for c in cellIds],
+                                                                            returngeometry))
+        return result
+
+    def level_zone_ids(self, zone_level: int) -> List[str]:
+        with dggal_lock:
+            zones = _zones_array(self.mygrid.listZones(zone_level, wholeWorld))
+        return self._zone_text_ids(zones)
+
+    def generate_zones_geometry(self, cellIds: List[str], returngeometry: ReturnGeometryTypes) -> ZonesGeometry:
+        return self._generate_zones_geometry([self.mygrid.getZoneFromTextID(c) for c in cellIds], returngeometry)
+
+    def _zone_text_ids(self, zones: np.ndarray) -> List[str]:
+        # the ISEA7H_Z7 zones are the Z7 index keys
+        if (self.grid_name == 'ISEA7H_Z7'):
+            return z7_keys_to_textual(np.asarray(zones, dtype=np.uint64))
+        return [self.mygrid.getZoneTextID(z) for z in np.asarray(zones, dtype=np.uint64).tolist()]
+
+    def _zones_geometry(self, zones: List[int], returngeometry: ReturnGeometryTypes) -> ZonesGeometry:
+        # only the zones missing from the geometry cache are generated
+        zones = np.asarray(zones, dtype=np.uint64)
+        return self.geometry_cache.zones_geometry(self.geometry_cache_id, returngeometry, zones, zones,
+                                                  lambda positions: self._generate_zones_geometry(zones[positions].tolist(), returngeometry))
+
+    def _generate_zones_geometry(self, zones: List[int], returngeometry: ReturnGeometryTypes) -> ZonesGeometry:
+        centroids = (returngeometry != 'zone-region')
+        pool = get_executor_pool(type(self).__name__) if (len(zones) >= dggal_process_min_zones) else None
+        executor = pool.get_process_executor() if (pool is not None) else None
+        if (executor is None):
+            return generateZonesGeometry(self.mygrid, zones, None, centroids)
+        # partitioned across the processes of the pool
+        chunks = np.array_split(np.asarray(zones, dtype=np.uint64), pool.config.process_workers)
+        futures = [executor.submit(_processZonesCoordinates, self.grid_name, c.tolist(), centroids) for c in chunks if (len(c) > 0)]
+        results = [f.result() for f in futures]
+        return _coordinatesToGeometry(np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results]),
+                                      np.concatenate([r[2] for r in results]), centroids)
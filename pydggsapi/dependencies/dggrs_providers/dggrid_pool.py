@@ -0,0 +1,182 @@
+# DGGRID worker pool
+#
+# DGGRID is a command line tool, every operation writes a metafile and its inputs, runs the executable and reads
+# its outputs. dggrid4py runs it from the working directory of the DGGRIDv8 instance by changing the working
+# directory of the whole process, so two operations must not run at the same time. The pool keeps DGGRID_WORKERS
+# instances (default 4), each one with its own working directory, and runs DGGRID with the working directory of
+# the subprocess instead, the operations of concurrent requests run in parallel.
+#
+# The operations on a list of zone IDs (centroids or polygons of the zones) waiting for a worker are merged into
+# a single DGGRID run when they share the same operation, refinement level and settings, each caller gets back
+# the rows of its own zones.
+#
+# The pool counts the runs, the merged calls, the time spent waiting for a worker and running DGGRID
+# (DGGRIDWorkerPool.metrics), they are logged at debug level after each run.
+
+from dggrid4py import DGGRIDv8
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional
+import pandas as pd
+import subprocess
+import threading
+import tempfile
+import logging
+import shutil
+import atexit
+import uuid
+import time
+import os
+
+logger = logging.getLogger()
+
+
+class DGGRIDWorker(DGGRIDv8):
+
+    def run(self, dggs_meta_ops):
+        # same as DGGRIDv8.run, with the working directory of the subprocess instead of os.chdir
+        metafile = os.path.join(self.working_dir, f'metafile_{uuid.uuid4()}')
+        self.last_ops_meta = dggs_meta_ops
+        try:
+            with open(metafile, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(dggs_meta_ops) + '\n')
+            o = subprocess.run([str(self.executable), metafile], cwd=self.working_dir,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        except Exception as e:
+            self.last_run_successful = False
+            self.last_run_logs = repr(e)
+            logger.error(f'{__name__} DGGRID run failed: {e}')
+            return -1
+        self.last_run_successful = (o.returncode == 0)
+        self.last_run_logs = o.stdout.decode().strip() if (self.capture_logs) else ''
+        if (self.last_run_successful and not self.debug):
+            try:
+                os.remove(metafile)
+            except OSError:
+                pass
+        return o.returncode
+
+
+@dataclass
+class _Batch:
+    cellIds: List[List[str]] = field(default_factory=list)
+    started: bool = False
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Any = None
+    error: Optional[Exception] = None
+
+
+class DGGRIDWorkerPool:
+
+    def __init__(self, executable: str, workers: int, working_dir: Optional[str] = None):
+        self.working_dir = working_dir if (working_dir is not None) else tempfile.mkdtemp(prefix='pydggsapi_dggrid_')
+        self._idle = []
+        for i in range(max(workers, 1)):
+            worker_dir = os.path.join(self.working_dir, f'worker_{i}')
+            os.makedirs(worker_dir, exist_ok=True)
+            self._idle.append(DGGRIDWorker(executable=executable, working_dir=worker_dir, silent=True))
+        self.workers = len(self._idle)
+        self._cond = threading.Condition()
+        self._batches: Dict[Hashable, _Batch] = {}
+        self._metrics = {'runs': 0, 'merged_calls': 0, 'waiting': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0,
+                         'run_seconds': 0.0, 'max_run_seconds': 0.0}
+
+    def metrics(self) -> Dict[str, float]:
+        with self._cond:
+            metrics = self._metrics.copy()
+            metrics['busy'] = self.workers - len(self._idle)
+        return metrics
+
+    @contextmanager
+    def worker(self) -> Iterator[DGGRIDWorker]:
+        start = time.monotonic()
+        with self._cond:
+            self._metrics['waiting'] += 1
+            while (len(self._idle) == 0):
+                self._cond.wait()
+            self._metrics['waiting'] -= 1
+            worker = self._idle.pop()
+        wait = time.monotonic() - start
+        start = time.monotonic()
+        try:
+            yield worker
+        finally:
+            elapsed = time.monotonic() - start
+            with self._cond:
+                self._idle.append(worker)
+                m = self._metrics
+                m['runs'] += 1
+                m['wait_seconds'] += wait
+                m['max_wait_seconds'] = max(m['max_wait_seconds'], wait)
+                m['run_seconds'] += elapsed
+                m['max_run_seconds'] = max(m['max_run_seconds'], elapsed)
+                self._cond.notify()
+            logger.debug(f'{__name__} DGGRID run: waited {wait:.3f}s, ran {elapsed:.3f}s')
+
+    def run(self, func: Callable[[DGGRIDWorker], Any]) -> Any:
+        with self.worker() as worker:
+            return func(worker)
+
+    def run_batched(self, key: Hashable, cellIds: List[str],
+                    func: Callable[[DGGRIDWorker, List[str]], pd.DataFrame]) -> pd.DataFrame:
+        # func(worker, cellIds) returns one row per zone in the 'name' column. The calls with the same key
+        # arriving while the first one waits for a worker are merged into its run.
+        with self._cond:
+            batch = self._batches.get(key)
+            leader = (batch is None)
+            if (leader):
+                batch = self._batches[key] = _Batch()
+            else:
+                self._metrics['merged_calls'] += 1
+            batch.cellIds.append(cellIds)
+        if (leader):
+            try:
+                with self.worker() as worker:
+                    with self._cond:
+                        # no more calls are merged once the worker is acquired
+                        del self._batches[key]
+                    merged = batch.cellIds[0] if (len(batch.cellIds) == 1) else \
+                        pd.unique(pd.Series([c for ids in batch.cellIds for c in ids], dtype=object)).tolist()
+                    batch.result = func(worker, merged)
+            except Exception as e:
+                batch.error = e
+            finally:
+                with self._cond:
+                    if (self._batches.get(key) is batch):
+                        del self._batches[key]
+                batch.done.set()
+        else:
+            batch.done.wait()
+        if (batch.error is not None):
+            raise batch.error
+        if (len(batch.cellIds) == 1):
+            return batch.result
+        result = batch.result
+        return result[result['name'].astype(str).isin(pd.Index(cellIds).astype(str))].reset_index(drop=True)
+
+    def close(self):
+        shutil.rmtree(self.working_dir, ignore_errors=True)
+
+
+_pools: Dict[str, DGGRIDWorkerPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_dggrid_pool(executable: str) -> DGGRIDWorkerPool:
+    # one pool per DGGRID executable, shared by the IGEO7 providers
+    with _pools_lock:
+        pool = _pools.get(executable)
+        if (pool is None):
+            workers = int(os.environ.get('DGGRID_WORKERS', 4))
+            pool = _pools[executable] = DGGRIDWorkerPool(executable, workers)
+            logger.info(f'{__name__} DGGRID pool created with {pool.workers} workers in {pool.working_dir}')
+        return pool
+
+
+@atexit.register
+def close_dggrid_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
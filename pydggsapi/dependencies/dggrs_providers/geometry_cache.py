@@ -0,0 +1,500 @@
+# Zone geometry cache
+#
+# The geometry of a zone never changes, the providers generate it through the cache (ZoneGeometryCache.zones_geometry)
+# and only compute the zones missing from it. The cache is shared by all the providers, an entry is keyed by the
+# geometry id of the provider (the DGGRS and the settings changing its geometry), the zone and the geometry type.
+# Only the polygons without holes (zone-region) and the points (zone-centroid) are cached.
+#
+# The in-memory tier is a LRU of the coordinates of the zones (the exterior ring of the polygons, the point of the
+# centroids) as float64 buffers, bounded by ZONE_GEOMETRY_CACHE_BYTES (default 256 MiB, 0 disables it).
+#
+# With ZONE_GEOMETRY_CACHE_DIR set, the geometry computed by a worker is also written to segment files of the
+# directory, once ZONE_GEOMETRY_CACHE_SEGMENT_ZONES zones (default 100000) are pending and at exit. The segments are
+# memory-mapped by all the workers sharing the directory and looked up on the uint64 keys of the zones (the providers
+# without integer zone IDs use the in-memory tier only). A segment is a flat file: a 32 bytes header (magic, number
+# of zones, number of coordinates), the sorted uint64 keys, the int64 offsets of the coordinates of each zone
+# (number of zones + 1) and the float64 (x, y) coordinates. Once a DGGRS geometry has more than
+# ZONE_GEOMETRY_CACHE_MAX_SEGMENTS segments (default 8), a worker merges them into one segment (a zone is kept once),
+# and the oldest segments of the directory are removed beyond ZONE_GEOMETRY_CACHE_DIR_MAX_BYTES (default 2 GiB, 0 for
+# unlimited). The workers drop the removed segments at their next scan.
+#
+# The geometry store (ZONE_GEOMETRY_STORE_DIR) holds one precomputed segment per provider geometry id and geometry
+# type, with all the zones of the first refinement levels, built offline by `pydggsapi-geometry-store` (see
+# geometry_store). It is looked up first and the geometry is built straight from the memory-mapped coordinates,
+# without going through the in-memory tier, the workers share it through the page cache. The store files are opened
+# on first use, a rebuilt store is picked up after a restart.
+
+from pydggsapi.schemas.api.dggrs_providers import ZonesGeometry
+
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+import numpy as np
+import re
+import threading
+import hashlib
+import logging
+import shapely
+import atexit
+import uuid
+import time
+import os
+
+logger = logging.getLogger()
+
+geometry_types = ('zone-region', 'zone-centroid')
+segment_magic = b'PYDGGSG1'
+segment_header_size = 32
+# approximate size of the key and of the LRU entry of a zone
+_entry_overhead = 96
+# seconds between two scans of the segments written by the other workers
+_rescan_seconds = 10
+# a merge lock older than that is left by a stopped worker
+_merge_lock_seconds = 600
+
+
+def geometry_to_coordinates(geometry: np.ndarray, geometry_type: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # the cacheable geometry (mask), their coordinates and the number of coordinates of each one
+    geometry = np.asarray(geometry, dtype=object)
+    type_id = shapely.get_type_id(geometry)
+    if (geometry_type == 'zone-region'):
+        cacheable = (type_id == shapely.GeometryType.POLYGON)
+        cacheable[cacheable] = (shapely.get_num_interior_rings(geometry[cacheable]) == 0) & ~shapely.is_empty(geometry[cacheable])
+        parts = shapely.get_exterior_ring(geometry[cacheable])
+    else:
+        cacheable = (type_id == shapely.GeometryType.POINT)
+        cacheable[cacheable] = ~shapely.is_empty(geometry[cacheable])
+        parts = geometry[cacheable]
+    coords, index = shapely.get_coordinates(parts, return_index=True)
+    return cacheable, coords, np.bincount(index, minlength=len(parts)).astype(np.int64)
+
+
+def coordinates_to_geometry(coords: np.ndarray, counts: np.ndarray, geometry_type: str) -> np.ndarray:
+    if (len(counts) == 0):
+        return np.empty(0, dtype=object)
+    if (geometry_type == 'zone-region'):
+        ring_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return shapely.from_ragged_array(shapely.GeometryType.POLYGON, np.ascontiguousarray(coords, dtype=np.float64),
+                                         (ring_offsets, np.arange(len(counts) + 1, dtype=np.int64)))
+    return shapely.points(coords)
+
+
+def ragged_take(coords: np.ndarray, offsets: np.ndarray, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # coordinates of the items at positions of a ragged buffer (item i is coords[offsets[i]:offsets[i + 1]])
+    positions = np.asarray(positions, dtype=np.int64)
+    starts = offsets[positions]
+    counts = offsets[positions + 1] - starts
+    index = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(int(counts.sum()), dtype=np.int64)
+    return coords[index], counts
+
+
+class GeometrySegment:
+    # read-only, memory-mapped segment
+
+    def __init__(self, path: str):
+        self.path = path
+        data = np.memmap(path, dtype=np.uint8, mode='r')
+        if (len(data) < segment_header_size or bytes(data[:8]) != segment_magic):
+            raise ValueError(f'{__name__} {path} is not a geometry segment')
+        n, m = (int(v) for v in data[8:24].view(np.uint64))
+        end = segment_header_size + 8 * n + 8 * (n + 1) + 16 * m
+        if (len(data) != end):
+            raise ValueError(f'{__name__} {path} geometry segment is truncated')
+        start = segment_header_size
+        self.keys = data[start:start + 8 * n].view(np.uint64)
+        start += 8 * n
+        self.offsets = data[start:start + 8 * (n + 1)].view(np.int64)
+        start += 8 * (n + 1)
+        self.coords = data[start:end].view(np.float64).reshape(-1, 2)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def lookup(self, keys: np.ndarray) -> np.ndarray:
+        # positions of the keys in the segment, -1 if missing
+        if (len(self.keys) == 0):
+            return np.full(len(keys), -1, dtype=np.int64)
+        positions = np.searchsorted(self.keys, keys).clip(max=len(self.keys) - 1)
+        return np.where(self.keys[positions] == keys, positions, -1)
+
+    def coordinates(self, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return ragged_take(self.coords, self.offsets, positions)
+
+    @staticmethod
+    def write(path: str, keys: np.ndarray, coords: np.ndarray, counts: np.ndarray):
+        writer = GeometrySegmentWriter(path)
+        writer.add(keys, coords, counts)
+        writer.close()
+
+
+class GeometrySegmentWriter:
+    # the coordinates are streamed into a temporary file, the segment is written sorted by key (a key written
+    # once) when closed and replaces path atomically
+
+    def __init__(self, path: str, chunk_zones: int = 1 << 20):
+        self.path = path
+        self.chunk_zones = chunk_zones
+        self._tmp = f'{path}.{uuid.uuid4()}.tmp'
+        self._coords_path = f'{self._tmp}.coords'
+        self._coords = open(self._coords_path, 'wb')
+        self._keys: List[np.ndarray] = []
+        self._counts: List[np.ndarray] = []
+
+    def add(self, keys: np.ndarray, coords: np.ndarray, counts: np.ndarray):
+        self._keys.append(np.asarray(keys, dtype=np.uint64))
+        self._counts.append(np.asarray(counts, dtype=np.int64))
+        self._coords.write(np.ascontiguousarray(coords, dtype=np.float64).tobytes())
+
+    def close(self) -> int:
+        self._coords.close()
+        try:
+            keys = np.concatenate(self._keys) if (len(self._keys) > 0) else np.zeros(0, dtype=np.uint64)
+            counts = np.concatenate(self._counts) if (len(self._counts) > 0) else np.zeros(0, dtype=np.int64)
+            offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+            coords = np.memmap(self._coords_path, dtype=np.float64, mode='r').reshape(-1, 2) if (offsets[-1] > 0) \
+                else np.zeros((0, 2), dtype=np.float64)
+            unique_keys, first = np.unique(keys, return_index=True)
+            header = np.zeros(segment_header_size, dtype=np.uint8)
+            header[:8] = np.frombuffer(segment_magic, dtype=np.uint8)
+            header[8:24] = np.array([len(unique_keys), counts[first].sum()], dtype=np.uint64).view(np.uint8)
+            with open(self._tmp, 'wb') as f:
+                f.write(header.tobytes())
+                f.write(unique_keys.tobytes())
+                f.write(np.concatenate([[0], np.cumsum(counts[first])]).astype(np.int64).tobytes())
+                for i in range(0, len(first), self.chunk_zones):
+                    f.write(ragged_take(coords, offsets, first[i:i + self.chunk_zones])[0].tobytes())
+            del coords
+            os.replace(self._tmp, self.path)
+        finally:
+            for tmp in (self._tmp, self._coords_path):
+                if (os.path.exists(tmp)):
+                    os.remove(tmp)
+        return len(unique_keys)
+
+
+def geometry_store_filename(cache_id: str, geometry_type: str) -> str:
+    return f"{re.sub(r'[^A-Za-z0-9_.-]', '_', cache_id)}-{geometry_type}.seg"
+
+
+class _GeometryStore:
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._segments: Dict[Tuple[str, str], Optional[GeometrySegment]] = {}
+
+    def segment(self, cache_id: str, geometry_type: str) -> Optional[GeometrySegment]:
+        name = (cache_id, geometry_type)
+        with self._lock:
+            if (name not in self._segments):
+                path = os.path.join(self.directory, geometry_store_filename(cache_id, geometry_type))
+                segment = None
+                if (os.path.exists(path)):
+                    try:
+                        segment = GeometrySegment(path)
+                        logger.info(f'{__name__} geometry store {path} with {len(segment)} zones')
+                    except (ValueError, OSError) as e:
+                        logger.error(f'{__name__} geometry store {path} can not be read: {e}')
+                self._segments[name] = segment
+            return self._segments[name]
+
+
+class _SegmentsDirectory:
+
+    def __init__(self, directory: str, segment_zones: int, max_bytes: int = 0, max_segments: int = 8):
+        self.directory = directory
+        self.segment_zones = max(segment_zones, 1)
+        self.max_bytes = max_bytes
+        self.max_segments = max(max_segments, 1)
+        self._lock = threading.Lock()
+        # (cache id, geometry type) -> {path: segment}, last scan time
+        self._segments: Dict[Tuple[str, str], Dict[str, GeometrySegment]] = {}
+        self._scanned: Dict[Tuple[str, str], float] = {}
+        # (cache id, geometry type) -> [(keys, coords, counts)]
+        self._pending: Dict[Tuple[str, str], List[Tuple[np.ndarray, np.ndarray, np.ndarray]]] = {}
+
+    def _subdir(self, name: Tuple[str, str]) -> str:
+        return os.path.join(self.directory, hashlib.sha1('|'.join(name).encode()).hexdigest()[:16])
+
+    def _segment_paths(self, name: Tuple[str, str]) -> List[str]:
+        subdir = self._subdir(name)
+        return [e.path for e in os.scandir(subdir) if (e.name.endswith('.seg'))] if (os.path.isdir(subdir)) else []
+
+    def _current_segments(self, name: Tuple[str, str]) -> List[GeometrySegment]:
+        with self._lock:
+            segments = self._segments.setdefault(name, {})
+            if (time.monotonic() - self._scanned.get(name, -_rescan_seconds) >= _rescan_seconds):
+                self._scanned[name] = time.monotonic()
+                # the segments merged or removed by the other workers are dropped
+                scanned = {}
+                for path in self._segment_paths(name):
+                    try:
+                        scanned[path] = segments[path] if (path in segments) else GeometrySegment(path)
+                    except (ValueError, OSError) as e:
+                        logger.warning(f'{__name__} skip geometry segment {path}: {e}')
+                self._segments[name] = segments = scanned
+            return list(segments.values())
+
+    def lookup(self, cache_id: str, geometry_type: str, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # found mask of the keys, coordinates and counts of the found zones in the order of keys
+        found = np.zeros(len(keys), dtype=bool)
+        parts = []
+        for segment in self._current_segments((cache_id, geometry_type)):
+            remaining = np.flatnonzero(~found)
+            if (len(remaining) == 0):
+                break
+            positions = segment.lookup(keys[remaining])
+            hit = (positions >= 0)
+            if (hit.any()):
+                found[remaining[hit]] = True
+                parts.append((remaining[hit],) + segment.coordinates(positions[hit]))
+        if (len(parts) == 0):
+            return found, np.zeros((0, 2), dtype=np.float64), np.zeros(0, dtype=np.int64)
+        query_positions = np.concatenate([p[0] for p in parts])
+        counts = np.concatenate([p[2] for p in parts])
+        coords, counts = ragged_take(np.concatenate([p[1] for p in parts]), np.concatenate([[0], np.cumsum(counts)]),
+                                     np.argsort(query_positions, kind='stable'))
+        return found, coords, counts
+
+    def add(self, cache_id: str, geometry_type: str, keys: np.ndarray, coords: np.ndarray, counts: np.ndarray):
+        name = (cache_id, geometry_type)
+        with self._lock:
+            pending = self._pending.setdefault(name, [])
+            pending.append((keys, coords, counts))
+            if (sum(len(p[0]) for p in pending) < self.segment_zones):
+                return
+            self._pending[name] = []
+        self._write(name, pending)
+
+    def _write(self, name: Tuple[str, str], pending: List[Tuple[np.ndarray, np.ndarray, np.ndarray]]):
+        subdir = self._subdir(name)
+        os.makedirs(subdir, exist_ok=True)
+        path = os.path.join(subdir, f'{os.getpid()}_{uuid.uuid4().hex}.seg')
+        try:
+            GeometrySegment.write(path, np.concatenate([p[0] for p in pending]), np.concatenate([p[1] for p in pending]),
+                                  np.concatenate([p[2] for p in pending]))
+            segment = GeometrySegment(path)
+        except (ValueError, OSError) as e:
+            logger.error(f'{__name__} write geometry segment {path} failed: {e}')
+            return
+        with self._lock:
+            self._segments.setdefault(name, {})[path] = segment
+        logger.debug(f'{__name__} geometry segment {path} written with {len(segment)} zones')
+        self._merge(name)
+        if (self.max_bytes > 0):
+            self.prune()
+
+    def _merge(self, name: Tuple[str, str]):
+        # merges the segments of name into one, by a single worker at a time (lock file)
+        paths = self._segment_paths(name)
+        if (len(paths) <= self.max_segments):
+            return
+        lock_path = os.path.join(self._subdir(name), 'merge.lock')
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            try:
+                if (time.time() - os.path.getmtime(lock_path) > _merge_lock_seconds):
+                    os.remove(lock_path)
+            except OSError:
+                pass
+            return
+        try:
+            path = os.path.join(self._subdir(name), f'{os.getpid()}_{uuid.uuid4().hex}.seg')
+            writer = GeometrySegmentWriter(path)
+            merged = []
+            for p in paths:
+                try:
+                    segment = GeometrySegment(p)
+                except (ValueError, OSError) as e:
+                    logger.warning(f'{__name__} skip geometry segment {p}: {e}')
+                    continue
+                writer.add(segment.keys, segment.coords, np.diff(segment.offsets))
+                merged.append(p)
+            zones = writer.close()
+            segment = GeometrySegment(path)
+            for p in merged:
+                os.remove(p)
+        except (ValueError, OSError) as e:
+            logger.error(f'{__name__} merge geometry segments of {self._subdir(name)} failed: {e}')
+            return
+        finally:
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+        with self._lock:
+            segments = self._segments.setdefault(name, {})
+            [segments.pop(p, None) for p in merged]
+            segments[path] = segment
+        logger.debug(f'{__name__} {len(merged)} geometry segments merged into {path} with {zones} zones')
+
+    def prune(self):
+        # removes the oldest segments of the directory until the size fits
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if (name.endswith('.seg')):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+        total = sum([f[1] for f in files])
+        removed = set()
+        for _, size, path in sorted(files):
+            if (total <= self.max_bytes):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            removed.add(path)
+            total -= size
+        if (len(removed) > 0):
+            with self._lock:
+                for segments in self._segments.values():
+                    [segments.pop(p, None) for p in removed]
+            logger.info(f'{__name__} {len(removed)} geometry segments removed, {total} bytes left')
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for name, p in pending.items():
+            if (len(p) > 0):
+                self._write(name, p)
+
+
+class ZoneGeometryCache:
+
+    def __init__(self, max_bytes: int, directory: Optional[str] = None, segment_zones: int = 100000,
+                 store_directory: Optional[str] = None, directory_max_bytes: int = 0, directory_max_segments: int = 8):
+        self.max_bytes = max_bytes
+        self.disk = _SegmentsDirectory(directory, segment_zones, directory_max_bytes, directory_max_segments) \
+            if (directory) else None
+        self.store = _GeometryStore(store_directory) if (store_directory) else None
+        # (cache id, geometry type, zone) -> float64 coordinates buffer, LRU
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._metrics = {'store_hits': 0, 'hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    def metrics(self) -> Dict[str, int]:
+        with self._lock:
+            metrics = self._metrics.copy()
+            metrics['entries'], metrics['bytes'] = len(self._entries), self._bytes
+        return metrics
+
+    def zones_geometry(self, cache_id: str, geometry_type: str, zoneIds: List[Hashable], keys: Optional[np.ndarray],
+                       compute: Callable[[np.ndarray], ZonesGeometry]) -> ZonesGeometry:
+        # the geometry of zoneIds in their order, compute(positions) generates the geometry of the zones at positions
+        # of zoneIds missing from the cache. keys are the uint64 keys of the zones (None without integer zone IDs).
+        n = len(zoneIds)
+        if (geometry_type not in geometry_types or n == 0 or (self.max_bytes <= 0 and self.disk is None and self.store is None)):
+            return compute(np.arange(n))
+        geometry = np.full(n, None, dtype=object)
+        missing = np.arange(n)
+        store_hits = 0
+        segment = self.store.segment(cache_id, geometry_type) if (self.store is not None and keys is not None) else None
+        if (segment is not None):
+            positions = segment.lookup(keys)
+            found = (positions >= 0)
+            if (found.any()):
+                geometry[found] = coordinates_to_geometry(*segment.coordinates(positions[found]), geometry_type)
+                store_hits = int(found.sum())
+                missing = np.flatnonzero(~found)
+        names = keys.tolist() if (keys is not None) else list(zoneIds)
+        if (self.max_bytes > 0 and len(missing) > 0):
+            with self._lock:
+                buffers = [self._get((cache_id, geometry_type, names[i])) for i in missing]
+            hit = np.fromiter((b is not None for b in buffers), dtype=bool, count=len(missing))
+            if (hit.any()):
+                buffers = [b for b in buffers if (b is not None)]
+                counts = np.fromiter((len(b) // 16 for b in buffers), dtype=np.int64, count=len(buffers))
+                coords = np.frombuffer(b''.join(buffers), dtype=np.float64).reshape(-1, 2)
+                geometry[missing[hit]] = coordinates_to_geometry(coords, counts, geometry_type)
+            missing = missing[~hit]
+        disk_hits = 0
+        if (len(missing) > 0 and self.disk is not None and keys is not None):
+            found, coords, counts = self.disk.lookup(cache_id, geometry_type, keys[missing])
+            if (found.any()):
+                geometry[missing[found]] = coordinates_to_geometry(coords, counts, geometry_type)
+                self._store(cache_id, geometry_type, [names[i] for i in missing[found]], coords, counts)
+                disk_hits = int(found.sum())
+                missing = missing[~found]
+        if (len(missing) > 0):
+            computed = compute(missing).to_shapely()
+            geometry[missing] = computed
+            self.put(cache_id, geometry_type, [names[i] for i in missing], keys[missing] if (keys is not None) else None,
+                     computed)
+        with self._lock:
+            self._metrics['store_hits'] += store_hits
+            self._metrics['hits'] += n - store_hits - disk_hits - len(missing)
+            self._metrics['disk_hits'] += disk_hits
+            self._metrics['misses'] += len(missing)
+        return ZonesGeometry(geometry)
+
+    def put(self, cache_id: str, geometry_type: str, zoneIds: List[Hashable], keys: Optional[np.ndarray], geometry):
+        # adds the geometry generated by the providers outside of zones_geometry (ex. the polygons of an extent)
+        # zoneIds are the integer keys when the provider has them
+        if (geometry_type not in geometry_types or len(zoneIds) == 0):
+            return
+        cacheable, coords, counts = geometry_to_coordinates(geometry, geometry_type)
+        names = [z for z, c in zip(zoneIds, cacheable.tolist()) if (c)]
+        self._store(cache_id, geometry_type, names, coords, counts)
+        if (self.disk is not None and keys is not None and len(names) > 0):
+            self.disk.add(cache_id, geometry_type, np.asarray(keys, dtype=np.uint64)[cacheable], coords, counts)
+
+    def _get(self, key: Tuple) -> Optional[bytes]:
+        buffer = self._entries.get(key)
+        if (buffer is not None):
+            self._entries.move_to_end(key)
+        return buffer
+
+    def _store(self, cache_id: str, geometry_type: str, names: List[Hashable], coords: np.ndarray, counts: np.ndarray):
+        if (self.max_bytes <= 0 or len(names) == 0):
+            return
+        data = np.ascontiguousarray(coords, dtype=np.float64).tobytes()
+        offsets = (np.concatenate([[0], np.cumsum(counts)]) * 16).tolist()
+        with self._lock:
+            for i, z in enumerate(names):
+                key = (cache_id, geometry_type, z)
+                buffer = data[offsets[i]:offsets[i + 1]]
+                previous = self._entries.pop(key, None)
+                if (previous is not None):
+                    self._bytes -= len(previous) + _entry_overhead
+                self._entries[key] = buffer
+                self._bytes += len(buffer) + _entry_overhead
+            while (self._bytes > self.max_bytes and len(self._entries) > 0):
+                _, buffer = self._entries.popitem(last=False)
+                self._bytes -= len(buffer) + _entry_overhead
+
+    def flush(self):
+        if (self.disk is not None):
+            self.disk.flush()
+
+
+_cache: Optional[ZoneGeometryCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_geometry_cache() -> ZoneGeometryCache:
+    # one cache per process, shared by the providers
+    global _cache
+    with _cache_lock:
+        if (_cache is None):
+            _cache = ZoneGeometryCache(int(os.environ.get('ZONE_GEOMETRY_CACHE_BYTES', 256 * 1024 * 1024)),
+                                       os.environ.get('ZONE_GEOMETRY_CACHE_DIR'),
+                                       int(os.environ.get('ZONE_GEOMETRY_CACHE_SEGMENT_ZONES', 100000)),
+                                       os.environ.get('ZONE_GEOMETRY_STORE_DIR'),
+                                       int(os.environ.get('ZONE_GEOMETRY_CACHE_DIR_MAX_BYTES', 2 * 1024 ** 3)),
+                                       int(os.environ.get('ZONE_GEOMETRY_CACHE_MAX_SEGMENTS', 8)))
+            logger.info(f'{__name__} zone geometry cache of {_cache.max_bytes} bytes, directory: {os.environ.get("ZONE_GEOMETRY_CACHE_DIR")}')
+        return _cache
+
+
+@atexit.register
+def flush_geometry_cache():
+    with _cache_lock:
+        if (_cache is not None):
+            _cache.flush()
@@ -0,0 +1,81 @@
+# Zone geometry store
+#
+# Precomputed polygons and centroids of all the zones of the first refinement levels of a DGGRS, served by the zone
+# geometry cache (see geometry_cache) from ZONE_GEOMETRY_STORE_DIR. The store of a provider is one memory-mappable
+# file per geometry type: the sorted uint64 zone keys, the coordinates offsets and the float64 coordinates.
+#
+# It is built offline with `pydggsapi-geometry-store` (options `-d` DGGRS id, `-l` last refinement level, `-g`
+# geometry type, `-o` output directory), using the DGGRS providers of the API configuration. The providers need
+# integer zone IDs (AbstractDGGRSProvider.zone_id_keys) and the level_zone_ids and generate_zones_geometry methods.
+# A store is bound to the geometry id of the provider (geometry_cache_id), ex. a store built for IGEO7 with the WGS84
+# latitude conversion is not used by a provider without it.
+
+from pydggsapi.dependencies.dggrs_providers.abstract_dggrs_provider import AbstractDGGRSProvider
+from pydggsapi.dependencies.dggrs_providers.geometry_cache import (
+    GeometrySegmentWriter,
+    geometry_store_filename,
+    geometry_to_coordinates,
+    geometry_types,
+)
+
+from typing import Dict, List, Optional
+import argparse
+import logging
+import os
+
+logger = logging.getLogger()
+
+
+def build_geometry_store(dggrs_provider: AbstractDGGRSProvider, output: str, max_level: int,
+                         types: Optional[List[str]] = None, chunk_zones: int = 100000) -> List[str]:
+    # builds the store files of the provider for the levels 0 to max_level, returns their paths
+    if (dggrs_provider.geometry_cache_id is None):
+        raise ValueError(f'{__name__} {type(dggrs_provider).__name__} has no geometry cache id')
+    os.makedirs(output, exist_ok=True)
+    paths = []
+    for geometry_type in (types if (types is not None) else geometry_types):
+        path = os.path.join(output, geometry_store_filename(dggrs_provider.geometry_cache_id, geometry_type))
+        writer = GeometrySegmentWriter(path)
+        for level in range(max_level + 1):
+            zoneIds = dggrs_provider.level_zone_ids(level)
+            for i in range(0, len(zoneIds), chunk_zones):
+                chunk = zoneIds[i:i + chunk_zones]
+                keys = dggrs_provider.zone_id_keys(chunk)
+                if (keys is None):
+                    raise ValueError(f'{__name__} {type(dggrs_provider).__name__} has no integer zone IDs')
+                geometry = dggrs_provider.generate_zones_geometry(chunk, geometry_type).to_shapely()
+                cacheable, coords, counts = geometry_to_coordinates(geometry, geometry_type)
+                writer.add(keys[cacheable], coords, counts)
+            logger.info(f'{__name__} {dggrs_provider.geometry_cache_id} {geometry_type} level {level}: {len(zoneIds)} zones')
+        zones = writer.close()
+        logger.info(f'{__name__} {dggrs_provider.geometry_cache_id} {geometry_type}: {zones} zones, {os.path.getsize(path)} bytes -> {path}')
+        paths.append(path)
+    return paths
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Build the zone geometry store of the DGGRS providers into ZONE_GEOMETRY_STORE_DIR.')
+    parser.add_argument('-d', '--dggrs', action='append', default=None,
+                        help='DGGRS id (repeatable), default: all the DGGRS providers')
+    parser.add_argument('-l', '--level', type=int, default=int(os.environ.get('ZONE_GEOMETRY_STORE_LEVEL', 5)),
+                        help='last refinement level, default: ZONE_GEOMETRY_STORE_LEVEL or 5')
+    parser.add_argument('-g', '--geometry', action='append', choices=geometry_types, default=None,
+                        help='geometry type (repeatable), default: zone-region and zone-centroid')
+    parser.add_argument('-o', '--output', default=os.environ.get('ZONE_GEOMETRY_STORE_DIR'),
+                        help='output directory, default: ZONE_GEOMETRY_STORE_DIR')
+    args = parser.parse_args(argv)
+    if (args.output is None):
+        parser.error('the output directory is required (--output or ZONE_GEOMETRY_STORE_DIR)')
+    logging.basicConfig(level=logging.INFO)
+    # the DGGRS providers of the API configuration (dggs_api_config)
+    from pydggsapi.routers.dggs_api import dggrs_providers
+    providers: Dict[str, AbstractDGGRSProvider] = dggrs_providers
+    for dggrs_id in (args.dggrs if (args.dggrs is not None) else list(providers.keys())):
+        try:
+            build_geometry_store(providers[dggrs_id], args.output, args.level, args.geometry)
+        except (ValueError, NotImplementedError) as e:
+            logger.error(f'{__name__} {dggrs_id} geometry store not built: {e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,70 +1,140 @@
 # here should be DGGRID related functions and methods
 # DGGRID ISEA7H resolutions
 from pydggsapi.dependencies.dggrs_providers.abstract_dggrs_provider import AbstractDGGRSProvider, conversion_properties
+from pydggsapi.dependencies.dggrs_providers.geometry_cache import get_geometry_cache
 # from pydggsapi.dependencies.dggrs_providers.igeo7_dggrs_provider import IGEO7Provider
 
-from pydggsapi.schemas.common_geojson import GeoJSONPolygon, GeoJSONPoint
-from pydggsapi.schemas.api.dggrs_providers import DGGRSProviderZoneInfoReturn, DGGRSProviderZonesListReturn
+from pydggsapi.schemas.api.dggrs_providers import DGGRSProviderZoneInfoReturn, DGGRSProviderZonesListReturn, ZonesListGeometryMode, ZonesGeometry
 from pydggsapi.schemas.api.dggrs_providers import DGGRSProviderConversionReturn, DGGRSProviderGetRelativeZoneLevelsReturn, DGGRSProviderZonesElement
 from pydggsapi.schemas.ogc_dggs.common_ogc_dggs_api import ReturnGeometryTypes
 
+from collections import OrderedDict
+from typing import Union, Dict, List, Any, Optional
+import threading
+import itertools
 import logging
-from typing import Union, List, Any, Optional
-import time
+import os
 import shapely
 import h3
-import json
+import h3.api.numpy_int as h3_int
 import numpy as np
-import geopandas as gpd
-import pandas as pd
 from shapely.geometry import box
 
 logger = logging.getLogger()
 
+# number of h3 zones with their igeo7 zones memoized for the conversion, 0 to disable
+h3_igeo7_conversion_cache_size = int(os.environ.get('H3_IGEO7_CONVERSION_CACHE_SIZE', 100000))
+
+# The provider works on the uint64 cells (h3 numpy int API), the textual zone IDs are converted in bulk:
+# a cell is 15 hex digits, the upper 4 bits of the index are always 0
+_hex_digits = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+_hex_values = np.full(256, 255, dtype=np.uint8)
+_hex_values[_hex_digits] = np.arange(16)
+_hex_values[np.frombuffer(b'ABCDEF', dtype=np.uint8)] = np.arange(10, 16)
+_hex_shifts = np.arange(56, -4, -4, dtype=np.uint64)
+
+
+def h3textual_to_h3int(cellIds: List[str]) -> np.ndarray:
+    cells = np.asarray(cellIds)
+    if (len(cells) == 0):
+        return np.array([], dtype=np.uint64)
+    if (cells.dtype.kind in 'iu'):
+        return cells.astype(np.uint64)
+    if (cells.dtype.kind != 'U' or np.any(np.char.str_len(cells) != len(_hex_shifts))):
+        raise ValueError(f'{__name__} invalid h3 zone ids')
+    digits = _hex_values[cells.astype(f'S{len(_hex_shifts)}').view(np.uint8).reshape(len(cells), -1)]
+    if (np.any(digits == 255)):
+        raise ValueError(f'{__name__} invalid h3 zone ids')
+    return np.bitwise_or.reduce(digits.astype(np.uint64) << _hex_shifts, axis=1)
+
+
+def h3int_to_h3textual(cells: np.ndarray) -> List[str]:
+    cells = np.asarray(cells, dtype=np.uint64)
+    if (len(cells) == 0):
+        return []
+    digits = ((cells[:, None] >> _hex_shifts) & np.uint64(0xF)).astype(np.uint8)
+    return _hex_digits[digits].view(f'S{len(_hex_shifts)}').ravel().astype(f'U{len(_hex_shifts)}').tolist()
+
 
 class H3Provider(AbstractDGGRSProvider):
 
     def __init__(self, **params):
         igeo7_conversion_properties = conversion_properties(zonelevel_offset=-2)
         self.dggrs_conversion = {'igeo7': igeo7_conversion_properties}
+        # (igeo7 refinement level, h3 cell) -> igeo7 zone IDs, LRU
+        self._conversion_cache = OrderedDict()
+        self._conversion_lock = threading.Lock()
+        self.geometry_cache = get_geometry_cache()
+        self.geometry_cache_id = 'h3'
 
     def convert(self, zoneIds: list, targetdggrs: str, zone_id_repr: str = 'textual'):
         from pydggsapi.routers.dggs_api import dggrs_providers as global_dggrs_providers
         if (targetdggrs in self.dggrs_conversion):
             if (targetdggrs == 'igeo7'):
-                igeo7 = global_dggrs_providers['igeo7']
-                # convert from h3 zone's area to igeo7 refinement level
-                target_zones_refinement_list = [[h3.cell_area(id_), self._cell_to_shapely(id_, 'zone-region')] for id_ in zoneIds]
-                for i, zone in enumerate(target_zones_refinement_list):
-                    for k, v in igeo7.data.items():
-                        if (zone[0] > v['Area (km^2)']):
-                            target_zones_refinement_list[i][0] = k
-                            break
-                v_ids = []
-                target_zoneIds = []
-                target_res_list = []
-                try:
-                    # ~ 0.05s for one iter with using actualdggrs.zoneslist
-                    # ~ 0.03s for one iter with using get centriod method. (1s reduced in total for 49 zones)
-                    # position 0 == igeo7 refinement level, posiiton 1 == bound
-                    for i, zone in enumerate(target_zones_refinement_list):
-                        r = igeo7.generate_hexcentroid(shapely.box(*zone[1].bounds), zone[0])
-                        selection = [shapely.within(g, zone[1]) for g in r['geometry']]
-                        selection = [r.iloc[j]['name'] for j in range(len(selection)) if (selection[j] == True)]
-                        if (zone_id_repr != 'textual'):
-                            selection = igeo7.zone_id_from_textual(selection, zone_id_repr)
-                        target_zoneIds += selection
-                        v_ids += [zoneIds[i]] * len(selection)
-                        target_res_list += [zone[0]] * len(selection)
-                except Exception as e:
-                    logger.error(f'{__name__} forward transform failed : {e}')
-                    raise Exception(f'{__name__} forward transform failed : {e}')
-                if (len(np.unique(target_zoneIds)) < len(np.unique(zoneIds))):
-                    logger.warn(f'{__name__} forward transform: unique h3 zones id > unique igeo7 zones id ')
-                return DGGRSProviderConversionReturn(zoneIds=v_ids, target_zoneIds=target_zoneIds, target_res=target_res_list)
+                return self._convert_to_igeo7(zoneIds, global_dggrs_providers['igeo7'], zone_id_repr)
         else:
             raise Exception(f"{__name__} conversion to {targetdggrs} not supported.")
 
+    def _igeo7_levels(self, cells: np.ndarray, igeo7) -> np.ndarray:
+        # the first igeo7 refinement level with zones smaller than the h3 zone
+        levels = np.array(sorted(igeo7.data.keys()))
+        areas = np.array([igeo7.data[k]['Area (km^2)'] for k in levels])
+        cells_area = np.array(self._cells_area(cells, 'km^2'))
+        return levels[np.minimum((cells_area[:, None] <= areas[None, :]).sum(axis=1), len(levels) - 1)]
+
+    def _convert_to_igeo7(self, zoneIds: list, igeo7, zone_id_repr: str = 'textual') -> DGGRSProviderConversionReturn:
+        # the igeo7 zones of an h3 zone are the ones with their centroid inside the h3 zone, the centroids are
+        # generated with one DGGRID run per (h3, igeo7) level pair for the extent of all the zones, then assigned
+        # to the h3 zones by latlng_to_cell. The igeo7 zones of each h3 zone are memoized.
+        cells = h3textual_to_h3int(zoneIds)
+        res = ((cells >> np.uint64(52)) & np.uint64(0xF)).astype(int)
+        levels = self._igeo7_levels(cells, igeo7)
+        targets = [None] * len(cells)
+        with self._conversion_lock:
+            for i, key in enumerate(zip(levels.tolist(), cells.tolist())):
+                targets[i] = self._conversion_cache.get(key)
+                if (targets[i] is not None):
+                    self._conversion_cache.move_to_end(key)
+        missing = [i for i, t in enumerate(targets) if (t is None)]
+        try:
+            for h3_res, level in sorted(set(zip(res[missing].tolist(), levels[missing].tolist()))):
+                pair_cells = np.unique(cells[[i for i in missing if (res[i] == h3_res and levels[i] == level)]])
+                converted = self._igeo7_zones_of_cells(pair_cells, h3_res, level, igeo7)
+                for i in missing:
+                    if (res[i] == h3_res and levels[i] == level):
+                        targets[i] = converted[int(cells[i])]
+                with self._conversion_lock:
+                    for cell, ids in converted.items():
+                        self._conversion_cache[(level, cell)] = ids
+                    while (len(self._conversion_cache) > h3_igeo7_conversion_cache_size):
+                        self._conversion_cache.popitem(last=False)
+        except Exception as e:
+            logger.error(f'{__name__} forward transform failed : {e}')
+            raise Exception(f'{__name__} forward transform failed : {e}')
+        counts = [len(t) for t in targets]
+        target_zoneIds = np.concatenate(targets).tolist() if (len(targets) > 0) else []
+        if (zone_id_repr != 'textual'):
+            target_zoneIds = igeo7.zone_id_from_textual(target_zoneIds, zone_id_repr)
+        if (len(np.unique(target_zoneIds)) < len(np.unique(zoneIds))):
+            logger.warning(f'{__name__} forward transform: unique h3 zones id > unique igeo7 zones id ')
+        return DGGRSProviderConversionReturn(zoneIds=np.repeat(np.asarray(zoneIds, dtype=object), counts).tolist(),
+                                             target_zoneIds=target_zoneIds,
+                                             target_res=np.repeat(levels, counts).tolist())
+
+    def _igeo7_zones_of_cells(self, cells: np.ndarray, h3_res: int, level: int, igeo7) -> Dict[int, np.ndarray]:
+        # one DGGRID run for the union of the bounds of the h3 zones
+        bounds = shapely.bounds(self._cells_geometry(cells, 'zone-region').to_shapely())
+        extent = shapely.union_all(shapely.box(bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3]))
+        centroids = igeo7.generate_hexcentroid(extent, level)
+        lnglat = shapely.get_coordinates(np.asarray(centroids['geometry'].values))
+        owners = np.fromiter((h3_int.latlng_to_cell(lat, lng, h3_res) for lng, lat in lnglat.tolist()),
+                             dtype=np.uint64, count=len(lnglat))
+        names = centroids['name'].astype(str).values
+        order = np.argsort(owners, kind='stable')
+        owners, names = owners[order], names[order]
+        start, end = np.searchsorted(owners, cells, side='left'), np.searchsorted(owners, cells, side='right')
+        return {int(c): names[s:e] for c, s, e in zip(cells.tolist(), start.tolist(), end.tolist())}
+
     def zone_id_from_textual(self, cellIds: list, zone_id_repr: str) -> list:
         # for h3,  textaul == hexstring
         if (len(cellIds) == 0):
@@ -72,18 +142,21 @@ class H3Provider(AbstractDGGRSProvider):
         if (zone_id_repr == "textual" or zone_id_repr == "hexstring"):
             return cellIds
         if (zone_id_repr == "int"):
-            return [h3.str_to_int(z) for z in cellIds]
+            return h3textual_to_h3int(cellIds).tolist()
 
-    def zone_id_to_textual(self, cellIds: List[str], zone_id_repr: str) -> List[str]:
+    def zone_id_to_textual(self, cellIds: List[Any], zone_id_repr: str, refinement_level=None) -> List[str]:
         if (len(cellIds) == 0):
             return []
         if (zone_id_repr == "textual" or zone_id_repr == "hexstring"):
             return cellIds
-        if (zone_id_repr == "int"):
-            # get_data return zone id in string format
-            if (isinstance(cellIds[0], str)):
-                return [h3.int_to_str(int(z)) for z in cellIds]
-        return [h3.int_to_str(z) for z in cellIds]
+        # get_data return zone id in string format
+        return h3int_to_h3textual(np.asarray(cellIds).astype(np.uint64))
+
+    def zone_id_keys(self, cellIds: List[str]) -> Optional[np.ndarray]:
+        try:
+            return h3textual_to_h3int(cellIds)
+        except ValueError:
+            return None
 
     def get_cls_by_zone_level(self, zone_level) -> float:
         return h3.average_hexagon_edge_length(zone_level, unit='km')
@@ -94,12 +167,13 @@ class H3Provider(AbstractDGGRSProvider):
             if (length < cls_km):
                 return i
 
-    def get_cells_zone_level(self, cellIds: List[str]) -> List[int]:
-        zoneslevel = []
+    def get_cells_zone_level(self, cellIds: List[str]) -> np.ndarray:
         try:
-            for c in cellIds:
-                zoneslevel.append(h3.get_resolution(c))
-            return zoneslevel
+            cells = h3textual_to_h3int(cellIds)
+            if (not all(map(h3_int.is_valid_cell, cells.tolist()))):
+                raise ValueError('invalid h3 cell')
+            # resolution bits of the index
+            return ((cells >> np.uint64(52)) & np.uint64(0xF)).astype(np.int8)
         except Exception as e:
             logger.error(f'{__name__} zone id {cellIds} failed: {e}')
             raise Exception(f'{__name__} zone id {cellIds} failed: {e}')
@@ -108,15 +182,14 @@ class H3Provider(AbstractDGGRSProvider):
                                 geometry: Optional[ReturnGeometryTypes] = "zone-region") -> DGGRSProviderGetRelativeZoneLevelsReturn:
         children = {}
         geometry = geometry.lower() if (geometry is not None) else geometry
-        geojson = GeoJSONPolygon if (geometry == 'zone-region') else GeoJSONPoint
         try:
+            cell = int(h3textual_to_h3int([cellId])[0])
             for z in zone_levels:
-                children_ids = h3.cell_to_children(cellId, z)
+                children_cells = h3_int.cell_to_children(cell, z)
                 children_geometry = None
                 if (geometry is not None):
-                    children_geometry = [self._cell_to_shapely(id_, geometry) for id_ in children_ids]
-                    children_geometry = [geojson(**shapely.geometry.mapping(g)) for g in children_geometry]
-                children[z] = DGGRSProviderZonesElement(**{'zoneIds': children_ids,
+                    children_geometry = self._cells_geometry(children_cells, geometry)
+                children[z] = DGGRSProviderZonesElement(**{'zoneIds': h3int_to_h3textual(children_cells),
                                                            'geometry': children_geometry})
         except Exception as e:
             logger.error(f'{__name__} get_relative_zonelevels, get children failed {e}')
@@ -125,68 +198,78 @@ class H3Provider(AbstractDGGRSProvider):
         return DGGRSProviderGetRelativeZoneLevelsReturn(relative_zonelevels=children)
 
     def zoneslist(self, bbox: Union[box, None], zone_level: int, parent_zone: Union[str, int, None],
-                  returngeometry: ReturnGeometryTypes, compact=True) -> DGGRSProviderZonesListReturn:
+                  returngeometry: ReturnGeometryTypes, compact=True,
+                  geometry_mode: ZonesListGeometryMode = 'eager') -> DGGRSProviderZonesListReturn:
+        # the cells are resolved first, the geometry is only generated for the returned zones
         if (bbox is not None):
             try:
-                zoneIds = h3.h3shape_to_cells_experimental(h3.geo_to_h3shape(bbox), zone_level, contain='overlap')
-                geometry = [self._cell_to_shapely(z, returngeometry) for z in zoneIds]
-                hex_gdf = gpd.GeoDataFrame({'zoneIds': zoneIds}, geometry=geometry, crs='wgs84').set_index('zoneIds')
+                cells = h3_int.h3shape_to_cells_experimental(h3.geo_to_h3shape(bbox), zone_level, contain='overlap')
             except Exception as e:
                 logger.error(f'{__name__} query zones list, bbox: {bbox} failed :{e}')
                 raise Exception(f"{__name__} query zones list, bbox: {bbox} failed {e}")
-            logger.info(f'{__name__} query zones list, number of hexagons: {len(hex_gdf)}')
+            logger.info(f'{__name__} query zones list, number of hexagons: {len(cells)}')
         if (parent_zone is not None):
             try:
-                children_zoneIds = h3.cell_to_children(parent_zone, zone_level)
-                children_geometry = [self._cell_to_shapely(z, returngeometry) for z in children_zoneIds]
-                children_hex_gdf = gpd.GeoDataFrame({'zoneIds': children_zoneIds}, geometry=children_geometry, crs='wgs84').set_index('zoneIds')
-                hex_gdf = hex_gdf.join(children_hex_gdf, how='inner', rsuffix='_p') if (bbox is not None) else children_hex_gdf
+                children_cells = h3_int.cell_to_children(int(h3textual_to_h3int([parent_zone])[0]), zone_level)
+                cells = cells[np.isin(cells, children_cells)] if (bbox is not None) else children_cells
             except Exception as e:
                 logger.error(f'{__name__} query zones list, parent_zone: {parent_zone} get children failed {e}')
                 raise Exception(f'parent_zone: {parent_zone} get children failed {e}')
-        if (len(hex_gdf) == 0):
+        if (len(cells) == 0):
             raise Exception(f"{__name__} Parent zone {parent_zone} is not with in bbox: {bbox} at zone level {zone_level}")
         if (compact):
-            compactIds = h3.compact_cells(hex_gdf.index.values)
-            geometry = [self._cell_to_shapely(z, returngeometry) for z in compactIds]
-            hex_gdf = gpd.GeoDataFrame({'zoneIds': compactIds}, geometry=geometry, crs='wgs84').set_index('zoneIds')
-            logger.info(f'{__name__} query zones list, compact : {len(hex_gdf)}')
-        area = [h3.cell_area(z, 'm^2') for z in hex_gdf.index.values]
-        geotype = GeoJSONPolygon if (returngeometry == 'zone-region') else GeoJSONPoint
-        geometry = [geotype(**eval(shapely.to_geojson(g))) for g in hex_gdf['geometry'].values.tolist()]
-        hex_gdf.reset_index(inplace=True)
-        return DGGRSProviderZonesListReturn(**{'zones': hex_gdf['zoneIds'].values.astype(str).tolist(),
-                                               'geometry': geometry,
-                                               'returnedAreaMetersSquare': area})
+            cells = h3_int.compact_cells(cells)
+            logger.info(f'{__name__} query zones list, compact : {len(cells)}')
+        cells = np.asarray(cells, dtype=np.uint64)
+        geometry = self._cells_geometry(cells, returngeometry) if (geometry_mode == 'eager') else None
+        result = DGGRSProviderZonesListReturn(**{'zones': h3int_to_h3textual(cells),
+                                                 'geometry': geometry,
+                                                 'returnedAreaMetersSquare': self._cells_area(cells, 'm^2')})
+        if (geometry_mode == 'lazy'):
+            result.set_geometry_loader(lambda cellIds: self._cells_geometry(h3textual_to_h3int(cellIds), returngeometry))
+        return result
 
     def zonesinfo(self, cellIds: List[str]) -> DGGRSProviderZoneInfoReturn:
-        centroid = []
-        hex_geometry = []
-        total_area = []
         try:
-            zone_level = self.get_cells_zone_level([cellIds[0]])[0]
-            for c in cellIds:
-                centroid.append(self._cell_to_shapely(c, 'zone-centroid'))
-                hex_geometry.append(self._cell_to_shapely(c, 'zone-region'))
-                total_area.append(h3.cell_area(c))
+            zone_level = int(self.get_cells_zone_level([cellIds[0]])[0])
+            cells = h3textual_to_h3int(cellIds)
+            centroids = self._cells_geometry(cells, 'zone-centroid')
+            geometry = self._cells_geometry(cells, 'zone-region')
+            total_area = self._cells_area(cells, 'km^2')
         except Exception as e:
             logger.error(f'{__name__} zone id {cellIds} dggrid convert failed: {e}')
             raise Exception(f'{__name__} zone id {cellIds} dggrid convert failed: {e}')
-        geometry, bbox, centroids = [], [], []
-        for g in hex_geometry:
-            geometry.append(GeoJSONPolygon(**eval(shapely.to_geojson(g))))
-            bbox.append(list(g.bounds))
-        for c in centroid:
-            centroids.append(GeoJSONPoint(**eval(shapely.to_geojson(c))))
+        bbox = shapely.bounds(geometry.to_shapely()).tolist()
         return DGGRSProviderZoneInfoReturn(**{'zone_level': zone_level, 'shapeType': 'hexagon',
                                               'centroids': centroids, 'geometry': geometry, 'bbox': bbox,
                                               'areaMetersSquare': (sum(total_area) / len(cellIds)) * 1000000})
 
-    # source : https://medium.com/@jesse.b.nestler/how-to-convert-h3-cell-boundaries-to-shapely-polygons-in-python-f7558add2f63
-    def _cell_to_shapely(self, cellid, geometry):
-        method = h3.cell_to_boundary if (geometry == 'zone-region') else h3.cell_to_latlng
-        GEO = shapely.Polygon if (geometry == 'zone-region') else shapely.Point
-        points = method(cellid)
-        points = [points] if (geometry != 'zone-region') else points
-        points = tuple(p[::-1] for p in points)
-        return GEO(points)
+    def _cells_area(self, cells: np.ndarray, unit: str) -> List[float]:
+        return [h3_int.cell_area(c, unit) for c in cells.tolist()]
+
+    def _cells_geometry(self, cells: np.ndarray, geometry: ReturnGeometryTypes) -> ZonesGeometry:
+        # only the cells missing from the geometry cache are generated
+        cells = np.asarray(cells, dtype=np.uint64)
+        return self.geometry_cache.zones_geometry(self.geometry_cache_id, geometry, cells, cells,
+                                                  lambda positions: self._generate_cells_geometry(cells[positions], geometry))
+
+    def level_zone_ids(self, zone_level: int) -> List[str]:
+        cells = [h3_int.cell_to_children(c, zone_level) for c in h3_int.get_res0_cells()]
+        return h3int_to_h3textual(np.concatenate(cells))
+
+    def generate_zones_geometry(self, cellIds: List[str], returngeometry: ReturnGeometryTypes) -> ZonesGeometry:
+        return self._generate_cells_geometry(h3textual_to_h3int(cellIds), returngeometry)
+
+    def _generate_cells_geometry(self, cells: np.ndarray, geometry: ReturnGeometryTypes) -> ZonesGeometry:
+        # the (lat, lng) of the cells are gathered into a flat buffer, the shapes are built at once
+        cells = np.asarray(cells, dtype=np.uint64).tolist()
+        if (geometry == 'zone-region'):
+            boundaries = list(map(h3_int.cell_to_boundary, cells))
+            counts = np.fromiter(map(len, boundaries), dtype=np.int64, count=len(boundaries))
+            latlng = np.fromiter(itertools.chain.from_iterable(itertools.chain.from_iterable(boundaries)),
+                                 dtype=np.float64, count=int(counts.sum()) * 2).reshape(-1, 2)
+            rings = shapely.linearrings(latlng[:, ::-1], indices=np.repeat(np.arange(len(cells)), counts))
+            return ZonesGeometry(shapely.polygons(rings))
+        latlng = np.fromiter(itertools.chain.from_iterable(map(h3_int.cell_to_latlng, cells)),
+                             dtype=np.float64, count=len(cells) * 2).reshape(-1, 2)
+        return ZonesGeometry(shapely.points(latlng[:, ::-1]))
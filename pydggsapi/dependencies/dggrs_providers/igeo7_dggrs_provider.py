@@ -4,9 +4,24 @@
 from pydggsapi.dependencies.dggrs_providers.abstract_dggrs_provider import (
     AbstractDGGRSProvider
 )
-from pydggsapi.schemas.common_geojson import GeoJSONPolygon, GeoJSONPoint
+from pydggsapi.dependencies.dggrs_providers.auxiliary_latitude import get_latitude_converter
+from pydggsapi.dependencies.dggrs_providers.dggrid_pool import get_dggrid_pool
+from pydggsapi.dependencies.dggrs_providers.geometry_cache import get_geometry_cache
+from pydggsapi.dependencies.dggrs_providers.z7_index import (
+    z7_children,
+    z7_compact,
+    z7_hexstring_to_keys,
+    z7_keys_to_hexstring,
+    z7_keys_to_textual,
+    z7_parent,
+    z7_resolution,
+    z7_textual_to_keys,
+    z7_to_uint64,
+)
 from pydggsapi.schemas.api.dggrs_providers import (
     ZoneIdRepresentationType,
+    ZonesListGeometryMode,
+    ZonesGeometry,
     DGGRSProviderZoneInfoReturn,
     DGGRSProviderZonesListReturn,
     DGGRSProviderConversionReturn,
@@ -16,15 +31,13 @@ from pydggsapi.schemas.api.dggrs_providers import (
 from pydggsapi.schemas.ogc_dggs.common_ogc_dggs_api import CrsModel, ReturnGeometryTypes
 
 import os
-import tempfile
 import logging
 import shapely
 import numpy as np
+import pandas as pd
 import decimal
 from typing import Any, Union, List, Final, Optional, get_args
-from dggrid4py import DGGRIDv8
-from dggrid4py.igeo7 import get_z7string_resolution, z7hex_to_z7string
-from dggrid4py.auxlat import geoseries_to_authalic, geoseries_to_geodetic
+from dggrid4py.igeo7 import z7hex_to_z7string
 from geopandas.geoseries import GeoSeries
 from dotenv import load_dotenv
 from shapely.geometry import box
@@ -51,22 +64,22 @@ class IGEO7MetafileConfig():
     dggs_vert0_azimuth: Final[decimal.Decimal | float | str] = 0.0
 
 
-# Alway returns a GeoSeries
+# Alway returns a GeoSeries, the latitudes of all the geometry are converted at once
 def _authalic_to_geodetic(geometry, convert: bool) -> GeoSeries:
     if (not isinstance(geometry, GeoSeries)):
         geometry = GeoSeries(geometry)
     if (not convert):
         return geometry
-    return geoseries_to_geodetic(geometry)
+    return GeoSeries(get_latitude_converter().geometry_to_geodetic(geometry.to_numpy()), index=geometry.index, crs=geometry.crs)
 
 
-# Alway returns a GeoSeries
+# Alway returns a GeoSeries, the latitudes of all the geometry are converted at once
 def _geodetic_to_authalic(geometry, convert: bool) -> GeoSeries:
     if (not isinstance(geometry, GeoSeries)):
         geometry = GeoSeries(geometry)
     if (not convert):
         return geometry
-    return geoseries_to_authalic(geometry)
+    return GeoSeries(get_latitude_converter().geometry_to_authalic(geometry.to_numpy()), index=geometry.index, crs=geometry.crs)
 
 
 def z7textual_to_z7int(z7_textual_zone_id: str):
@@ -85,17 +98,11 @@ def z7int_to_z7textual(z7_int_zone_id: int, refinement_level=int):
     return z7textual[: refinement_level + 2]
 
 
-vz7int_to_z7textual = np.vectorize(z7int_to_z7textual)
-vz7textual_to_z7int = np.vectorize(z7textual_to_z7int)
-vz7hex_to_z7textual = np.vectorize(z7hex_to_z7string)
-
 
 class IGEO7Provider(AbstractDGGRSProvider):
 
     def __init__(self, **params):
-        executable = os.environ['DGGRID_PATH']
-        working_dir = tempfile.mkdtemp()
-        self.dggrid_instance = DGGRIDv8(executable=executable, working_dir=working_dir, silent=True)
+        self.dggrid_pool = get_dggrid_pool(os.environ['DGGRID_PATH'])
         self.data = {0: {"Cells": 12, "Area (km^2)": 51006562.1724089, "CLS (km)": 8199.5003701},
                      1: {"Cells": 72, "Area (km^2)": 7286651.7389156, "CLS (km)": 3053.2232428},
                      2: {"Cells": 492, "Area (km^2)": 1040950.2484165, "CLS (km)": 1151.6430095},
@@ -126,6 +133,10 @@ class IGEO7Provider(AbstractDGGRSProvider):
         if (crs.root.lower() != "wgs84"):
             self.wgs84_geodetic_conversion = False
         self.properties = IGEO7MetafileConfig(**params)
+        # the geometry depends on the orientation of the grid and on the latitude conversion
+        self.geometry_cache = get_geometry_cache()
+        self.geometry_cache_id = (f'igeo7:{self.properties.dggs_vert0_lon}:{self.properties.dggs_vert0_lat}:'
+                                  f'{self.properties.dggs_vert0_azimuth}:{"geodetic" if (self.wgs84_geodetic_conversion) else "authalic"}')
 
     def convert(self, zoneIds: List[str], targedggrs: str,
                 zone_id_repr: ZoneIdRepresentationType = 'textual') -> DGGRSProviderConversionReturn:
@@ -143,46 +154,54 @@ class IGEO7Provider(AbstractDGGRSProvider):
     def generate_hexgrid(self, bbox, resolution):
         # ISEA7H grid at resolution, for extent of provided WGS84 rectangle into GeoDataFrame
         bbox = _geodetic_to_authalic(bbox, self.wgs84_geodetic_conversion)[0]
-        gdf = self.dggrid_instance.grid_cell_polygons_for_extent(self.dggrs, resolution, clip_geom=bbox, **self.properties.__dict__)
+        gdf = self.dggrid_pool.run(lambda dggrid: dggrid.grid_cell_polygons_for_extent(self.dggrs, resolution, clip_geom=bbox,
+                                                                                      **self.properties.__dict__))
         gdf.geometry = _authalic_to_geodetic(gdf.geometry, self.wgs84_geodetic_conversion)
         return gdf
 
     def generate_hexcentroid(self, bbox, resolution):
         # ISEA7H grid at resolution, for extent of provided WGS84 rectangle into GeoDataFrame
         bbox = _geodetic_to_authalic(bbox, self.wgs84_geodetic_conversion)[0]
-        gdf = self.dggrid_instance.grid_cell_centroids_for_extent(self.dggrs, resolution, clip_geom=bbox, **self.properties.__dict__)
+        gdf = self.dggrid_pool.run(lambda dggrid: dggrid.grid_cell_centroids_for_extent(self.dggrs, resolution, clip_geom=bbox,
+                                                                                       **self.properties.__dict__))
         gdf.geometry = _authalic_to_geodetic(gdf.geometry, self.wgs84_geodetic_conversion)
         return gdf
 
+    def _from_cellids(self, operation: str, cellid: List[str], zone_level, clip_subset_type, clip_cell_res):
+        def run(dggrid, cellIds):
+            return getattr(dggrid, operation)(cellIds, self.dggrs, zone_level, clip_subset_type=clip_subset_type,
+                                              clip_cell_res=clip_cell_res, **self.properties.__dict__)
+        if (clip_subset_type != 'WHOLE_EARTH'):
+            return self.dggrid_pool.run(lambda dggrid: run(dggrid, cellid))
+        # the zones of concurrent calls for the same level are looked up in one DGGRID run
+        key = (operation, zone_level, id(self))
+        return self.dggrid_pool.run_batched(key, list(cellid), run)
+
     # default values from dggrid4py on clip_subset_type and clip_cell_res
     def centroid_from_cellid(self, cellid: List[str], zone_level, clip_subset_type='WHOLE_EARTH', clip_cell_res=1):
-        gdf = self.dggrid_instance.grid_cell_centroids_from_cellids(cellid, self.dggrs, zone_level,
-                                                                    clip_subset_type=clip_subset_type,
-                                                                    clip_cell_res=clip_cell_res,
-                                                                    **self.properties.__dict__)
+        gdf = self._from_cellids('grid_cell_centroids_from_cellids', cellid, zone_level, clip_subset_type, clip_cell_res)
         gdf.geometry = _authalic_to_geodetic(gdf.geometry, self.wgs84_geodetic_conversion)
         return gdf
 
     # default values from dggrid4py on clip_subset_type and clip_cell_res
     def hexagon_from_cellid(self, cellid: List[str], zone_level, clip_subset_type='WHOLE_EARTH', clip_cell_res=1):
-        gdf = self.dggrid_instance.grid_cell_polygons_from_cellids(cellid, self.dggrs,
-                                                                   zone_level, clip_subset_type=clip_subset_type,
-                                                                   clip_cell_res=clip_cell_res,
-                                                                   **self.properties.__dict__)
+        gdf = self._from_cellids('grid_cell_polygons_from_cellids', cellid, zone_level, clip_subset_type, clip_cell_res)
         gdf.geometry = _authalic_to_geodetic(gdf.geometry, self.wgs84_geodetic_conversion)
         return gdf
 
     def cellid_from_centroid(self, geodf_points_wgs84, zoomlevel):
         geodf_points_wgs84 = _geodetic_to_authalic(geodf_points_wgs84, self.wgs84_geodetic_conversion)
-        gdf = self.dggrid_instance.cells_for_geo_points(geodf_points_wgs84, True, self.dggrs, zoomlevel, **self.properties.__dict__)
+        gdf = self.dggrid_pool.run(lambda dggrid: dggrid.cells_for_geo_points(geodf_points_wgs84, True, self.dggrs, zoomlevel,
+                                                                             **self.properties.__dict__))
         gdf.geometry = _authalic_to_geodetic(gdf.geometry, self.wgs84_geodetic_conversion)
         return gdf
 
-    def cellids_from_extent(self, clip_geom, zoomlevel):
+    # zone IDs only, in the 'name' column
+    def cellids_from_extent(self, clip_geom, zoomlevel) -> pd.DataFrame:
         clip_geom = _geodetic_to_authalic(clip_geom, self.wgs84_geodetic_conversion)[0]
-        gdf = self.dggrid_instance.grid_cellids_for_extent(self.dggrs, zoomlevel, clip_geom=clip_geom, **self.properties.__dict__)
-        gdf.geometry = _authalic_to_geodetic(gdf.geometry, self.wgs84_geodetic_conversion)
-        return gdf
+        df = self.dggrid_pool.run(lambda dggrid: dggrid.grid_cellids_for_extent(self.dggrs, zoomlevel, clip_geom=clip_geom,
+                                                                               **self.properties.__dict__))
+        return pd.DataFrame({'name': df[0].astype(str).values})
 
     def zone_id_from_textual(self, cellIds: List[str], zone_id_repr: str) -> List[Any]:
         if (zone_id_repr not in get_args(ZoneIdRepresentationType)):
@@ -192,10 +211,9 @@ class IGEO7Provider(AbstractDGGRSProvider):
         if (zone_id_repr == "textual"):
             return cellIds
         if (zone_id_repr == "int"):
-            return vz7textual_to_z7int(cellIds).tolist()
+            return z7_textual_to_keys(cellIds).tolist()
         if (zone_id_repr == "hexstring"):
-            hexstring = np.vectorize(hex)(vz7textual_to_z7int(cellIds))
-            return hexstring.tolist()
+            return z7_keys_to_hexstring(z7_textual_to_keys(cellIds))
 
     def zone_id_to_textual(self, cellIds: List[Any], zone_id_repr: str, refinement_level: int) -> List[str]:
         if (zone_id_repr not in get_args(ZoneIdRepresentationType)):
@@ -205,9 +223,16 @@ class IGEO7Provider(AbstractDGGRSProvider):
         if (zone_id_repr == "textual"):
             return cellIds
         if (zone_id_repr == "int"):
-            return vz7int_to_z7textual(cellIds, refinement_level).tolist()
+            keys = z7_to_uint64(cellIds)
+            return z7_keys_to_textual(z7_parent(keys, refinement_level) if (refinement_level is not None) else keys)
         if (zone_id_repr == "hexstring"):
-            return vz7hex_to_z7textual(cellIds).tolist()
+            return z7_keys_to_textual(z7_hexstring_to_keys(cellIds))
+
+    def zone_id_keys(self, cellIds: List[str]) -> Optional[np.ndarray]:
+        try:
+            return z7_textual_to_keys(cellIds)
+        except ValueError:
+            return None
 
     def get_cls_by_zone_level(self, zone_level: int):
         return self.data[zone_level]["CLS (km)"]
@@ -217,97 +242,131 @@ class IGEO7Provider(AbstractDGGRSProvider):
             if v["CLS (km)"] < cls_km:
                 return k
 
-    def get_cells_zone_level(self, cellIds: List[str]):
+    def get_cells_zone_level(self, cellIds: List[str]) -> np.ndarray:
         try:
-            zones_level = get_z7string_resolution(cellIds[0])
-            return [zones_level]
+            return z7_resolution(z7_textual_to_keys(cellIds))
         except Exception as e:
             logger.error(f'{__name__} zone id {cellIds} dggrid get zone level failed : {e}')
             raise Exception(f'{__name__} zone id {cellIds} dggrid get zone level failed')
 
     def get_relative_zonelevels(self, cellId: str, base_level: int, zone_levels: List[int],
                                 geometry: Optional[ReturnGeometryTypes] = 'zone-region'):
+        # the children are the Z7 index children, DGGRID only runs for their geometry
         children = {}
         geometry = geometry.lower() if (geometry is not None) else geometry
-        method = self.hexagon_from_cellid if (geometry == 'zone-region') else self.centroid_from_cellid
-        geojson = GeoJSONPolygon if (geometry == 'zone-region') else GeoJSONPoint
         try:
+            keys = z7_textual_to_keys([cellId])
             for z in zone_levels:
-                gdf = method([cellId], z, clip_subset_type='COARSE_CELLS', clip_cell_res=base_level)
-                g = [geojson(**shapely.geometry.mapping(g)) for g in gdf['geometry'].values.tolist()]
-                children[z] = DGGRSProviderZonesElement(**{'zoneIds': gdf['name'].astype(str).values.tolist(),
-                                                           'geometry': g})
+                zoneIds = z7_keys_to_textual(z7_children(keys, z)[0])
+                children[z] = DGGRSProviderZonesElement(**{'zoneIds': zoneIds,
+                                                           'geometry': self._zones_geometry(zoneIds, geometry) if (geometry is not None) else None})
         except Exception as e:
             logger.error(f'{__name__} get_relative_zonelevels, get children failed {e}')
             raise Exception(f'{__name__} get_relative_zonelevels, get children failed {e}')
 
         return DGGRSProviderGetRelativeZoneLevelsReturn(relative_zonelevels=children)
 
+    def get_relative_zonelevels_batch(self, cellIds: List[str], base_level: int, zone_levels: List[int],
+                                      geometry: Optional[ReturnGeometryTypes] = 'zone-region'):
+        # the Z7 index children of all the zones, with a single DGGRID run per zone level for the geometry
+        children = {cellId: {} for cellId in cellIds}
+        geometry = geometry.lower() if (geometry is not None) else geometry
+        try:
+            keys = z7_textual_to_keys(list(cellIds))
+            for z in zone_levels:
+                children_keys, owners = z7_children(keys, z)
+                names = np.array(z7_keys_to_textual(children_keys), dtype=object)
+                g = self._zones_geometry(names.tolist(), geometry) if (geometry is not None) else None
+                bounds = np.searchsorted(owners, np.arange(len(keys) + 1))
+                for i, cellId in enumerate(cellIds):
+                    positions = np.arange(bounds[i], bounds[i + 1])
+                    children[cellId][z] = DGGRSProviderZonesElement(**{'zoneIds': names[positions].tolist(),
+                                                                       'geometry': g[positions] if (g is not None) else None})
+        except Exception as e:
+            logger.error(f'{__name__} get_relative_zonelevels_batch, get children failed {e}')
+            raise Exception(f'{__name__} get_relative_zonelevels_batch, get children failed {e}')
+        return {cellId: DGGRSProviderGetRelativeZoneLevelsReturn(relative_zonelevels=v) for cellId, v in children.items()}
+
     def zonesinfo(self, cellIds: List[str]):
-        zone_level = get_z7string_resolution(cellIds[0])
+        zone_level = int(self.get_cells_zone_level(cellIds[:1])[0])
         try:
-            centroid = self.centroid_from_cellid(cellIds, zone_level).geometry
-            hex_geometry = self.hexagon_from_cellid(cellIds, zone_level).geometry
+            # in the order of cellIds
+            centroids = self._zones_geometry(cellIds, 'zone-centroid')
+            geometry = self._zones_geometry(cellIds, 'zone-region')
         except Exception:
             logger.error(f'{__name__} zone id {cellIds} dggrid convert failed')
             raise Exception(f'{__name__} zone id {cellIds} dggrid convert failed')
-        geometry, bbox, centroids = [], [], []
-        for g in hex_geometry:
-            geometry.append(GeoJSONPolygon(**eval(shapely.to_geojson(g))))
-            bbox.append(list(g.bounds))
-        for c in centroid:
-            centroids.append(GeoJSONPoint(**eval(shapely.to_geojson(c))))
+        bbox = shapely.bounds(geometry.to_shapely()).tolist()
         return DGGRSProviderZoneInfoReturn(**{'zone_level': zone_level, 'shapeType': 'hexagon',
                                               'centroids': centroids, 'geometry': geometry, 'bbox': bbox,
                                               'areaMetersSquare': self.data[zone_level]["Area (km^2)"] * 1000000})
 
-    def zoneslist(self, bbox: Union[box, None], zone_level: int, parent_zone: Union[str, int, None], returngeometry: str, compact=True):
+    def zoneslist(self, bbox: Union[box, None], zone_level: int, parent_zone: Union[str, int, None], returngeometry: str, compact=True,
+                  geometry_mode: ZonesListGeometryMode = 'eager'):
+        # the zone IDs are generated first, the geometry is fetched once for the final (compacted) zones. The polygons
+        # of the bbox are only generated when they are the returned geometry.
+        with_polygons = (geometry_mode == 'eager' and not compact and returngeometry == 'zone-region')
+        zones, polygons = None, None
         if (bbox is not None):
             try:
-                hex_gdf = self.generate_hexgrid(bbox, zone_level)
+                if (with_polygons):
+                    hex_gdf = self.generate_hexgrid(bbox, zone_level)
+                    zones, polygons = hex_gdf['name'].astype(str).values, hex_gdf['geometry'].values
+                    keys = z7_textual_to_keys(zones)
+                    self.geometry_cache.put(self.geometry_cache_id, 'zone-region', keys.tolist(), keys, polygons)
+                else:
+                    zones = self.cellids_from_extent(bbox, zone_level)['name'].values
             except Exception as e:
                 logger.error(f'{__name__} query zones list, bbox: {bbox} dggrid convert failed :{e}')
                 raise Exception(f"{__name__} query zones list, bbox: {bbox} dggrid convert failed {e}")
-            logger.info(f'{__name__} query zones list, number of hexagons: {len(hex_gdf)}')
+            logger.info(f'{__name__} query zones list, number of hexagons: {len(zones)}')
         if (parent_zone is not None):
             try:
-                parent_zone_level = self.get_cells_zone_level([parent_zone])[0]
-                childern_hex_gdf = self.hexagon_from_cellid([parent_zone], zone_level, clip_subset_type='COARSE_CELLS',
-                                                            clip_cell_res=parent_zone_level)
-                childern_hex_gdf.set_index('name', inplace=True)
-                hex_gdf = hex_gdf.join(childern_hex_gdf, how='inner', rsuffix='_p') if (bbox is not None) else childern_hex_gdf
+                children = z7_keys_to_textual(z7_children(z7_textual_to_keys([parent_zone]), zone_level)[0])
+                if (zones is not None):
+                    selected = pd.Index(zones).isin(children)
+                    zones, polygons = zones[selected], (polygons[selected] if (polygons is not None) else None)
+                else:
+                    zones = np.array(children)
             except Exception as e:
                 logger.error(f'{__name__} query zones list, parent_zone: {parent_zone} get children failed {e}')
                 raise Exception(f'parent_zone: {parent_zone} get children failed {e}')
-        if (len(hex_gdf) == 0):
+        if (len(zones) == 0):
             raise Exception(f"{__name__} Parent zone {parent_zone} is not with in bbox: {bbox} at zone level {zone_level}")
+        keys = z7_textual_to_keys(zones)
         if (compact):
-            i = 0
-            hex_gdf.reset_index(inplace=True)
-            while (i >= 0):
-                hex_gdf['compact'] = hex_gdf['name'].apply(lambda x: x[:-1] if (len(x) == (zone_level - i + 2)) else x)
-                counts = hex_gdf.groupby("compact")['name'].count()
-                i += 1
-                counts_idx = np.where(counts == pow(7, i))[0]
-                replace = counts.iloc[counts_idx].index
-                if (len(replace) > 0):
-                    new_geometry = self.hexagon_from_cellid(replace, (zone_level - i))
-                    new_geometry.set_index('name', inplace=True)
-                    replace_idx = np.isin(hex_gdf['compact'].values, replace.values).nonzero()[0]
-                    hex_gdf.iloc[replace_idx, 0] = hex_gdf.iloc[replace_idx]['compact']
-                    hex_gdf.set_index('name', inplace=True)
-                    hex_gdf.update(new_geometry)
-                    hex_gdf.reset_index(inplace=True)
-                else:
-                    i = -1
-            hex_gdf = hex_gdf.drop_duplicates(subset=['name']).set_index('name')
-            logger.info(f'{__name__} query zones list, compact : {len(hex_gdf)}')
-        if (returngeometry != 'zone-region'):
-            hex_gdf = self.centroid_from_cellid(hex_gdf.index.values, zone_level)
-        area = [self.data[zone_level]['Area (km^2)'] * 1000000] * len(hex_gdf)
-        geotype = GeoJSONPolygon if (returngeometry == 'zone-region') else GeoJSONPoint
-        geometry = [geotype(**eval(shapely.to_geojson(g))) for g in hex_gdf['geometry'].values.tolist()]
-        hex_gdf.reset_index(inplace=True)
-        return DGGRSProviderZonesListReturn(**{'zones': hex_gdf['name'].values.astype(str).tolist(),
-                                               'geometry': geometry,
-                                               'returnedAreaMetersSquare': area})
+            keys = z7_compact(keys)
+            zones = z7_keys_to_textual(keys)
+            logger.info(f'{__name__} query zones list, compact : {len(zones)}')
+        zones = np.asarray(zones).astype(str).tolist()
+        area = [self.data[level]['Area (km^2)'] * 1000000 for level in z7_resolution(keys).tolist()]
+        geometry = None
+        if (geometry_mode == 'eager'):
+            geometry = ZonesGeometry(polygons) if (polygons is not None) else self._zones_geometry(zones, returngeometry)
+        result = DGGRSProviderZonesListReturn(**{'zones': zones,
+                                                 'geometry': geometry,
+                                                 'returnedAreaMetersSquare': area})
+        if (geometry_mode == 'lazy'):
+            result.set_geometry_loader(lambda cellIds: self._zones_geometry(cellIds, returngeometry))
+        return result
+
+    def _zones_geometry(self, cellIds: List[str], returngeometry: str) -> ZonesGeometry:
+        # DGGRID only runs for the zones missing from the geometry cache
+        cellIds = list(cellIds)
+        return self.geometry_cache.zones_geometry(self.geometry_cache_id, returngeometry, cellIds, self.zone_id_keys(cellIds),
+                                                  lambda positions: self.generate_zones_geometry([cellIds[i] for i in positions],
+                                                                                                 returngeometry))
+
+    def level_zone_ids(self, zone_level: int) -> List[str]:
+        # the Z7 index descendants of the 12 base cells
+        return z7_keys_to_textual(z7_children(z7_textual_to_keys([f'{b:02d}' for b in range(12)]), zone_level)[0])
+
+    def generate_zones_geometry(self, cellIds: List[str], returngeometry: str) -> ZonesGeometry:
+        # one DGGRID run per refinement level of the (compacted) zones
+        method = self.hexagon_from_cellid if (returngeometry == 'zone-region') else self.centroid_from_cellid
+        levels = self.get_cells_zone_level(cellIds)
+        geometry = {}
+        for level in np.unique(levels):
+            gdf = method([c for c, l in zip(cellIds, levels) if (l == level)], int(level))
+            geometry.update(zip(gdf['name'].astype(str).values.tolist(), gdf['geometry'].values.tolist()))
+        return ZonesGeometry([geometry[c] for c in cellIds])
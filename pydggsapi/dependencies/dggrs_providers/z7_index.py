@@ -0,0 +1,181 @@
+# Z7 hierarchical index of IGEO7, on uint64 arrays
+#
+# The packed Z7 index has the base cell (0-11) in the upper 4 bits, followed by 20 digits of 3 bits, one per
+# refinement level (0-6). The digits beyond the refinement level of the zone are 7. The textual zone ID is the base
+# cell on 2 digits followed by the digits, ex. '0800432' is the level 5 zone of base cell 8.
+#
+# The children of a zone are its index children (the zone ID with one more digit). The 12 base cells and their
+# centre descendants (only 0 digits) are pentagons with 6 children, the digit 2 is skipped for the base cells 0 to 5,
+# the digit 5 for the base cells 6 to 11.
+#
+# The hexstring representation is the packed index formatted by hex(), ex. '0x803fffffffffffff'.
+
+from typing import List, Tuple, Union
+import numpy as np
+
+z7_max_level = 20
+z7_textual_max_length = z7_max_level + 2
+
+# shift of the digit of the levels 1 to 20
+_digit_shifts = np.arange(57, -1, -3, dtype=np.uint64)
+_digits_mask = np.uint64((1 << 60) - 1)
+_nibble_shifts = np.arange(60, -1, -4, dtype=np.uint64)
+_hex_digits = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+_hex_values = np.full(256, 255, dtype=np.uint8)
+_hex_values[_hex_digits] = np.arange(16)
+_hex_values[np.frombuffer(b'ABCDEF', dtype=np.uint8)] = np.arange(10, 16)
+
+
+def _padding(level: np.ndarray) -> np.ndarray:
+    # the bits of the digits beyond the level, all set (digit 7)
+    return (np.uint64(1) << (np.uint64(60) - np.uint64(3) * np.asarray(level, dtype=np.uint64))) - np.uint64(1)
+
+
+def z7_textual_to_keys(cellIds: Union[List[str], np.ndarray]) -> np.ndarray:
+    cells = np.asarray(cellIds, dtype=str)
+    if (cells.size == 0):
+        return np.zeros(0, dtype=np.uint64)
+    if (cells.dtype.itemsize // 4 > z7_textual_max_length):
+        raise ValueError(f'{__name__} Z7 zone IDs are at most {z7_textual_max_length} characters long')
+    chars = cells.astype(f'S{z7_textual_max_length}').view(np.uint8).reshape(-1, z7_textual_max_length)
+    values = chars.astype(np.int64) - ord('0')
+    present = (chars != 0)
+    base = values[:, 0] * 10 + values[:, 1]
+    digits = np.where(present[:, 2:], values[:, 2:], 7)
+    invalid = (~present[:, :2].all(axis=1) | (values[:, :2] < 0).any(axis=1) | (values[:, :2] > 9).any(axis=1)
+               | (base > 11) | (present[:, 2:] & ((digits < 0) | (digits > 6))).any(axis=1)
+               | (present[:, 3:] & ~present[:, 2:-1]).any(axis=1))
+    if (invalid.any()):
+        raise ValueError(f'{__name__} invalid Z7 zone IDs: {cells[invalid][:5].tolist()}')
+    keys = np.bitwise_or.reduce(digits.astype(np.uint64) << _digit_shifts, axis=1)
+    return keys | (base.astype(np.uint64) << np.uint64(60))
+
+
+def z7_keys_to_textual(keys: np.ndarray) -> List[str]:
+    keys = np.asarray(keys, dtype=np.uint64)
+    if (keys.size == 0):
+        return []
+    base = (keys >> np.uint64(60)).astype(np.uint8)
+    chars = np.zeros((len(keys), z7_textual_max_length), dtype=np.uint8)
+    chars[:, 0] = base // 10 + ord('0')
+    chars[:, 1] = base % 10 + ord('0')
+    chars[:, 2:] = ((keys[:, None] >> _digit_shifts) & np.uint64(7)).astype(np.uint8) + ord('0')
+    chars[:, 2:][np.arange(z7_max_level)[None, :] >= z7_resolution(keys)[:, None]] = 0
+    return chars.view(f'S{z7_textual_max_length}').ravel().astype(str).tolist()
+
+
+def z7_to_uint64(values) -> np.ndarray:
+    # the int representation as uint64, the int64 columns of the datasources hold the base cells 8 to 11 as
+    # negative values
+    values = values.to_numpy() if (hasattr(values, 'to_numpy')) else values
+    array = values if (isinstance(values, np.ndarray)) else np.asarray(values)
+    if (array.dtype.kind == 'O'):
+        array = np.asarray(array.tolist())
+    if (array.dtype.kind in 'iu'):
+        return array.astype(np.uint64)
+    # strings, or python integers beyond the int64 range mixed with negative ones (converted to float by numpy)
+    return np.array([int(v) % (1 << 64) for v in values], dtype=np.uint64)
+
+
+def z7_hexstring_to_keys(cellIds: Union[List[str], np.ndarray]) -> np.ndarray:
+    cells = np.char.lower(np.asarray(cellIds, dtype=str))
+    if (cells.size == 0):
+        return np.zeros(0, dtype=np.uint64)
+    cells = np.where(np.char.startswith(cells, '0x'), np.char.partition(cells, 'x')[..., 2], cells)
+    empty = (np.char.str_len(cells) == 0)
+    cells = np.char.lstrip(cells, '0')
+    cells = np.where((np.char.str_len(cells) == 0) & ~empty, '0', cells)
+    length = np.char.str_len(cells)
+    if ((length == 0).any() or (length > 16).any()):
+        raise ValueError(f'{__name__} invalid Z7 hexstrings: {cells[(length == 0) | (length > 16)][:5].tolist()}')
+    # right aligned nibbles
+    chars = cells.astype('S16').view(np.uint8).reshape(-1, 16)
+    nibbles = _hex_values[chars]
+    present = (chars != 0)
+    if ((nibbles[present] == 255).any()):
+        raise ValueError(f'{__name__} invalid Z7 hexstrings: {cells[((nibbles == 255) & present).any(axis=1)][:5].tolist()}')
+    shifts = np.uint64(4) * (length[:, None] - 1 - np.arange(16)[None, :]).clip(0).astype(np.uint64)
+    return np.bitwise_or.reduce(np.where(present, nibbles.astype(np.uint64) << shifts, np.uint64(0)), axis=1)
+
+
+def z7_keys_to_hexstring(keys: np.ndarray) -> List[str]:
+    keys = np.asarray(keys, dtype=np.uint64)
+    if (keys.size == 0):
+        return []
+    nibbles = ((keys[:, None] >> _nibble_shifts) & np.uint64(0xF)).astype(np.intp)
+    # without the leading zeros, as hex()
+    first = np.minimum((nibbles != 0).argmax(axis=1) + (nibbles == 0).all(axis=1) * 15, 15)
+    positions = first[:, None] + np.arange(16)[None, :]
+    chars = np.zeros((len(keys), 18), dtype=np.uint8)
+    chars[:, 0], chars[:, 1] = ord('0'), ord('x')
+    chars[:, 2:] = np.where(positions < 16, _hex_digits[np.take_along_axis(nibbles, positions.clip(max=15), axis=1)], 0)
+    return chars.view('S18').ravel().astype(str).tolist()
+
+
+def z7_resolution(keys: np.ndarray) -> np.ndarray:
+    keys = np.asarray(keys, dtype=np.uint64)
+    padding = ((keys[:, None] >> _digit_shifts) & np.uint64(7)) == 7
+    return np.where(padding.any(axis=1), padding.argmax(axis=1), z7_max_level).astype(np.int8)
+
+
+def z7_parent(keys: np.ndarray, level: Union[int, np.ndarray]) -> np.ndarray:
+    # ancestor at level (lower or equal to the level of the zones)
+    return np.asarray(keys, dtype=np.uint64) | _padding(level)
+
+
+def z7_is_pentagon(keys: np.ndarray) -> np.ndarray:
+    keys = np.asarray(keys, dtype=np.uint64)
+    return (keys & _digits_mask) == _padding(z7_resolution(keys))
+
+
+def _skipped_digit(keys: np.ndarray) -> np.ndarray:
+    return np.where((keys >> np.uint64(60)) < 6, 2, 5)
+
+
+def z7_children(keys: np.ndarray, level: int) -> Tuple[np.ndarray, np.ndarray]:
+    # descendants at level of each zone, ordered by zone then by digits,
+    # with the position of their zone in keys
+    keys = np.asarray(keys, dtype=np.uint64)
+    res = z7_resolution(keys).astype(np.int64)
+    if ((res > level).any() or level > z7_max_level):
+        raise ValueError(f'{__name__} level {level} is out of the range of the zones levels')
+    children, positions = keys, np.arange(len(keys))
+    for l in range(int(res.min()) + 1 if (len(keys) > 0) else level + 1, level + 1):
+        grow = (res < l)
+        counts = np.where(grow, 7, 1)
+        starts = np.cumsum(counts) - counts
+        children, positions, res, grow = (np.repeat(children, counts), np.repeat(positions, counts),
+                                          np.repeat(res, counts), np.repeat(grow, counts))
+        digits = (np.arange(len(children)) - np.repeat(starts, counts)).astype(np.uint64)
+        shift = np.uint64(60 - 3 * l)
+        grown = (children[grow] & ~(np.uint64(7) << shift)) | (digits[grow] << shift)
+        # the pentagons have no child with the skipped digit
+        keep = ~(z7_is_pentagon(children[grow]) & (digits[grow] == _skipped_digit(children[grow])))
+        children[grow] = grown
+        res[grow] = l
+        keep_all = np.ones(len(children), dtype=bool)
+        keep_all[np.flatnonzero(grow)[~keep]] = False
+        children, positions, res = children[keep_all], positions[keep_all], res[keep_all]
+    return children, positions
+
+
+def z7_compact(keys: np.ndarray) -> np.ndarray:
+    # replaces the complete sets of children by their parent, from the finest level up, returns sorted keys
+    keys = np.unique(np.asarray(keys, dtype=np.uint64))
+    if (len(keys) == 0):
+        return keys
+    res = z7_resolution(keys)
+    for l in range(int(res.max()), 0, -1):
+        positions = np.flatnonzero(res == l)
+        if (len(positions) == 0):
+            continue
+        parents = z7_parent(keys[positions], l - 1)
+        unique_parents, counts = np.unique(parents, return_counts=True)
+        complete = unique_parents[counts == np.where(z7_is_pentagon(unique_parents), 6, 7)]
+        if (len(complete) == 0):
+            continue
+        replaced = np.zeros(len(keys), dtype=bool)
+        replaced[positions[np.isin(parents, complete)]] = True
+        keys = np.union1d(keys[~replaced], complete)
+        res = z7_resolution(keys)
+    return keys
@@ -0,0 +1,93 @@
+# Columnar zone data export (Apache Arrow IPC stream / GeoParquet)
+#
+# Each zone level is converted into a table with the columns zoneId, depth, datetime (temporal collections only),
+# the properties and geometry (WKB, only when requested), the tables are concatenated without copying the buffers.
+# Columns missing from a zone level (ex. multi-collection aggregation) are filled with nulls.
+
+from pydggsapi.schemas.ogc_dggs.dggrs_zones_data import zone_data_arrow_returntype, zone_data_parquet_returntype
+
+from fastapi.responses import Response, StreamingResponse
+from typing import Dict, Iterator, List, Optional
+import pyarrow.parquet as pq
+import pyarrow as pa
+import pandas as pd
+import numpy as np
+import shapely
+import json
+import io
+
+arrow_batch_rows = 65536
+geoparquet_version = '1.1.0'
+
+
+def zone_level_table(d: pd.DataFrame, depth: int, columns: List[str], include_geometry: bool) -> pa.Table:
+    d = d.reset_index()
+    arrays: Dict[str, pa.Array] = {
+        'zoneId': pa.array(d['zoneId'].astype(str).values, type=pa.string()),
+        'depth': pa.array(np.full(len(d), depth, dtype=np.int32)),
+    }
+    if ('datetime' in d.columns):
+        arrays['datetime'] = pa.Array.from_pandas(d['datetime'])
+    for c in columns:
+        if (c in d.columns):
+            # NaN are converted to nulls
+            arrays[c] = pa.Array.from_pandas(d[c])
+    if (include_geometry):
+        arrays['geometry'] = pa.array(shapely.to_wkb(d['geometry'].values), type=pa.binary())
+    return pa.table(arrays)
+
+
+def _geo_metadata(geometry: np.ndarray) -> bytes:
+    # GeoParquet metadata, the coordinates are in OGC:CRS84 (default crs)
+    types = [t for t in np.unique(shapely.get_type_id(geometry)) if (t >= 0)]
+    names = {0: 'Point', 1: 'LineString', 3: 'Polygon', 4: 'MultiPoint', 5: 'MultiLineString', 6: 'MultiPolygon'}
+    column = {'encoding': 'WKB', 'geometry_types': [names.get(t, 'GeometryCollection') for t in types]}
+    if (len(geometry) > 0):
+        column['bbox'] = shapely.total_bounds(geometry).tolist()
+    return json.dumps({'version': geoparquet_version, 'primary_column': 'geometry', 'columns': {'geometry': column}}).encode('utf-8')
+
+
+def zone_data_table(data: Dict[int, pd.DataFrame], base_level: int, columns: List[str], include_geometry: bool) -> pa.Table:
+    geometry = []
+    tables = []
+    for z, d in sorted(data.items()):
+        tables.append(zone_level_table(d, z - base_level, columns, include_geometry))
+        if (include_geometry):
+            geometry.append(d['geometry'].values)
+    table = pa.concat_tables(tables, promote_options='default')
+    if (include_geometry):
+        # keep the geometry as the last column
+        table = table.select([c for c in table.column_names if (c != 'geometry')] + ['geometry'])
+        table = table.replace_schema_metadata({b'geo': _geo_metadata(np.concatenate(geometry))})
+    return table
+
+
+def _iter_arrow_stream(table: pa.Table) -> Iterator[bytes]:
+    sink = io.BytesIO()
+
+    def drain() -> bytes:
+        chunk = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return chunk
+
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=arrow_batch_rows):
+            writer.write_batch(batch)
+            yield drain()
+    yield drain()
+
+
+def zone_data_columnar_response(
+    data: Dict[int, pd.DataFrame],
+    base_level: int,
+    columns: List[str],
+    returntype: str,
+    returngeometry: Optional[str] = None,
+) -> Response:
+    table = zone_data_table(data, base_level, columns, returngeometry is not None)
+    if (returntype == zone_data_arrow_returntype):
+        return StreamingResponse(_iter_arrow_stream(table), media_type=zone_data_arrow_returntype)
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink, compression='zstd', row_group_size=arrow_batch_rows * 16)
+    return Response(content=sink.getvalue().to_pybytes(), media_type=zone_data_parquet_returntype)
@@ -7,6 +7,7 @@ from pydggsapi.schemas.ogc_collections.queryables import CollectionQueryables, P
 from pydggsapi.schemas.common_geojson import GeoJSONPolygon, GeoJSONPoint
 from pydggsapi.dependencies.collections_providers.abstract_collection_provider import AbstractCollectionProvider
 from pydggsapi.dependencies.dggrs_providers.abstract_dggrs_provider import AbstractDGGRSProvider
+from pydggsapi.dependencies.api.presence_index import get_presence_bitmap
 
 from fastapi import FastAPI
 from starlette.requests import URL
@@ -110,11 +111,12 @@ def query_zone_info(
 
     logger.debug(f'{__name__} query zone info {zoneinfoReq.dggrsId}, zone id: {zoneinfoReq.zoneId}')
     zoneId = [zoneinfoReq.zoneId]
-    zonelevel = dggrs_provider.get_cells_zone_level(zoneId)[0]
+    request_zonelevel = int(dggrs_provider.get_cells_zone_level(zoneId)[0])
     zoneinfo = dggrs_provider.zonesinfo(zoneId)
     filter_ = 0
     for k, v in collection.items():
         zoneId = [zoneinfoReq.zoneId]
+        zonelevel = request_zonelevel
         cp = collection_provider[v.collection_provider.providerId]
         datasource_id = v.collection_provider.datasource_id
         if (v.collection_provider.dggrsId != dggs_info.id and
@@ -128,13 +130,19 @@ def query_zone_info(
             # the zoneId and zonelevel is converted to the collection's native dggrs
             zoneId = converted_zones.target_zoneIds
             zonelevel = converted_zones.target_res[0]
+        else:
+            bitmap = get_presence_bitmap(k, v, cp, dggrs_provider, zonelevel)
+            keys = dggrs_provider.zone_id_keys(zoneId) if (bitmap is not None) else None
+            if (keys is not None):
+                filter_ += int(bitmap.contains(keys).sum())
+                continue
         # At the point, the zoneId may be converted to the collection's native dggrs
         if (v.collection_provider.dggrs_zoneid_repr != 'textual'):
             tmp_dggrs_provider = global_dggrs_providers[v.collection_provider.dggrsId]
             zoneId = tmp_dggrs_provider.zone_id_from_textual(zoneId, v.collection_provider.dggrs_zoneid_repr)
-        data = cp.get_data(zoneId, zonelevel, datasource_id, input_zoneIds_padding=False)
-        print(f'{k} {len(data.zoneIds)}')
-        filter_ += len(data.zoneIds)
+        zones_with_data = cp.has_data(zoneId, zonelevel, datasource_id)
+        logger.debug(f'{__name__} query zone info {k}: {len(zones_with_data)}')
+        filter_ += len(zones_with_data)
     zoneId = zoneinfoReq.zoneId  # reset the zoneId to original one as string
     if (filter_ > 0):
         dggs_link = '/'.join(str(current_url).split('/')[:-3])
@@ -155,9 +163,9 @@ def query_zone_info(
         return_['links'] = [data_link, dggs_link]
         return_['shapeType'] = zoneinfo.shapeType
         return_['crs'] = dggs_info.crs
-        return_['centroid'] = zoneinfo.centroids[0]
+        return_['centroid'] = zoneinfo.centroids.to_geojson([0])[0]
         return_['bbox'] = zoneinfo.bbox[0]
-        return_['geometry'] = zoneinfo.geometry[0]
+        return_['geometry'] = zoneinfo.geometry.to_geojson([0])[0]
         return_['areaMetersSquare'] = zoneinfo.areaMetersSquare
         logger.debug(f'{__name__} query zone info {zoneinfoReq.dggrsId}, zone id: {zoneinfoReq.zoneId}, zoneinfo: {pprint(return_)}')
         return ZoneInfoResponse(**return_)
@@ -1,40 +1,83 @@
 from pydggsapi.schemas.ogc_dggs.dggrs_descrption import DggrsDescription
 from pydggsapi.schemas.ogc_dggs.dggrs_zones_data import (
-    Property, Schema, Shape, Value, ZonesDataDggsJsonResponse,
-    Feature, ZonesDataGeoJson, Dimension, DimensionGrid
+    Property, Schema, Shape, ZonesDataDggsJsonResponse,
+    Feature, ZonesDataGeoJson, Dimension, DimensionGrid, ZonesDataBatchGeoJson, zone_data_columnar_returntype
 )
-from pydggsapi.schemas.common_geojson import GeoJSONPolygon, GeoJSONPoint
-from pydggsapi.schemas.api.dggrs_providers import DGGRSProviderZonesElement
+from pydggsapi.schemas.api.dggrs_providers import DGGRSProviderZonesElement, ZonesGeometry
 from pydggsapi.schemas.api.collections import Collection
 from pydggsapi.schemas.api.collection_providers import CollectionProviderGetDataReturn
 
 from pydggsapi.models.ogc_dggs.core import get_json_schema_property
+from pydggsapi.models.ogc_dggs.dggs_json_stream import DggsJsonStreamWriter, DggsJsonValue, iter_dggs_json_batch
+from pydggsapi.models.ogc_dggs.zarr_zip import get_zarr_encoding, zarr_zip_response
+from pydggsapi.models.ogc_dggs.arrow_export import zone_data_columnar_response
 
 from pydggsapi.dependencies.dggrs_providers.abstract_dggrs_provider import AbstractDGGRSProvider
 from pydggsapi.dependencies.collections_providers.abstract_collection_provider import AbstractCollectionProvider, DatetimeNotDefinedError
 from pydggsapi.dependencies.api.utils import getCQLAttributes
+from pydggsapi.dependencies.api.executors import fan_out
 
 from starlette.requests import Request
-from fastapi.responses import FileResponse, Response
-from numcodecs import Blosc
-from typing import Any, List, Dict, Optional, Union, cast
+from fastapi.responses import Response, StreamingResponse
+from dataclasses import dataclass
+from typing import Any, Callable, List, Dict, Optional, Union, cast
 from scipy.stats import mode
 from pygeofilter.ast import AstType
 from ordered_set import OrderedSet
 import ubjson
-import shapely
-import tempfile
 import numpy as np
-import zarr
 import xarray as xr
 import geopandas as gpd
 import pandas as pd
-import json
 import itertools
 import logging
 
 logger = logging.getLogger()
 
+batch_zone_column = '_batch_zoneId'
+
+
+def _get_datasource_vars(cp: AbstractCollectionProvider, datasource_id: str) -> List[str]:
+    return list(cp.get_datadictionary(datasource_id).data.keys())
+
+
+def _get_collection_data(
+    cid: str,
+    cp: AbstractCollectionProvider,
+    dggrs_provider: AbstractDGGRSProvider,
+    zoneIds: List[str],
+    zone_level: int,
+    min_refinement_level: int,
+    datasource_id: str,
+    zone_id_repr: str,
+    cql_filter: AstType,
+    include_datetime: bool,
+    include_properties: List[str],
+    exclude_properties: List[str],
+) -> CollectionProviderGetDataReturn:
+    logger.debug(f"{__name__} {cid} get_data")
+    collection_result = CollectionProviderGetDataReturn(zoneIds=[], cols_meta={}, data=[])
+    if (zone_level >= min_refinement_level):
+        try:
+            zoneIds = dggrs_provider.zone_id_from_textual(zoneIds, zone_id_repr) if (zone_id_repr != 'textual') else zoneIds
+            collection_result = cp.get_data(zoneIds, zone_level, datasource_id, cql_filter,
+                                            include_datetime, include_properties, exclude_properties)
+            if (zone_id_repr != 'textual'):
+                collection_result.zoneIds = dggrs_provider.zone_id_to_textual(collection_result.zoneIds, zone_id_repr, zone_level)
+        except DatetimeNotDefinedError:
+            pass
+    logger.debug(f"{__name__} {cid} get_data done")
+    return collection_result
+
+
+@dataclass
+class ZoneLevelsData:
+    # merged data of the collections for each zone level, indexed by zoneId (and datetime)
+    data: Dict[int, pd.DataFrame]
+    data_type: Dict[str, str]
+    nodata_mapping: Dict[str, Any]
+    column_collection: Dict[str, str]
+
 
 def query_zone_data(
     request: Request,
@@ -51,7 +94,7 @@ def query_zone_data(
     include_datetime: bool = False,
     include_properties: Optional[List[str]] = None,
     exclude_properties: Optional[List[str]] = None,
-) -> Optional[Union[ZonesDataDggsJsonResponse, ZonesDataGeoJson, FileResponse, Response]]:
+) -> Optional[Union[ZonesDataGeoJson, StreamingResponse, Response]]:
     logger.debug(f'{__name__} query zone data {dggrs_desc.id}, zone id: {zoneId}, relative_levels: {relative_levels}, return: {returntype}, geometry: {returngeometry}')
     # generate cell ids, geometry for relative_depth, if the first element of relative_levels equal to base_level
     # skip it, add it manually
@@ -60,28 +103,197 @@ def query_zone_data(
         parent_geometry = None
         if (returngeometry is not None):
             parent = dggrs_provider.zonesinfo([zoneId])
-            parent_geometry = [parent.geometry[0]] if (returngeometry == 'zone-region') else [parent.centroids[0]]
+            parent_geometry = parent.geometry[[0]] if (returngeometry == 'zone-region') else parent.centroids[[0]]
         result.relative_zonelevels[base_level] = DGGRSProviderZonesElement(**{'zoneIds': [zoneId], 'geometry': parent_geometry})
     else:
         result = dggrs_provider.get_relative_zonelevels(zoneId, base_level, relative_levels, returngeometry)
+    zone_data = _get_zone_levels_data(result.relative_zonelevels, dggrs_desc, dggrs_provider, collection, collection_provider,
+                                      returngeometry, cql_filter, include_datetime, include_properties, exclude_properties)
+    zone_data_result = _zone_data_result(request, zoneId, base_level, relative_levels, dggrs_desc, collection, zone_data,
+                                         returntype, returngeometry)
+    if (isinstance(zone_data_result, DggsJsonStreamWriter)):
+        return zone_data_result.to_response()
+    return zone_data_result
+
+
+def query_zones_data_batch(
+    request: Request,
+    zoneIds: List[str],
+    base_level: int,
+    relative_levels: List[int],
+    dggrs_desc: DggrsDescription,
+    dggrs_provider: AbstractDGGRSProvider,
+    collection: Dict[str, Collection],
+    collection_provider: Dict[str, AbstractCollectionProvider],
+    returntype='application/json',  # DGGS-JSON by default
+    returngeometry='zone-region',
+    cql_filter: AstType = None,
+    include_datetime: bool = False,
+    include_properties: Optional[List[str]] = None,
+    exclude_properties: Optional[List[str]] = None,
+) -> Union[ZonesDataBatchGeoJson, StreamingResponse]:
+    logger.debug(f'{__name__} query zones data batch {dggrs_desc.id}, zones: {len(zoneIds)}, relative_levels: {relative_levels}, return: {returntype}')
+    results = _zones_data_batch_results(request, zoneIds, base_level, relative_levels, dggrs_desc, dggrs_provider, collection,
+                                        collection_provider, returntype, returngeometry, cql_filter, include_datetime,
+                                        include_properties, exclude_properties)
+    return _zones_data_batch_response(results, returntype)
+
+
+def query_zones_data_batch_levels(
+    request: Request,
+    zoneIds: List[str],
+    depth: List[int],
+    dggrs_desc: DggrsDescription,
+    dggrs_provider: AbstractDGGRSProvider,
+    level_collections: Callable[[int, str], Dict[str, Collection]],
+    collection_provider: Dict[str, AbstractCollectionProvider],
+    returntype='application/json',  # DGGS-JSON by default
+    returngeometry='zone-region',
+    cql_filter: AstType = None,
+    include_datetime: bool = False,
+    include_properties: Optional[List[str]] = None,
+    exclude_properties: Optional[List[str]] = None,
+) -> Union[ZonesDataBatchGeoJson, StreamingResponse]:
+    # zones of mixed refinement levels, the zones are grouped by level and each group is queried as a batch,
+    # level_collections(level, zoneId) returns the collections of a level (zoneId is the first zone of the level)
+    groups: Dict[int, List[str]] = {}
+    for zoneId, level in zip(zoneIds, dggrs_provider.get_cells_zone_level(zoneIds).tolist()):
+        groups.setdefault(level, []).append(zoneId)
+    collections_by_level = {level: level_collections(level, ids[0]) for level, ids in groups.items()}
+    logger.debug(f'{__name__} query zones data batch {dggrs_desc.id}, zones: {len(zoneIds)}, levels: {list(groups.keys())}, return: {returntype}')
+    groups_results = fan_out(_zones_data_batch_results, [
+        (request, ids, level, [level + d for d in depth], dggrs_desc, dggrs_provider, collections_by_level[level],
+         collection_provider, returntype, returngeometry, cql_filter, include_datetime, include_properties, exclude_properties)
+        for level, ids in groups.items()
+    ])
+    merged = {}
+    [merged.update(r) for r in groups_results]
+    return _zones_data_batch_response({zoneId: merged[zoneId] for zoneId in zoneIds}, returntype)
+
+
+def _zones_data_batch_response(results: Dict[str, Any], returntype: str) -> Union[ZonesDataBatchGeoJson, StreamingResponse]:
+    if (returntype == 'application/geo+json'):
+        return ZonesDataBatchGeoJson(zones=results)
+    return StreamingResponse(iter_dggs_json_batch(results), media_type='application/json')
+
+
+def _zones_data_batch_results(
+    request: Request,
+    zoneIds: List[str],
+    base_level: int,
+    relative_levels: List[int],
+    dggrs_desc: DggrsDescription,
+    dggrs_provider: AbstractDGGRSProvider,
+    collection: Dict[str, Collection],
+    collection_provider: Dict[str, AbstractCollectionProvider],
+    returntype: str,
+    returngeometry: Optional[str],
+    cql_filter: AstType,
+    include_datetime: bool,
+    include_properties: Optional[List[str]],
+    exclude_properties: Optional[List[str]],
+) -> Dict[str, Any]:
+    # the relative zone levels of all zones are resolved in one provider pass, then the zones of each level are merged
+    # so that the collections are queried once per zone level for all the zones
+    result = dggrs_provider.get_relative_zonelevels_batch(zoneIds, base_level, [z for z in relative_levels if (z != base_level)],
+                                                          returngeometry)
+    parent_geometry = None
+    if (base_level in relative_levels and returngeometry is not None):
+        parents = dggrs_provider.zonesinfo(zoneIds)
+        parent_geometry = parents.geometry if (returngeometry == 'zone-region') else parents.centroids
+    relative_zonelevels, owners = {}, {}
+    for z in relative_levels:
+        level_geometry, owner_ids, owner_zones = {}, [], []
+        for i, zoneId in enumerate(zoneIds):
+            if (z == base_level):
+                element_ids = [zoneId]
+                element_geometry = [parent_geometry[i]] if (parent_geometry is not None) else None
+            else:
+                element = result[zoneId].relative_zonelevels[z]
+                element_ids, element_geometry = element.zoneIds, element.geometry
+            for j, id_ in enumerate(element_ids):
+                # a zone shared by several parents (ex. aperture 7 hexagons) is queried once
+                level_geometry.setdefault(id_, element_geometry[j] if (element_geometry is not None) else None)
+            owner_ids += element_ids
+            owner_zones += [zoneId] * len(element_ids)
+        relative_zonelevels[z] = DGGRSProviderZonesElement(**{
+            'zoneIds': list(level_geometry.keys()),
+            'geometry': list(level_geometry.values()) if (returngeometry is not None) else None,
+        })
+        owners[z] = pd.DataFrame({'zoneId': owner_ids, batch_zone_column: owner_zones})
+    zone_data = _get_zone_levels_data(relative_zonelevels, dggrs_desc, dggrs_provider, collection, collection_provider,
+                                      returngeometry, cql_filter, include_datetime, include_properties, exclude_properties)
+    zones_data = _split_zone_levels_data(zone_data, owners)
+    return {
+        zoneId: _zone_data_result(request, zoneId, base_level, relative_levels, dggrs_desc, collection,
+                                  zones_data.get(zoneId, ZoneLevelsData({}, {}, {}, {})), returntype, returngeometry)
+        for zoneId in zoneIds
+    }
+
+
+def _split_zone_levels_data(zone_data: ZoneLevelsData, owners: Dict[int, pd.DataFrame]) -> Dict[str, ZoneLevelsData]:
+    # split the merged zone levels data by requested zone
+    zones_data = {}
+    for z, d in zone_data.data.items():
+        index = list(d.index.names)
+        d = d.reset_index().merge(owners[z], on='zoneId', how='inner')
+        columns = [c for c in zone_data.data_type.keys() if (c in d.columns)]
+        for zoneId, zone_d in d.groupby(batch_zone_column, sort=False):
+            if (zone_d[columns].isna().all(axis=None)):
+                # as for a single zone, the zone levels without data are omitted
+                continue
+            if (zoneId not in zones_data):
+                zones_data[zoneId] = ZoneLevelsData({}, zone_data.data_type, zone_data.nodata_mapping, zone_data.column_collection)
+            zones_data[zoneId].data[z] = zone_d.drop(columns=batch_zone_column).set_index(index)
+    return zones_data
+
+
+def _get_zone_levels_data(
+    relative_zonelevels: Dict[int, DGGRSProviderZonesElement],
+    dggrs_desc: DggrsDescription,
+    dggrs_provider: AbstractDGGRSProvider,
+    collection: Dict[str, Collection],
+    collection_provider: Dict[str, AbstractCollectionProvider],
+    returngeometry: Optional[str],
+    cql_filter: AstType,
+    include_datetime: bool,
+    include_properties: Optional[List[str]],
+    exclude_properties: Optional[List[str]],
+) -> ZoneLevelsData:
     # get data and form a master dataframe (selected providers) for each zone level
     data = {}
     data_type = {}
     nodata_mapping = {}
-    zone_level_dims: Dict[int, List[Dimension]] = {}  # per-collection dimensions to manage distinct ones per provider
+    column_collection = {}
     cql_attributes = set() if (cql_filter is None) else getCQLAttributes(cql_filter)
     skipped = 0
+    # the datasource columns are only required to match the cql attributes
+    datasource_vars = {}
+    if (len(cql_attributes) > 0):
+        cids = list(collection.keys())
+        dictionaries = fan_out(_get_datasource_vars, [
+            (collection_provider[collection[cid].collection_provider.providerId], collection[cid].collection_provider.datasource_id)
+            for cid in cids
+        ])
+        datasource_vars = dict(zip(cids, dictionaries))
+    # geometry of each zone level, shared by all collections
+    zone_level_geometry = {
+        z: v.geometry.to_shapely() if (returngeometry is not None) else None
+        for z, v in relative_zonelevels.items()
+    }
+    converted_zone_levels = {}
+    # prepare the get_data calls of each collection and zone level, they are run concurrently then merged in order
+    tasks, tasks_args = [], []
     for cid, c in collection.items():
         logger.debug(f"{__name__} handling {cid}")
         cp = collection_provider[c.collection_provider.providerId]
         datasource_id = c.collection_provider.datasource_id
         cmin_rf = c.collection_provider.min_refinement_level
-        datasource_vars = list(cp.get_datadictionary(datasource_id).data.keys())
-        intersection = (set(datasource_vars) & cql_attributes)
         zone_id_repr = c.collection_provider.dggrs_zoneid_repr
         # check if the cql attributes contain inside the datasource columns
         # The datasource of the collection must consist all columns that match with the attributes of the cql filter
         if ((len(cql_attributes) > 0)):
+            intersection = (set(datasource_vars[cid]) & cql_attributes)
             if ((len(intersection) == 0) or (len(intersection) != len(cql_attributes))):
                 skipped += 1
                 continue
@@ -96,13 +308,17 @@ def query_zone_data(
         excl_props = [prop.split(".", 1)[-1] for prop in (exclude_properties or []) if prop.startswith(f"{cid}.")]
 
         # get data for all relative_levels for the currnet datasource
-        for z, v in result.relative_zonelevels.items():
-            g = [shapely.from_geojson(json.dumps(g.__dict__))for g in v.geometry] if (returngeometry is not None) else None
+        for z, v in relative_zonelevels.items():
+            g = zone_level_geometry[z]
             converted_z = z
             if (convert):
                 # convert the source dggrs ID to the datasource dggrs zoneID.
                 # To simplify the zoneId repr handling, we keep all zoneIds in str repr.
-                converted = dggrs_provider.convert(v.zoneIds, c.collection_provider.dggrsId)
+                # The conversion is shared by the collections with the same dggrs
+                conversion_key = (c.collection_provider.dggrsId, z)
+                if (conversion_key not in converted_zone_levels):
+                    converted_zone_levels[conversion_key] = dggrs_provider.convert(v.zoneIds, c.collection_provider.dggrsId)
+                converted = converted_zone_levels[conversion_key]
                 tmp = gpd.GeoDataFrame({'vid': v.zoneIds}, geometry=g).set_index('vid')
                 # Store the mapping in master pd
                 master = pd.DataFrame({'vid': converted.zoneIds, 'zoneId': converted.target_zoneIds}).set_index('vid')
@@ -117,80 +333,91 @@ def query_zone_data(
                 tmp_dggrs_provider = dggrs_provider
 
             idx = master.index.values.tolist()
-            logger.debug(f"{__name__} {cid} get_data")
-            collection_result = CollectionProviderGetDataReturn(zoneIds=[], cols_meta={}, data=[])
-            if (converted_z >= cmin_rf):
-                try:
-                    idx = tmp_dggrs_provider.zone_id_from_textual(idx, zone_id_repr) if (zone_id_repr != 'textual') else idx
-                    collection_result = cp.get_data(idx, converted_z, datasource_id, cql_filter,
-                                                    include_datetime, incl_props, excl_props)
-                    if (zone_id_repr != 'textual'):
-                        collection_result.zoneIds = tmp_dggrs_provider.zone_id_to_textual(collection_result.zoneIds, zone_id_repr, converted_z)
-                except DatetimeNotDefinedError:
-                    pass
-            logger.debug(f"{__name__} {cid} get_data done")
-            # Changed to use MultiIndex for 2D collections (zoneId, datetime)
-            if collection_result.zoneIds:
-                cols_name = {f'{cid}.{k}': v for k, v in collection_result.cols_meta.items()}
-                # data_col_dims.update({(cid, dim.name): dim for dim in collection_result.dimensions or []})
-                cp_nodata_mapping = cp.datasources[datasource_id].nodata_mapping
-                collection_nodata = {k: cp_nodata_mapping.get("default", np.nan) for k in list(cols_name.keys())}
-                collection_nodata_keys = [k.lower() for k in cp_nodata_mapping.keys() if (k != "default")]
-                [collection_nodata.update({k: cp_nodata_mapping[v.lower()]})
-                 for k, v in cols_name.items() if (v.lower() in collection_nodata_keys)]
-                nodata_mapping.update(collection_nodata)
-                data_type.update(cols_name)
-                id_ = np.array(collection_result.zoneIds).reshape(-1, 1)
-                index = ['zoneId', 'datetime'] if (collection_result.datetimes) else ['zoneId']
-                if (collection_result.datetimes):
-                    dates = np.array(collection_result.datetimes).reshape(-1, 1)
-                    array = np.concatenate([id_, collection_result.data, dates], axis=-1)
-                    names = ['zoneId'] + list(cols_name) + ['datetime']
-                else:
-                    array = np.concatenate([id_, collection_result.data], axis=-1)
-                    names = ['zoneId'] + list(cols_name)
-                tmp = pd.DataFrame(array, columns=names)
-                if (collection_result.datetimes):
-                    # align datetime dtype from different collections (string, float)
-                    tmp['datetime'] = pd.to_datetime(tmp['datetime'], utc=True)
-                tmp.set_index(index, inplace=True)
-                master = master.merge(tmp, how='outer', left_index=True, right_index=True)
-                pre_numeric_cols = {c: str(dtype).replace('int', 'float') for c, dtype in cols_name.items()}
-                post_numeric_cols = {c: str(dtype) for c, dtype in cols_name.items() if 'int' in str(dtype)}
-                master = master.astype(pre_numeric_cols)
-                for int_col, col_dtype in post_numeric_cols.items():
-                    col_dtype = str(col_dtype).capitalize()  # pandas variant that allows nullable
-                    master[int_col] = pd.to_numeric(master[int_col], errors='coerce').astype(col_dtype)
-                if ('vid' in master.columns):
-                    # we have to follow the original index from master, instead of index from the current dataset
-                    original_index = master.index.name
-                    master.reset_index(inplace=True)
-                    if (returngeometry is not None):
-                        tmp_geo = master.groupby('vid')['geometry'].last()
-                        master.drop(columns=['geometry'], inplace=True)
-                    master.drop(columns=['zoneId'], inplace=True)
-                    master = master.groupby('vid').agg(lambda x: mode(x)[0])
-                    if (returngeometry is not None):
-                        master = master.join(tmp_geo)
-                    master = master.reset_index().rename(columns={'vid': 'zoneId'})
-                    master.set_index(original_index, inplace=True)
-                # master = master if (returntype == 'application/geo+json') else master.drop(columns=['geometry'])
-                try:
-                    data[z] = data[z].merge(master, how='outer', suffixes=[None, cid], left_index=True, right_index=True)
-                    data[z] = data[z].drop(columns=[f'geometry{cid}'], errors='ignore') if (returngeometry is not None) else data[z]
-                except KeyError:
-                    data[z] = master
+            tasks.append((cid, z, cp, datasource_id, master))
+            tasks_args.append((cid, cp, tmp_dggrs_provider, idx, converted_z, cmin_rf, datasource_id, zone_id_repr,
+                               cql_filter, include_datetime, incl_props, excl_props))
+    collection_results = fan_out(_get_collection_data, tasks_args)
+    for (cid, z, cp, datasource_id, master), collection_result in zip(tasks, collection_results):
+        # Changed to use MultiIndex for 2D collections (zoneId, datetime)
+        if collection_result.zoneIds:
+            cols_name = {f'{cid}.{k}': v for k, v in collection_result.cols_meta.items()}
+            column_collection.update({k: cid for k in cols_name.keys()})
+            # data_col_dims.update({(cid, dim.name): dim for dim in collection_result.dimensions or []})
+            cp_nodata_mapping = cp.datasources[datasource_id].nodata_mapping
+            collection_nodata = {k: cp_nodata_mapping.get("default", np.nan) for k in list(cols_name.keys())}
+            collection_nodata_keys = [k.lower() for k in cp_nodata_mapping.keys() if (k != "default")]
+            [collection_nodata.update({k: cp_nodata_mapping[v.lower()]})
+             for k, v in cols_name.items() if (v.lower() in collection_nodata_keys)]
+            nodata_mapping.update(collection_nodata)
+            data_type.update(cols_name)
+            id_ = np.array(collection_result.zoneIds).reshape(-1, 1)
+            index = ['zoneId', 'datetime'] if (collection_result.datetimes) else ['zoneId']
+            if (collection_result.datetimes):
+                dates = np.array(collection_result.datetimes).reshape(-1, 1)
+                array = np.concatenate([id_, collection_result.data, dates], axis=-1)
+                names = ['zoneId'] + list(cols_name) + ['datetime']
+            else:
+                array = np.concatenate([id_, collection_result.data], axis=-1)
+                names = ['zoneId'] + list(cols_name)
+            tmp = pd.DataFrame(array, columns=names)
+            if (collection_result.datetimes):
+                # align datetime dtype from different collections (string, float)
+                tmp['datetime'] = pd.to_datetime(tmp['datetime'], utc=True)
+            tmp.set_index(index, inplace=True)
+            master = master.merge(tmp, how='outer', left_index=True, right_index=True)
+            pre_numeric_cols = {c: str(dtype).replace('int', 'float') for c, dtype in cols_name.items()}
+            post_numeric_cols = {c: str(dtype) for c, dtype in cols_name.items() if 'int' in str(dtype)}
+            master = master.astype(pre_numeric_cols)
+            for int_col, col_dtype in post_numeric_cols.items():
+                col_dtype = str(col_dtype).capitalize()  # pandas variant that allows nullable
+                master[int_col] = pd.to_numeric(master[int_col], errors='coerce').astype(col_dtype)
+            if ('vid' in master.columns):
+                # we have to follow the original index from master, instead of index from the current dataset
+                original_index = master.index.name
+                master.reset_index(inplace=True)
+                if (returngeometry is not None):
+                    tmp_geo = master.groupby('vid')['geometry'].last()
+                    master.drop(columns=['geometry'], inplace=True)
+                master.drop(columns=['zoneId'], inplace=True)
+                master = master.groupby('vid').agg(lambda x: mode(x)[0])
+                if (returngeometry is not None):
+                    master = master.join(tmp_geo)
+                master = master.reset_index().rename(columns={'vid': 'zoneId'})
+                master.set_index(original_index, inplace=True)
+            # master = master if (returntype == 'application/geo+json') else master.drop(columns=['geometry'])
+            try:
+                data[z] = data[z].merge(master, how='outer', suffixes=[None, cid], left_index=True, right_index=True)
+                data[z] = data[z].drop(columns=[f'geometry{cid}'], errors='ignore') if (returngeometry is not None) else data[z]
+            except KeyError:
+                data[z] = master
+    return ZoneLevelsData(data, data_type, nodata_mapping, column_collection)
+
+
+def _zone_data_result(
+    request: Request,
+    zoneId: str | int,
+    base_level: int,
+    relative_levels: List[int],
+    dggrs_desc: DggrsDescription,
+    collection: Dict[str, Collection],
+    zone_data: ZoneLevelsData,
+    returntype: str,
+    returngeometry: Optional[str],
+) -> Optional[Union[ZonesDataGeoJson, DggsJsonStreamWriter, Response]]:
+    # DGGS-JSON is returned as a stream writer, to be sent as is or embedded in a batch response
+    data, data_type = zone_data.data, zone_data.data_type
+    nodata_mapping, column_collection = zone_data.nodata_mapping, zone_data.column_collection
     if not data:
         return None
-    datatree, tmpfile = None, None
+    if (returntype in zone_data_columnar_returntype):
+        return zone_data_columnar_response(data, base_level, list(data_type.keys()), returntype, returngeometry)
+    zone_level_dims: Dict[int, List[Dimension]] = {}  # per-collection dimensions to manage distinct ones per provider
+    datatree = None
     features = []
     id_ = 0
     properties, values = {}, {}
     if (returntype == 'application/zarr+zip'):
-        tmpfile = tempfile.mkstemp()
-        zipstore = zarr.ZipStore(tmpfile[1], mode='w')
         datatree = xr.DataTree()
-        # zarr_root = zarr.group(zipstore)
     for z, d in sorted(data.items()):  # in case of multiple depths, returned them ascending
         zone_level_dims_list = []
         for index_name in d.index.names:
@@ -202,21 +429,20 @@ def query_zone_data(
                 zone_level_dims.update({z: zone_level_dims_list})
         if (returntype == 'application/geo+json'):
             d.reset_index(inplace=True)
-            geometry = d['geometry'].values
-            geojson = GeoJSONPolygon if (returngeometry == 'zone-region') else GeoJSONPoint
+            geometry = ZonesGeometry(d['geometry'].values)
             d = d.drop(columns='geometry')
             d['depth'] = z - base_level
             feature = d.to_dict(orient='records')
+            # skip features with all-nan column properties, excluding datetime and zone ID/depth details
+            positions = [i for i, f in enumerate(feature) if all([pd.notna(v) for k, v in f.items() if k in data_type.keys()])]
             feature = [
                 Feature(
                     type="Feature",
                     id=id_ + i,
-                    geometry=geojson(**shapely.geometry.mapping(geometry[i])),
-                    properties=f,
+                    geometry=g,
+                    properties=feature[i],
                 )
-                for i, f in enumerate(feature)
-                # skip features with all-nan column properties, excluding datetime and zone ID/depth details
-                if all([pd.notna(v) for k, v in f.items() if k in data_type.keys()])
+                for i, g in zip(positions, geometry.to_geojson(positions))
             ]
             features += feature
             id_ += len(d)
@@ -228,10 +454,8 @@ def query_zone_data(
             if ("datetime" in d.index.names):
                 zone_datetimes = d.index.get_level_values('datetime').values
             d = d.T
-            nan_mask = d.isna()
-            v = d.values
-            if v[nan_mask].size > 0:
-                v[nan_mask] = np.nan
+            # writable copy with the missing values (None, pd.NA) as NaN
+            v = d.to_numpy(na_value=np.nan)
             diff = OrderedSet(list(d.index)) - OrderedSet(list(properties.keys()))
             properties.update({c: get_json_schema_property(data_type[c]) for c in diff})
             diff = OrderedSet(list(d.index)) - OrderedSet(list(values.keys()))
@@ -259,21 +483,20 @@ def query_zone_data(
                     datatree = datatree.assign({f"zone_level_{z}": xr.DataTree(zone_ds)})
                 else:  # DGGS-(UB)JSON
                     data_count = len(v[i, :])
-                    values[column].append(Value(
+                    values[column].append(DggsJsonValue(
                         depth=z - base_level,
                         shape=Shape(count=data_count, subZones=sub_zones_count, dimensions=data_dims),
-                        data=v[i, :].tolist(),
+                        data=v[i, :],
                     ))
     if (datatree is not None):
-        compressor = Blosc(cname='zstd', clevel=3, shuffle=Blosc.BITSHUFFLE)
+        # the compressor settings are per collection
+        compressors = {cid: get_zarr_encoding(c.collection_provider.zarr_compressor) for cid, c in collection.items()}
         encode = {}
         for zone in datatree.groups:
             if (len(datatree[zone].data_vars) > 0):
-                zone_encoder = {k: {'compressor': compressor} for k in datatree[zone].data_vars.keys()}
+                zone_encoder = {k: compressors[column_collection[k]] for k in datatree[zone].data_vars.keys()}
                 encode[zone] = zone_encoder
-        datatree.to_zarr(zipstore, encoding=encode)
-        zipstore.close()
-        return FileResponse(tmpfile[1], headers={'content-type': 'application/zarr+zip'})
+        return zarr_zip_response(datatree, encode)
     if (returntype == 'application/geo+json'):
         return ZonesDataGeoJson(type='FeatureCollection', features=features)
     col_schema_id = None
@@ -289,16 +512,16 @@ def query_zone_data(
         'zoneId': str(zoneId),
         'depths': relative_levels,
         'schema': Schema(properties=properties, id_=col_schema_id),
-        'values': values,
+        'values': {},  # written from the column buffers by the stream writer
     })
     if zone_level_dims:
         # temporary fix the issue https://github.com/LandscapeGeoinformatics/pydggsapi/issues/65#issuecomment-3618504418
         # by just return the deepest zone depth dimension
         deepest_zone_level = sorted(list(zone_level_dims.keys()))[-1]
         return_['dimensions'] = zone_level_dims[deepest_zone_level]
-    dggs_json = ZonesDataDggsJsonResponse(**return_)
+    dggs_json = DggsJsonStreamWriter(ZonesDataDggsJsonResponse(**return_), values)
     if (returntype == 'application/ubjson'):
-        dggs_ubjson = ubjson.dumpb(dggs_json.model_dump(mode='json'), no_float32=False)
+        dggs_ubjson = ubjson.dumpb(dggs_json.to_model().model_dump(mode='json'), no_float32=False)
         return Response(dggs_ubjson, headers={
             'content-type': 'application/ubjson',
             'content-disposition': 'attachment; name="dggs-zone-data"; filename="dggs-zone-data.ubjson"',
@@ -0,0 +1,103 @@
+# Streaming DGGS-JSON writer
+#
+# Emits the DGGS-JSON document directly from the NumPy column buffers, instead of building the 'Value' models with
+# Python lists of the data and letting FastAPI validate and serialize the whole document. The envelope (everything
+# except the values) is still rendered from the pydantic models, the data arrays are serialized chunk by chunk,
+# using the same JSON settings as FastAPI's JSONResponse, so that the output is byte-compatible.
+
+from pydggsapi.schemas.ogc_dggs.dggrs_zones_data import Shape, Value, ZonesDataDggsJsonResponse
+
+from dataclasses import dataclass
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, Iterator, List, Optional
+import numpy as np
+import math
+import json
+
+# same settings as starlette's JSONResponse.render
+_json_kwargs: Dict[str, Any] = dict(ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"))
+
+
+@dataclass
+class DggsJsonValue:
+    depth: int
+    shape: Shape
+    data: np.ndarray
+
+    def to_value(self) -> Value:
+        return Value(depth=self.depth, shape=self.shape, data=_to_json_list(self.data))
+
+
+def _to_json_scalar(x: Any) -> Any:
+    if (isinstance(x, np.generic)):
+        x = x.item()
+    if (isinstance(x, float) and not math.isfinite(x)):
+        return None  # NaN / inf are serialized as null by pydantic
+    return x
+
+
+def _to_json_list(data: np.ndarray) -> List[Any]:
+    if (data.dtype.kind == 'f'):
+        data = data.astype(object)
+        data[~np.isfinite(data.astype(float))] = None
+        return data.tolist()
+    return [_to_json_scalar(x) for x in data.tolist()]
+
+
+def _dumps(obj: Any) -> str:
+    return json.dumps(obj, **_json_kwargs)
+
+
+class DggsJsonStreamWriter:
+
+    def __init__(self, envelope: ZonesDataDggsJsonResponse, values: Dict[str, List[DggsJsonValue]], chunk_size: int = 65536):
+        # the envelope must be given with empty values
+        self.envelope = envelope
+        self.values = values
+        self.chunk_size = chunk_size
+
+    def _head(self) -> str:
+        head = _dumps(jsonable_encoder(self.envelope))
+        # 'values' is the last field of the model, open it to append the columns
+        if (not head.endswith('"values":{}}')):
+            raise ValueError(f'{__name__} unexpected DGGS-JSON envelope: {head[-64:]}')
+        return head[:-2]
+
+    def iter_text(self) -> Iterator[str]:
+        yield self._head()
+        for i, (column, column_values) in enumerate(self.values.items()):
+            yield f'{"," if (i > 0) else ""}{_dumps(column)}:['
+            for j, value in enumerate(column_values):
+                shape = _dumps(jsonable_encoder(value.shape))
+                yield f'{"," if (j > 0) else ""}{{"depth":{_dumps(value.depth)},"shape":{shape},"data":['
+                for k in range(0, len(value.data), self.chunk_size):
+                    chunk = _dumps(_to_json_list(value.data[k:k + self.chunk_size]))[1:-1]
+                    yield f'{"," if (k > 0) else ""}{chunk}'
+                yield ']}'
+            yield ']'
+        yield '}}'
+
+    def __iter__(self) -> Iterator[bytes]:
+        for text in self.iter_text():
+            yield text.encode('utf-8')
+
+    def to_model(self) -> ZonesDataDggsJsonResponse:
+        model = self.envelope.model_copy()
+        model.values = {column: [v.to_value() for v in column_values] for column, column_values in self.values.items()}
+        return model
+
+    def to_response(self, **kwargs) -> StreamingResponse:
+        return StreamingResponse(iter(self), media_type='application/json', **kwargs)
+
+
+def iter_dggs_json_batch(writers: Dict[str, Optional[DggsJsonStreamWriter]]) -> Iterator[bytes]:
+    # {"zones": {<zoneId>: <DGGS-JSON> | null, ...}}
+    yield b'{"zones":{'
+    for i, (zoneId, writer) in enumerate(writers.items()):
+        yield f'{"," if (i > 0) else ""}{_dumps(str(zoneId))}:'.encode('utf-8')
+        if (writer is None):
+            yield b'null'
+        else:
+            yield from writer
+    yield b'}}'
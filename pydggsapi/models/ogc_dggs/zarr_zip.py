@@ -0,0 +1,77 @@
+# Zarr zip export
+#
+# The datatree is written into a memory-backed zarr store, the store entries are then packed into a zip spooled in
+# memory, which spills to a scratch file once it grows over ZARR_ZIP_SPOOL_MAX_BYTES (default 64 MiB).
+# The scratch files are created in ZARR_ZIP_SCRATCH_DIR (default: the system temp directory) and are removed once the
+# response is sent.
+# Both zarr 2 and zarr 3 are supported, the chunks are compressed with Blosc according to the collection settings.
+
+from pydggsapi.schemas.api.collections import ZarrCompressor
+
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Any, Dict, Iterator, IO
+import xarray as xr
+import tempfile
+import zipfile
+import logging
+import zarr
+import os
+
+logger = logging.getLogger()
+
+zarr_v3 = int(zarr.__version__.split('.')[0]) >= 3
+zarr_zip_read_size = 1 << 20
+
+
+def get_zarr_encoding(compressor: ZarrCompressor) -> Dict[str, Any]:
+    # the variable encoding for xarray's to_zarr
+    if (zarr_v3):
+        from zarr.codecs import BloscCodec
+        return {'compressors': [BloscCodec(cname=compressor.cname, clevel=compressor.clevel, shuffle=compressor.shuffle)]}
+    from numcodecs import Blosc
+    shuffle = {'noshuffle': Blosc.NOSHUFFLE, 'shuffle': Blosc.SHUFFLE, 'bitshuffle': Blosc.BITSHUFFLE}[compressor.shuffle]
+    return {'compressor': Blosc(cname=compressor.cname, clevel=compressor.clevel, shuffle=shuffle)}
+
+
+def _to_bytes(value: Any) -> bytes:
+    # zarr 3 stores Buffer objects
+    return value.to_bytes() if (hasattr(value, 'to_bytes')) else bytes(value)
+
+
+def write_zarr_zip(datatree: xr.DataTree, encoding: Dict[str, Dict[str, Any]], fileobj: IO[bytes]):
+    store_dict: Dict[str, Any] = {}
+    store = zarr.storage.MemoryStore(store_dict) if (zarr_v3) else store_dict
+    datatree.to_zarr(store, encoding=encoding)
+    # the chunks are already compressed
+    with zipfile.ZipFile(fileobj, mode='w', compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for key in sorted(store_dict.keys()):
+            # release the entries once they are in the zip to keep a single copy of the data
+            zf.writestr(key, _to_bytes(store_dict.pop(key)))
+
+
+def _iter_file(fileobj: IO[bytes]) -> Iterator[bytes]:
+    try:
+        fileobj.seek(0)
+        while (chunk := fileobj.read(zarr_zip_read_size)):
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+def zarr_zip_response(datatree: xr.DataTree, encoding: Dict[str, Dict[str, Any]]) -> StreamingResponse:
+    max_size = int(os.environ.get('ZARR_ZIP_SPOOL_MAX_BYTES', 64 << 20))
+    scratch_dir = os.environ.get('ZARR_ZIP_SCRATCH_DIR')
+    if (scratch_dir is not None):
+        os.makedirs(scratch_dir, exist_ok=True)
+    spool = tempfile.SpooledTemporaryFile(max_size=max_size, dir=scratch_dir, prefix='pydggsapi-zarr-', suffix='.zip')
+    try:
+        write_zarr_zip(datatree, encoding, spool)
+        size = spool.tell()
+    except Exception:
+        spool.close()
+        raise
+    logger.debug(f'{__name__} zarr zip size: {size}')
+    # closing twice is harmless, the background task covers responses that are never iterated
+    return StreamingResponse(_iter_file(spool), media_type='application/zarr+zip',
+                             headers={'content-length': str(size)}, background=BackgroundTask(spool.close))
@@ -1,4 +1,4 @@
-from pydggsapi.schemas.ogc_dggs.common_ogc_dggs_api import Feature, ReturnGeometryTypes
+from pydggsapi.schemas.ogc_dggs.common_ogc_dggs_api import Feature, Link, ReturnGeometryTypes
 from pydggsapi.schemas.ogc_dggs.dggrs_zones import ZonesResponse, ZonesGeoJson
 from pydggsapi.schemas.ogc_dggs.dggrs_descrption import DggrsDescription
 from pydggsapi.schemas.api.collections import Collection
@@ -6,16 +6,202 @@ from pydggsapi.schemas.api.collections import Collection
 from pydggsapi.dependencies.dggrs_providers.abstract_dggrs_provider import AbstractDGGRSProvider
 from pydggsapi.dependencies.collections_providers.abstract_collection_provider import AbstractCollectionProvider, DatetimeNotDefinedError
 from pydggsapi.dependencies.api.utils import getCQLAttributes
+from pydggsapi.dependencies.api.executors import fan_out
+from pydggsapi.dependencies.api.response_cache import response_cache_key
+from pydggsapi.dependencies.api.presence_index import get_presence_bitmap
+from pydggsapi.schemas.api.dggrs_providers import DGGRSProviderConversionReturn, DGGRSProviderZonesListReturn
 
 import numpy as np
-from fastapi import Response
+import pandas as pd
+from fastapi import Request, Response
 from pygeofilter.ast import AstType
 from shapely.geometry import Polygon
-from typing import Dict
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import threading
+import binascii
 import logging
+import base64
+import time
+import json
+import os
 
 logger = logging.getLogger()
 
+# the zones are filtered in windows of the generated zones list, the window grows until the page is filled
+zones_list_min_window = 1024
+# query parameters that can change between the pages of the same zones list
+zones_cursor_free_params = ('cursor', 'offset', 'limit', 'f')
+# generated zones lists of the queries with further pages, (dggrs id, cursor fingerprint, geometry mode) ->
+# (expires, zones list), bounded by the total number of zones ZONES_LIST_CACHE_ZONES (default 2000000, 0 to disable)
+# and kept ZONES_LIST_CACHE_TTL seconds (default 300)
+_zones_lists: OrderedDict = OrderedDict()
+_zones_lists_lock = threading.Lock()
+
+
+def _get_datasource_vars(cp: AbstractCollectionProvider, datasource_id: str) -> List[str]:
+    return list(cp.get_datadictionary(datasource_id).data.keys())
+
+
+def _zones_cursor_fingerprint(request: Request) -> str:
+    # a cursor is only valid for the query it was issued for
+    params = sorted((k, v) for k, v in request.query_params.multi_items() if (k not in zones_cursor_free_params))
+    return response_cache_key(request.url.path, params)[:16]
+
+
+def _get_cached_zones_list(key: Tuple) -> Optional[DGGRSProviderZonesListReturn]:
+    with _zones_lists_lock:
+        entry = _zones_lists.get(key)
+        if (entry is None):
+            return None
+        if (entry[0] < time.monotonic()):
+            del _zones_lists[key]
+            return None
+        _zones_lists.move_to_end(key)
+        return entry[1]
+
+
+def _cache_zones_list(key: Tuple, result: DGGRSProviderZonesListReturn):
+    max_zones = int(os.environ.get('ZONES_LIST_CACHE_ZONES', 2000000))
+    if (len(result.zones) > max_zones):
+        return
+    expires = time.monotonic() + float(os.environ.get('ZONES_LIST_CACHE_TTL', 300))
+    with _zones_lists_lock:
+        _zones_lists.pop(key, None)
+        _zones_lists[key] = (expires, result)
+        while (sum(len(e[1].zones) for e in _zones_lists.values()) > max_zones):
+            _zones_lists.popitem(last=False)
+
+
+def encode_zones_cursor(position: int, fingerprint: str) -> str:
+    token = json.dumps({'p': position, 'q': fingerprint}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(token).decode('ascii').rstrip('=')
+
+
+def decode_zones_cursor(cursor: str, fingerprint: str) -> int:
+    try:
+        token = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        position, query = int(token['p']), token['q']
+    except (binascii.Error, ValueError, TypeError, KeyError) as e:
+        raise ValueError(f'{__name__} invalid cursor {cursor}: {e}')
+    if (query != fingerprint or position < 0):
+        raise ValueError(f'{__name__} cursor {cursor} does not belong to this query')
+    return position
+
+
+def _get_filtered_zones(
+    cp: AbstractCollectionProvider,
+    zoneIds: List,
+    zone_level: int,
+    datasource_id: str,
+    cql_filter: AstType,
+    include_datetime: bool,
+    converted: DGGRSProviderConversionReturn | None,
+    zone_id_repr: str,
+    request_zone_level: int,
+    dggrs_provider: AbstractDGGRSProvider,
+    keyed: bool,
+) -> np.ndarray:
+    # returns the matched zones as uint64 keys (keyed) or textual zone IDs
+    try:
+        # existence only, the properties are not read
+        filtered_zoneIds = cp.has_data(zoneIds, zone_level, datasource_id, cql_filter, include_datetime)
+    except DatetimeNotDefinedError:
+        filtered_zoneIds = []
+    if (converted is not None):
+        # The zoneId repr of target_zoneIds and the filtered_zoneIds is aligned, no need to handle
+        # and the zoneIds is in original repr (str)
+        filtered_zoneIds = np.asarray(converted.zoneIds, dtype=object)[pd.Index(converted.target_zoneIds).isin(filtered_zoneIds)]
+    elif (zone_id_repr == 'int' and keyed):
+        # the integer zone IDs are the keys
+        return np.asarray(filtered_zoneIds, dtype=np.uint64)
+    elif (zone_id_repr != 'textual'):
+        filtered_zoneIds = dggrs_provider.zone_id_to_textual(np.asarray(filtered_zoneIds), zone_id_repr, request_zone_level)
+    if (keyed):
+        return dggrs_provider.zone_id_keys(list(filtered_zoneIds))
+    return np.asarray(filtered_zoneIds, dtype=object)
+
+
+def _filter_zones_window(
+    zones: List[str],
+    zone_level: int,
+    dggrs_info: DggrsDescription,
+    dggrs_provider: AbstractDGGRSProvider,
+    collection: Dict[str, Collection],
+    collection_provider: Dict[str, AbstractCollectionProvider],
+    cql_filter: AstType,
+    include_datetime: bool,
+) -> Tuple[np.ndarray, np.ndarray]:
+    # returns the keys of the zones and the mask of the zones matched by at least one collection
+    keys = dggrs_provider.zone_id_keys(zones)
+    keyed = (keys is not None)
+    if (not keyed):
+        keys = np.asarray(zones, dtype=object)
+    converted_zones_cache = {}
+    indexed_mask = np.zeros(len(zones), dtype=bool)
+    # prepare the get_data calls of each collection, they are run concurrently then merged
+    tasks_args = []
+    for k, v in collection.items():
+        converted = None
+        native = (v.collection_provider.dggrsId == dggrs_info.id)
+        if (native and keyed and cql_filter is None):
+            # the zones with data are known from the presence index of the collection
+            bitmap = get_presence_bitmap(k, v, collection_provider[v.collection_provider.providerId], dggrs_provider, zone_level)
+            if (bitmap is not None):
+                indexed_mask |= bitmap.contains(keys)
+                continue
+        converted_zones = zones
+        converted_level = zone_level
+        datasource_id = v.collection_provider.datasource_id
+        cp_id = v.collection_provider.providerId
+        zone_id_repr = v.collection_provider.dggrs_zoneid_repr
+        if (not native and v.collection_provider.dggrsId in dggrs_provider.dggrs_conversion):
+            # perform conversion, shared by the collections with the same dggrs and zone id repr
+            conversion_key = (v.collection_provider.dggrsId, zone_id_repr)
+            if (conversion_key not in converted_zones_cache):
+                converted_zones_cache[conversion_key] = dggrs_provider.convert(zones, v.collection_provider.dggrsId, zone_id_repr)
+            converted = converted_zones_cache[conversion_key]
+            converted_zones = converted.target_zoneIds
+            converted_level = converted.target_res[0]
+        elif (zone_id_repr == 'int' and keyed):
+            converted_zones = keys.tolist()
+        elif (zone_id_repr != 'textual'):
+            converted_zones = dggrs_provider.zone_id_from_textual(converted_zones, zone_id_repr)
+        tasks_args.append((collection_provider[cp_id], converted_zones, converted_level, datasource_id, cql_filter,
+                           include_datetime, converted, zone_id_repr, zone_level, dggrs_provider, keyed))
+    if (len(tasks_args) == 0):
+        return keys, indexed_mask
+    matched = np.concatenate(fan_out(_get_filtered_zones, tasks_args))
+    # hash based membership
+    return keys, (indexed_mask | pd.Index(keys).isin(matched))
+
+
+def _scan_zones(
+    zones: List[str],
+    start: int,
+    count: int,
+    **window_kwargs,
+) -> Tuple[np.ndarray, np.ndarray, bool]:
+    # positions (in the generated zones list) and keys of the first `count` matched zones from `start`,
+    # and whether more zones match after them
+    positions, keys = [], []
+    found = 0
+    window = max(count + 1, zones_list_min_window)
+    while (start < len(zones) and found <= count):
+        end = min(start + window, len(zones))
+        window_keys, mask = _filter_zones_window(zones[start:end], **window_kwargs)
+        matched = np.flatnonzero(mask)
+        positions.append(matched + start)
+        keys.append(window_keys[matched])
+        found += len(matched)
+        logger.debug(f'{__name__} query zones list window [{start}, {end}): {len(matched)} matched')
+        start = end
+        window *= 2
+    if (len(positions) == 0):
+        return np.array([], dtype=np.int64), np.array([], dtype=object), False
+    positions, keys = np.concatenate(positions), np.concatenate(keys)
+    return positions[:count], keys[:count], (len(positions) > count)
+
 
 def query_zones_list(
     bbox: Polygon | None,
@@ -31,67 +217,64 @@ def query_zones_list(
     returngeometry: ReturnGeometryTypes = 'zone-region',
     cql_filter: AstType = None,
     include_datetime: bool = False,
+    offset: int = 0,
+    cursor: str | None = None,
+    request: Request | None = None,
 ) -> ZonesResponse | ZonesGeoJson | Response | None:
-    logger.debug(f'{__name__} query zones list: {bbox}, {zone_level}, {limit}, {parent_zone}, {compact}')
-    # generate zones for the bbox at the required zone_level
-    result = dggrs_provider.zoneslist(bbox, zone_level, parent_zone, returngeometry, compact)
-    filter_ = []
+    logger.debug(f'{__name__} query zones list: {bbox}, {zone_level}, {limit}, {offset}, {parent_zone}, {compact}')
+    fingerprint = _zones_cursor_fingerprint(request) if (request is not None) else ''
+    start = decode_zones_cursor(cursor, fingerprint) if (cursor is not None) else 0
     cql_attributes = set() if (cql_filter is None) else getCQLAttributes(cql_filter)
     zone_list_binary = (returntype == 'application/x-binary')
-    skipped = 0
-    for k, v in collection.items():
-        converted = None
-        converted_zones = result.zones
-        converted_level = zone_level
-        datasource_id = v.collection_provider.datasource_id
-        cp_id = v.collection_provider.providerId
-        datasource_vars = list(collection_provider[cp_id].get_datadictionary(datasource_id).data.keys())
-        zone_id_repr = v.collection_provider.dggrs_zoneid_repr
-        intersection = (set(datasource_vars) & cql_attributes)
+    # the datasource columns are only required to match the cql attributes
+    if (len(cql_attributes) > 0):
+        cids = list(collection.keys())
+        dictionaries = fan_out(_get_datasource_vars, [
+            (collection_provider[collection[k].collection_provider.providerId], collection[k].collection_provider.datasource_id)
+            for k in cids
+        ])
         # check if the cql attributes contain inside the datasource
         # The datasource of the collection must consist all columns that match with the attributes of the cql filter
-        if ((len(cql_attributes) > 0)):
-            if ((len(intersection) == 0) or (len(intersection) != len(cql_attributes))):
-                skipped += 1
-                continue
-        if (v.collection_provider.dggrsId != dggrs_info.id and
-                v.collection_provider.dggrsId in dggrs_provider.dggrs_conversion):
-            # perform conversion
-            converted = dggrs_provider.convert(result.zones, v.collection_provider.dggrsId, zone_id_repr)
-            converted_zones = converted.target_zoneIds
-            converted_level = converted.target_res[0]
-        else:
-            if (zone_id_repr != 'textual'):
-                converted_zones = dggrs_provider.zone_id_from_textual(converted_zones, zone_id_repr)
-        try:
-            filtered_zoneIds = collection_provider[cp_id].get_data(converted_zones, converted_level,
-                                                                   datasource_id, cql_filter, include_datetime, input_zoneIds_padding=False).zoneIds
-        except DatetimeNotDefinedError:
-            filtered_zoneIds = []
-            pass
-        if (converted is not None):
-            # The zoneId repr of target_zoneIds and the filtered_zoneIds is aligned, no need to handle
-            # and the zoneIds is in original repr (str)
-            filtered_zoneIds = np.array(converted.zoneIds)[np.isin(converted.target_zoneIds, filtered_zoneIds)].tolist()
-        if (zone_id_repr != 'textual' and not zone_list_binary):
-            filtered_zoneIds = dggrs_provider.zone_id_to_textual(filtered_zoneIds, zone_id_repr, zone_level)
-        elif (zone_id_repr != 'int' and zone_list_binary):
-            filtered_zoneIds = dggrs_provider.zone_id_from_textual(filtered_zoneIds, "int")
-        filter_ += filtered_zoneIds
-    if (skipped == len(collection)):
-        raise ValueError(f"{__name__} query zones list cql attributes({cql_attributes}) not found in all collections.")
-    if (len(filter_) == 0):
+        collection = {k: collection[k] for k, variables in zip(cids, dictionaries)
+                      if (cql_attributes.issubset(variables))}
+        if (len(collection) == 0):
+            raise ValueError(f"{__name__} query zones list cql attributes({cql_attributes}) not found in all collections.")
+    # generate zones for the bbox at the required zone_level,
+    # the geometry is only generated for the GeoJSON features of the returned page
+    geometry_mode = 'lazy' if (returntype == 'application/geo+json') else 'none'
+    # the next pages of the query reuse the zones list generated for the first one
+    zones_list_key = (dggrs_info.id, fingerprint, geometry_mode) if (request is not None) else None
+    result = _get_cached_zones_list(zones_list_key) if (zones_list_key is not None) else None
+    generated = (result is None)
+    if (generated):
+        result = dggrs_provider.zoneslist(bbox, zone_level, parent_zone, returngeometry, compact, geometry_mode=geometry_mode)
+    # the providers are only queried until offset + limit zones are matched
+    positions, keys, more = _scan_zones(result.zones, start, offset + limit, zone_level=zone_level, dggrs_info=dggrs_info,
+                                        dggrs_provider=dggrs_provider, collection=collection,
+                                        collection_provider=collection_provider, cql_filter=cql_filter,
+                                        include_datetime=include_datetime)
+    positions, keys = positions[offset:], keys[offset:]
+    if (more and generated and zones_list_key is not None):
+        _cache_zones_list(zones_list_key, result)
+    if (len(positions) == 0):
         return None
-    logger.debug(f'{__name__} query zones list result: {len(filter_)}')
+    logger.debug(f'{__name__} query zones list result: {len(positions)}')
+    links = None
+    if (more and request is not None):
+        href = request.url.remove_query_params(['offset', 'cursor'])
+        href = href.include_query_params(cursor=encode_zones_cursor(int(positions[-1]) + 1, fingerprint))
+        links = [Link(href=str(href), rel='next', type=returntype, title='Next page of zones')]
+    zones = [result.zones[i] for i in positions.tolist()]
     if (returntype == 'application/geo+json'):
-        features = [Feature(**{'type': 'Feature', 'id': i, 'geometry': result.geometry[i], 'properties': {'zoneId': zid}})
-                    for i, zid in enumerate(result.zones[:limit]) if (zid in filter_)]
-        return ZonesGeoJson(**{'type': 'FeatureCollection', 'features': features})
-    zones = np.unique(filter_[:limit])
+        geometry = result.get_geometry(positions.tolist()).to_geojson()
+        features = [Feature(**{'type': 'Feature', 'id': i, 'geometry': g, 'properties': {'zoneId': zid}})
+                    for i, g, zid in zip(positions.tolist(), geometry, zones)]
+        return ZonesGeoJson(**{'type': 'FeatureCollection', 'features': features, 'links': links})
     if zone_list_binary:
-        zone_ids = np.array(zones, dtype=np.uint64)
+        zone_ids = keys if (keys.dtype == np.uint64) else np.array(dggrs_provider.zone_id_from_textual(zones, 'int'), dtype=np.uint64)
         zone_count = np.array([len(zone_ids)], dtype=np.uint64)
         zone_list = np.concatenate((zone_count, zone_ids))
-        return Response(content=zone_list.tobytes(), media_type='application/x-binary')
-    total_area = sum(np.array(result.returnedAreaMetersSquare)[np.isin(result.zones, zones)].tolist())
-    return ZonesResponse(**{'zones': zones, 'returnedAreaMetersSquare': total_area})
+        headers = {'Link': links[0].header()} if (links is not None) else None
+        return Response(content=zone_list.tobytes(), media_type='application/x-binary', headers=headers)
+    total_area = float(np.asarray(result.returnedAreaMetersSquare, dtype=np.float64)[positions].sum())
+    return ZonesResponse(**{'zones': zones, 'returnedAreaMetersSquare': total_area, 'links': links})
@@ -3,17 +3,19 @@
 # that means this module export a FastAPI router that gets mounted
 # in the main api.py under /dggs-api/v1-pre
 
-from typing import Annotated, Dict, List, Optional, Union, cast
+from typing import Annotated, Any, Dict, List, Optional, Union, cast
 from functools import cache
 import logging
 import copy
 import importlib
 import traceback
+import os
 
 import pyproj
 from fastapi import APIRouter, HTTPException, Depends, Request, Path, Query
 from fastapi.params import Param
 from fastapi.responses import JSONResponse, FileResponse, Response
+from starlette.concurrency import run_in_threadpool
 from starlette.datastructures import URL
 from shapely.geometry import box
 from shapely.ops import transform
@@ -34,8 +36,13 @@ from pydggsapi.schemas.ogc_dggs.dggrs_zones_info import (
 )
 from pydggsapi.schemas.ogc_dggs.dggrs_zones_data import (
     ZonesDataRequest,
+    ZonesDataBatchRequest,
     ZonesDataDggsJsonResponse,
     ZonesDataGeoJson,
+    ZonesDataBatchGeoJson,
+    zone_data_batch_support_responses,
+    zone_data_batch_support_returntype,
+    zone_data_columnar_returntype,
     zone_data_support_formats,
     zone_data_support_responses,
     zone_data_support_returntype,
@@ -56,12 +63,26 @@ from pydggsapi.schemas.ogc_collections.queryables import CollectionQueryables
 from pydggsapi.schemas.ogc_collections.schema import JsonSchemaResponse
 
 from pydggsapi.models.ogc_dggs.core import get_queryables, query_support_dggs, query_dggrs_definition, query_zone_info, landingpage
-from pydggsapi.models.ogc_dggs.data_retrieval import query_zone_data
+from pydggsapi.models.ogc_dggs.data_retrieval import query_zone_data, query_zones_data_batch_levels
 from pydggsapi.models.ogc_dggs.zone_query import query_zones_list
 
 from pydggsapi.dependencies.api.collections import get_collections_info
 from pydggsapi.dependencies.api.collection_providers import get_collection_providers
 from pydggsapi.dependencies.api.dggrs import get_dggrs_descriptions, get_dggrs_class, get_conformance_classes
+from pydggsapi.dependencies.api.executors import run_in_executor, ExecutorSaturatedError
+from pydggsapi.dependencies.api.response_cache import (
+    get_response_cache,
+    get_response_cache_default_ttl,
+    response_cache_key,
+    cache_response,
+)
+from pydggsapi.dependencies.api.conditional_requests import (
+    Validators,
+    get_collections_version,
+    get_validators,
+    not_modified,
+    set_validators,
+)
 
 from pydggsapi.dependencies.dggrs_providers.abstract_dggrs_provider import AbstractDGGRSProvider
 from pydggsapi.dependencies.collections_providers.abstract_collection_provider import AbstractCollectionProvider
@@ -234,6 +255,63 @@ def _get_return_type(
     return returntype
 
 
+async def _run_blocking(dggrs_provider: AbstractDGGRSProvider, func, *args, **kwargs):
+    # dispatch the blocking query into the executor pool of the dggrs provider type,
+    # so that the event loop stays available for the other routes.
+    return await run_in_executor(type(dggrs_provider).__name__, func, *args, **kwargs)
+
+
+def _saturated_exception(e: ExecutorSaturatedError) -> HTTPException:
+    logger.warning(f'{__name__} {e}')
+    return HTTPException(status_code=503, detail=f'{__name__} {e}', headers={'Retry-After': str(e.retry_after)})
+
+
+def _get_cache_ttl(collections: Dict[str, Collection]) -> int:
+    # the shortest TTL of the collections involved in the response
+    default_ttl = get_response_cache_default_ttl()
+    ttls = [c.collection_provider.cache_ttl if (c.collection_provider.cache_ttl is not None) else default_ttl
+            for c in collections.values()]
+    return min(ttls) if (len(ttls) > 0) else default_ttl
+
+
+def _get_zone_data_collections(
+    collections: Dict[str, Collection],
+    dggrsId: str,
+    dggrs_provider: AbstractDGGRSProvider,
+    zoneId: Any,
+    depth: List[int],
+    relative_levels: List[int],
+) -> Dict[str, Collection]:
+    # collections supporting the dggrs and the zone levels requested
+    skip_collection = []
+    for k, v in collections.items():
+        max_ = v.collection_provider.max_refinement_level
+        # if the dggrsId is not the native dggrs supported by the collection,
+        # check if the native dggrs supports conversion
+        if (dggrsId != v.collection_provider.dggrsId
+                and v.collection_provider.dggrsId not in dggrs_provider.dggrs_conversion):
+            skip_collection.append(k)
+            continue
+        # if the dggrsId is not the primary dggrs supported by the collection.
+        if (dggrsId != v.collection_provider.dggrsId
+                and v.collection_provider.dggrsId in dggrs_provider.dggrs_conversion):
+            max_ = v.collection_provider.max_refinement_level + dggrs_provider.dggrs_conversion[v.collection_provider.dggrsId].zonelevel_offset
+        for z in relative_levels:
+            if (z > max_):
+                skip_collection.append(k)
+                logger.warning(f'{__name__} query zone data {dggrsId}, zone id {zoneId} with relative depth: {z} not supported')
+    if (len(collections) == len(skip_collection)):
+        raise HTTPException(status_code=400,
+                            detail=f"f'{__name__} zone id {zoneId} with relative depth: {depth} is over refinement for all collections")
+    return {k: v for k, v in collections.items() if (k not in skip_collection)}
+
+
+def _set_validators(result: Any, resp: Response, validators: Optional[Validators]) -> Any:
+    # models are rendered by FastAPI, which merges the headers of the 'resp' dependency
+    set_validators(result if (isinstance(result, Response)) else resp, validators)
+    return result
+
+
 # API Initialization checking and setup.
 try:
     dggrs = get_dggrs_descriptions()
@@ -518,13 +596,14 @@ async def collection_dggrs_description(
 )
 async def dggrs_zone_info(
     req: Request,
+    resp: Response,
     zoneinfoReq: Annotated[ZoneInfoPathRequest, Depends()],
     dggrs_description: DggrsDescription = Depends(_get_dggrs_description),
     dggrs_provider: AbstractDGGRSProvider = Depends(_get_dggrs_provider),
     collection_provider=Depends(_get_collection_provider),
 ) -> Union[ZoneInfoResponse, Response]:
     collections = _get_collection_info(None)
-    return await collection_dggrs_zone_info(req, zoneinfoReq, dggrs_description, dggrs_provider, collections, collection_provider)
+    return await collection_dggrs_zone_info(req, resp, zoneinfoReq, dggrs_description, dggrs_provider, collections, collection_provider)
 
 
 @router.get(
@@ -535,14 +614,24 @@ async def dggrs_zone_info(
 )
 async def collection_dggrs_zone_info(
     req: Request,
+    resp: Response,
     zoneinfoReq: Annotated[CollectionZoneInfoPathRequest, Depends()],
     dggrs_description: DggrsDescription = Depends(_get_dggrs_description),
     dggrs_provider: AbstractDGGRSProvider = Depends(_get_dggrs_provider),
     collections: Dict[str, Collection] = Depends(_get_collection),
     collection_provider: Dict[str, AbstractCollectionProvider] = Depends(_get_collection_provider),
 ) -> Union[ZoneInfoResponse, Response]:
+    version = await run_in_threadpool(get_collections_version, collections, collection_provider)
+    validators = get_validators(version, 'zone-info', str(req.url.replace(query=None, fragment=None)),
+                                sorted(collections.keys()), zoneinfoReq.dggrsId, str(zoneinfoReq.zoneId))
+    response = not_modified(req, validators)
+    if (response is not None):
+        return response
     try:
-        info = query_zone_info(zoneinfoReq, req.url, dggrs_description, dggrs_provider, collections, collection_provider)
+        info = await _run_blocking(dggrs_provider, query_zone_info, zoneinfoReq, req.url, dggrs_description,
+                                   dggrs_provider, collections, collection_provider)
+    except ExecutorSaturatedError as e:
+        raise _saturated_exception(e)
     except ValueError as e:
         logger.error(f'{__name__} query zone info fail: {e}')
         raise HTTPException(status_code=400, detail=f'{__name__} query zone info fail: {e}')
@@ -551,7 +640,7 @@ async def collection_dggrs_zone_info(
         raise HTTPException(status_code=500, detail=f'{__name__} query zone info fail: {e}')
     if (info is None):
         return Response(status_code=204)
-    return info
+    return _set_validators(info, resp, validators)
 
 
 # Zone query conformance class
@@ -565,6 +654,7 @@ async def collection_dggrs_zone_info(
 )
 async def list_dggrs_zones(
     req: Request,
+    resp: Response,
     dggrs_req: Annotated[DggrsPathRequest, Depends()],  # noqa: OpenAPI parameters definition only
     zonesReq: Annotated[ZonesRequest, Query()],
     dggrs_description: DggrsDescription = Depends(_get_dggrs_description),
@@ -572,7 +662,7 @@ async def list_dggrs_zones(
     collection_provider=Depends(_get_collection_provider),
 ) -> Union[ZonesResponse, ZonesGeoJson, Response]:
     collections = _get_collection_info(None)
-    return await collection_list_dggrs_zones(req, dggrs_req, zonesReq, dggrs_description, dggrs_provider, collections, collection_provider)
+    return await collection_list_dggrs_zones(req, resp, dggrs_req, zonesReq, dggrs_description, dggrs_provider, collections, collection_provider)
 
 
 @router.get(
@@ -584,6 +674,7 @@ async def list_dggrs_zones(
 )
 async def collection_list_dggrs_zones(
     req: Request,
+    resp: Response,
     dggrs_req: Annotated[CollectionDggrsPathRequest, Depends()],  # noqa: OpenAPI parameters definition only
     zonesReq: Annotated[ZonesRequest, Query()],
     dggrs_description: Annotated[DggrsDescription, Depends(_get_dggrs_description)],
@@ -603,7 +694,8 @@ async def collection_list_dggrs_zones(
     filter = zonesReq.filter
     # Parameters checking
     if (parent_zone is not None):
-        parent_level = dggrs_provider.get_cells_zone_level([parent_zone])[0]
+        # off the event loop, the provider can wait on a lock (ex. DGGAL)
+        parent_level = int((await run_in_threadpool(dggrs_provider.get_cells_zone_level, [parent_zone]))[0])
         # If the zone-level is not specified, use the parent-zone refinement level + 1 as the zone level value.
         zone_level = zone_level if (zone_level is not None) else parent_level + 1
         if (parent_level >= zone_level):
@@ -641,12 +733,26 @@ async def collection_list_dggrs_zones(
         except Exception as e:
             logger.error(f'{__name__} query zones list, bbox conversion failed : {e}')
             raise HTTPException(status_code=400, detail=f"{__name__} query zones list, bbox conversion failed : {e}")
+    version = await run_in_threadpool(get_collections_version, filtered_collections, collection_provider)
+    validators = get_validators(version, 'zones', str(req.url.replace(query=None, fragment=None)),
+                                sorted(filtered_collections.keys()), dggrs_description.id, zone_level, bbox,
+                                parent_zone, compact_zone, limit, zonesReq.offset, zonesReq.cursor, returntype,
+                                returngeometry, filter, zonesReq.datetime)
+    response = not_modified(req, validators)
+    if (response is not None):
+        return response
     try:
-        result = query_zones_list(bbox, zone_level, limit, dggrs_description, dggrs_provider, filtered_collections, collection_provider,
-                                  compact_zone, zonesReq.parent_zone, returntype, returngeometry, filter, include_datetime)
+        result = await _run_blocking(dggrs_provider, query_zones_list, bbox, zone_level, limit, dggrs_description,
+                                     dggrs_provider, filtered_collections, collection_provider, compact_zone,
+                                     zonesReq.parent_zone, returntype, returngeometry, filter, include_datetime,
+                                     offset=(zonesReq.offset or 0), cursor=zonesReq.cursor, request=req)
         if (result is None):
             return Response(status_code=204)
-        return result
+        for link in (getattr(result, 'links', None) or []):
+            resp.headers.append("Link", link.header())
+        return _set_validators(result, resp, validators)
+    except ExecutorSaturatedError as e:
+        raise _saturated_exception(e)
     except ValueError as e:
         logger.error(f'{__name__} query zones list failed: {e}')
         raise HTTPException(status_code=400, detail=f'{__name__} query zones list failed: {e}')
@@ -666,13 +772,14 @@ async def collection_list_dggrs_zones(
 )
 async def dggrs_zones_data(
     req: Request,
+    resp: Response,
     zonedataReq: Annotated[ZoneInfoPathRequest, Depends()],
     zonedataQuery: Annotated[ZonesDataRequest, Query()],
     dggrs_description: DggrsDescription = Depends(_get_dggrs_description),
     dggrs_provider: AbstractDGGRSProvider = Depends(_get_dggrs_provider),
 ) -> ZonesDataDggsJsonResponse | FileResponse | Response:
     collections = _get_collection_info(None)
-    return await collection_dggrs_zones_data(req, zonedataReq, zonedataQuery, dggrs_description, dggrs_provider, collections)
+    return await collection_dggrs_zones_data(req, resp, zonedataReq, zonedataQuery, dggrs_description, dggrs_provider, collections)
 
 
 @router.get(
@@ -684,6 +791,7 @@ async def dggrs_zones_data(
 )
 async def collection_dggrs_zones_data(
     req: Request,
+    resp: Response,
     zonedataReq: Annotated[CollectionZoneInfoPathRequest, Depends()],
     zonedataQuery: Annotated[ZonesDataRequest, Query()],
     dggrs_description: DggrsDescription = Depends(_get_dggrs_description),
@@ -694,7 +802,11 @@ async def collection_dggrs_zones_data(
     zoneId = zonedataReq.zoneId
     depth = zonedataQuery.zone_depth if (zonedataQuery.zone_depth is not None) else [dggrs_description.defaultDepth]
     returngeometry = zonedataQuery.geometry if (zonedataQuery.geometry is not None) else 'zone-region'
-    returngeometry = None if (returntype != 'application/geo+json') else returngeometry
+    if (returntype in zone_data_columnar_returntype):
+        # the WKB geometry column of the columnar formats is only returned on request
+        returngeometry = zonedataQuery.geometry
+    elif (returntype != 'application/geo+json'):
+        returngeometry = None
     filter = zonedataQuery.filter
     include_datetime = True if (zonedataQuery.datetime is not None) else False
     include_properties = cast(Optional[list[str]], zonedataQuery.properties)
@@ -702,42 +814,111 @@ async def collection_dggrs_zones_data(
     # prepare zone levels from zoneId + depth
     # The first element of zone_level will be the zoneId's level, follow by the required relative depth (zoneId's level + d)
     try:
-        base_level = dggrs_provider.get_cells_zone_level([zoneId])[0]
+        base_level = int((await run_in_threadpool(dggrs_provider.get_cells_zone_level, [zoneId]))[0])
     except Exception as e:
         logger.error(f'{__name__} query zone data {zonedataReq.dggrsId}, zone id {zoneId} get zone level error: {e}')
         raise HTTPException(status_code=500, detail=f'{__name__} query zone data {zonedataReq.dggrsId}, zone id {zoneId} get zone level error: {e}')
     relative_levels = [base_level + d for d in depth]
-    skip_collection = []
-    for k, v in collections.items():
-        max_ = v.collection_provider.max_refinement_level
-        # if the dggrsId is not the native dggrs supported by the collection,
-        # check if the native dggrs supports conversion
-        if (zonedataReq.dggrsId != v.collection_provider.dggrsId
-                and v.collection_provider.dggrsId not in dggrs_provider.dggrs_conversion):
-            skip_collection.append(k)
-            continue
-        # if the dggrsId is not the primary dggrs supported by the collection.
-        if (zonedataReq.dggrsId != v.collection_provider.dggrsId
-                and v.collection_provider.dggrsId in dggrs_provider.dggrs_conversion):
-            max_ = v.collection_provider.max_refinement_level + dggrs_provider.dggrs_conversion[v.collection_provider.dggrsId].zonelevel_offset
-        for z in relative_levels:
-            if (z > max_):
-                skip_collection.append(k)
-                logger.warning(f'{__name__} query zone data {zonedataReq.dggrsId}, zone id {zoneId} with relative depth: {z} not supported')
-    if (len(collections) == len(skip_collection)):
-        raise HTTPException(status_code=400,
-                            detail=f"f'{__name__} zone id {zoneId} with relative depth: {depth} is over refinement for all collections")
-    filtered_collections = {k: v for k, v in collections.items() if (k not in skip_collection)}
+    filtered_collections = _get_zone_data_collections(collections, zonedataReq.dggrsId, dggrs_provider, zoneId, depth,
+                                                      relative_levels)
+    request_parts = ('zones-data', str(req.url.replace(query=None, fragment=None)), sorted(filtered_collections.keys()),
+                     zonedataReq.dggrsId, str(zoneId), relative_levels, returntype, returngeometry, filter,
+                     zonedataQuery.datetime, include_properties, sorted(exclude_properties or []))
+    version = await run_in_threadpool(get_collections_version, filtered_collections, collection_providers)
+    validators = get_validators(version, *request_parts)
+    response = not_modified(req, validators)
+    if (response is not None):
+        return response
+    response_cache, cache_key, cache_ttl = get_response_cache(), None, 0
+    if (response_cache is not None):
+        cache_ttl = _get_cache_ttl(filtered_collections)
+        # the datasource version invalidates the cached responses when the data changes
+        cache_key = response_cache_key(*request_parts, version.version if (version is not None) else None)
+        cached = (await run_in_threadpool(response_cache.get, cache_key)) if (cache_ttl > 0) else None
+        if (cached is not None):
+            return _set_validators(cached.to_response(), resp, validators)
     try:
-        result = query_zone_data(req, zoneId, base_level, relative_levels, dggrs_description,
-                                 dggrs_provider, filtered_collections, collection_providers, returntype,
-                                 returngeometry, filter, include_datetime, include_properties, exclude_properties)
+        result = await _run_blocking(dggrs_provider, query_zone_data, req, zoneId, base_level, relative_levels,
+                                     dggrs_description, dggrs_provider, filtered_collections, collection_providers,
+                                     returntype, returngeometry, filter, include_datetime, include_properties,
+                                     exclude_properties)
         if (result is None):
             return Response(status_code=204)
-        return result
+        if (response_cache is not None):
+            result = await cache_response(response_cache, cache_key, result, cache_ttl)
+        return _set_validators(result, resp, validators)
+    except ExecutorSaturatedError as e:
+        raise _saturated_exception(e)
     except ValueError as e:
         logger.error(f'{__name__} data_retrieval failed: {e}')
         raise HTTPException(status_code=400, detail=f'{__name__} data_retrieval failed: {e}')
     except Exception as e:
         logger.error(f'{__name__} data_retrieval failed: {e}')
         raise HTTPException(status_code=500, detail=f'{__name__} data_retrieval failed: {e}')
+
+
+@router.post(
+    "/dggs/{dggrsId}/zones/data",
+    response_model=None,
+    responses={200: {"content": zone_data_batch_support_responses}},
+    summary="DGGS Zones Data Retrieval for a batch of zones",
+    tags=['OGC DGGS API', 'Zone Data'],
+)
+async def dggrs_zones_data_batch(
+    req: Request,
+    dggrs_req: Annotated[DggrsPathRequest, Depends()],  # noqa: OpenAPI parameters definition only
+    zonesdataReq: ZonesDataBatchRequest,
+    dggrs_description: DggrsDescription = Depends(_get_dggrs_description),
+    dggrs_provider: AbstractDGGRSProvider = Depends(_get_dggrs_provider),
+) -> ZonesDataBatchGeoJson | Response:
+    collections = _get_collection_info(None)
+    return await collection_dggrs_zones_data_batch(req, dggrs_req, zonesdataReq, dggrs_description, dggrs_provider, collections)
+
+
+@router.post(
+    "/collections/{collectionId}/dggs/{dggrsId}/zones/data",
+    response_model=None,
+    responses={200: {"content": zone_data_batch_support_responses}},
+    summary="DGGS Zones Data Retrieval for a batch of zones of a specific Collection",
+    tags=['OGC DGGS API', 'Zone Data'],
+)
+async def collection_dggrs_zones_data_batch(
+    req: Request,
+    dggrs_req: Annotated[CollectionDggrsPathRequest, Depends()],  # noqa: OpenAPI parameters definition only
+    zonesdataReq: ZonesDataBatchRequest,
+    dggrs_description: DggrsDescription = Depends(_get_dggrs_description),
+    dggrs_provider: AbstractDGGRSProvider = Depends(_get_dggrs_provider),
+    collections: Dict[str, Collection] = Depends(_get_collection),
+) -> ZonesDataBatchGeoJson | Response:
+    returntype = _get_return_type(req, zone_data_batch_support_returntype, zone_data_support_formats, 'application/json')
+    zoneIds = list(dict.fromkeys(zonesdataReq.zoneIds))
+    max_zones = int(os.environ.get('ZONES_DATA_BATCH_MAX_ZONES', 1000))
+    if (len(zoneIds) > max_zones):
+        raise HTTPException(status_code=400, detail=f'{__name__} zones data batch is limited to {max_zones} zones')
+    depth = zonesdataReq.zone_depth if (zonesdataReq.zone_depth is not None) else [dggrs_description.defaultDepth]
+    returngeometry = zonesdataReq.geometry if (zonesdataReq.geometry is not None) else 'zone-region'
+    returngeometry = None if (returntype != 'application/geo+json') else returngeometry
+    include_datetime = True if (zonesdataReq.datetime is not None) else False
+    include_properties = cast(Optional[list[str]], zonesdataReq.properties)
+    exclude_properties = cast(Optional[list[str]], zonesdataReq.exclude_properties)
+
+    def level_collections(level: int, zoneId: str) -> Dict[str, Collection]:
+        # each refinement level has its own relative levels and collections
+        return _get_zone_data_collections(collections, dggrs_req.dggrsId, dggrs_provider, zoneId, depth,
+                                          [level + d for d in depth])
+
+    try:
+        # the zones are grouped by refinement level in the executor job, off the event loop
+        return await _run_blocking(dggrs_provider, query_zones_data_batch_levels, req, zoneIds, depth, dggrs_description,
+                                   dggrs_provider, level_collections, collection_providers, returntype, returngeometry,
+                                   zonesdataReq.filter, include_datetime, include_properties, exclude_properties)
+    except HTTPException:
+        raise
+    except ExecutorSaturatedError as e:
+        raise _saturated_exception(e)
+    except ValueError as e:
+        logger.error(f'{__name__} data_retrieval batch failed: {e}')
+        raise HTTPException(status_code=400, detail=f'{__name__} data_retrieval batch failed: {e}')
+    except Exception as e:
+        logger.error(f'{__name__} data_retrieval batch failed: {e}')
+        raise HTTPException(status_code=500, detail=f'{__name__} data_retrieval batch failed: {e}')
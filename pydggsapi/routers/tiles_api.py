@@ -3,21 +3,20 @@
 # I suggest to bundle these under /tiles/ or /tiles-api/ (doesn't need a version, because standard)
 from fastapi import APIRouter, Body, HTTPException, Depends, Response, Request
 from typing import Annotated
-
+from starlette.concurrency import run_in_threadpool
 
 from pydggsapi.schemas.tiles.tiles import TilesRequest, TilesJSON
 from pydggsapi.schemas.ogc_dggs.dggrs_zones import ZonesRequest, ZonesResponse
 from pydggsapi.schemas.ogc_dggs.dggrs_zones_data import ZonesDataRequest
 
 from pydggsapi.dependencies.api.mercator import Mercator
+from pydggsapi.dependencies.api.conditional_requests import get_collections_version, get_validators, not_modified
 from pydggsapi.routers.dggs_api import _get_collection, _get_dggrs_provider
 from pydggsapi.routers.dggs_api import _get_collection_provider
 from pydggsapi.routers.dggs_api import dggrs_providers as global_dggrs_providers
 
 import nest_asyncio
 import pyproj
-import json
-import shapely
 from shapely.geometry import box
 from shapely.ops import transform
 import numpy as np
@@ -57,6 +56,14 @@ async def query_mvt_tiles(
     collection = collection_info[tilesreq.collectionId]
     collection_provider = _get_collection_provider(collection.collection_provider.providerId)[collection.collection_provider.providerId]
     ds = collection_provider.datasources[collection.collection_provider.datasource_id]
+    version = await run_in_threadpool(get_collections_version, collection_info,
+                                      {collection.collection_provider.providerId: collection_provider})
+    validators = get_validators(version, 'tiles', tilesreq.collectionId, tilesreq.dggrsId, tilesreq.z, tilesreq.x,
+                                tilesreq.y, tilesreq.relative_depth)
+    response = not_modified(req, validators)
+    if (response is not None):
+        return response
+    headers = validators.headers if (validators is not None) else None
     id_col = getattr(ds, "id_col", "zone_id")
     if (id_col == ''):
         id_col = "zone_id"
@@ -74,20 +81,25 @@ async def query_mvt_tiles(
         content = mapbox_vector_tile.encode({"name": tilesreq.collectionId, "features": []},
                                             quantize_bounds=bbox,
                                             default_options={"transformer": transformer.transform})
-        return Response(bytes(content), media_type="application/x-protobuf")
+        return Response(bytes(content), media_type="application/x-protobuf", headers=headers)
     logger.debug(f'{__name__} zone level:{zone_level}, tile width:{tile_width_km}, bbox:{bbox}')
-    zoneslist = dggrs_provider.zoneslist(clip_bound, zone_level, parent_zone=None, returngeometry='zone-region', compact=False)
-    geometry = [shapely.from_geojson(json.dumps(g.__dict__)) for g in zoneslist.geometry]
+    # the geometry is only generated for the zones with data
+    zoneslist = dggrs_provider.zoneslist(clip_bound, zone_level, parent_zone=None, returngeometry='zone-region', compact=False,
+                                         geometry_mode='lazy')
+    zoneIds = zoneslist.zones
     if (collection.collection_provider.dggrs_zoneid_repr != "textual"):
-        zoneslist.zones = dggrs_provider.zone_id_from_textual(zoneslist.zones, collection.collection_provider.dggrs_zoneid_repr)
-    zoneslist = gpd.GeoDataFrame({'zone_id': zoneslist.zones}, geometry=geometry).set_index('zone_id')
-    zones_data = collection_provider.get_data(zoneslist.index.to_list(), zone_level,
+        zoneIds = dggrs_provider.zone_id_from_textual(zoneIds, collection.collection_provider.dggrs_zoneid_repr)
+    zones_data = collection_provider.get_data(zoneIds, zone_level,
                                               collection.collection_provider.datasource_id, input_zoneIds_padding=False)
     if (len(zones_data.zoneIds) == 0):
         content = mapbox_vector_tile.encode({"name": tilesreq.collectionId, "features": []},
                                             quantize_bounds=bbox,
                                             default_options={"transformer": transformer.transform})
-        return Response(bytes(content), media_type="application/x-protobuf")
+        return Response(bytes(content), media_type="application/x-protobuf", headers=headers)
+    zoneIds = pd.Index(zoneIds)
+    positions = np.flatnonzero(zoneIds.isin(zones_data.zoneIds))
+    geometry = zoneslist.get_geometry(positions.tolist()).to_shapely()
+    zoneslist = gpd.GeoDataFrame({'zone_id': zoneIds[positions]}, geometry=geometry).set_index('zone_id')
     indexes_cols = [id_col]
     indexes_values = [np.unique(zones_data.zoneIds)]
     pd_indexes = zones_data.zoneIds
@@ -109,7 +121,7 @@ async def query_mvt_tiles(
     content = mapbox_vector_tile.encode({"name": tilesreq.collectionId, "features": features},
                                         quantize_bounds=bbox,
                                         default_options={"transformer": transformer.transform})
-    return Response(bytes(content), media_type="application/x-protobuf")
+    return Response(bytes(content), media_type="application/x-protobuf", headers=headers)
 
 
 @router.get(
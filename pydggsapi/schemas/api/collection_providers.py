@@ -1,6 +1,7 @@
 from __future__ import annotations
 from pydantic import BaseModel
-from typing import List, Any, Dict
+from typing import List, Any, Dict, Optional
+from datetime import datetime
 from typing_extensions import Self
 
 from pydggsapi.schemas.ogc_dggs.dggrs_zones_data import Dimension
@@ -30,3 +31,9 @@ class CollectionProviderGetDataReturn(BaseModel):
 # the key represents the column name and the value represents the data type of the column
 class CollectionProviderGetDataDictReturn(BaseModel):
     data: Dict[str, str]
+
+
+# version token of a datasource, it must change whenever the data of the datasource changes
+class CollectionProviderGetVersionReturn(BaseModel):
+    version: str
+    last_modified: Optional[datetime] = None
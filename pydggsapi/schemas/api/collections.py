@@ -1,6 +1,14 @@
 from pydggsapi.schemas.ogc_collections.collections import CollectionDesc
 from pydggsapi.schemas.api.dggrs_providers import ZoneIdRepresentationType
 from pydantic import BaseModel
+from typing import Literal, Optional
+
+
+class ZarrCompressor(BaseModel):
+    # Blosc settings of the application/zarr+zip export
+    cname: Literal['zstd', 'lz4', 'lz4hc', 'zlib', 'blosclz'] = 'zstd'
+    clevel: int = 3
+    shuffle: Literal['noshuffle', 'shuffle', 'bitshuffle'] = 'bitshuffle'
 
 
 class Provider(BaseModel):
@@ -10,6 +18,11 @@ class Provider(BaseModel):
     max_refinement_level: int
     min_refinement_level: int
     datasource_id: str
+    # time to live (seconds) of the cached responses, None to use RESPONSE_CACHE_TTL, 0 to disable
+    cache_ttl: Optional[int] = None
+    zarr_compressor: ZarrCompressor = ZarrCompressor()
+    # zone presence index used by the zone queries without filter, see dependencies/api/presence_index.py
+    presence_index: Optional[Literal['prebuilt', 'lazy']] = None
 
 
 class Collection(CollectionDesc):
@@ -1,31 +1,121 @@
 from __future__ import annotations
-from pydantic import BaseModel, model_validator
-from typing import List, Any, Dict, Union, Literal
+from pydantic import BaseModel, GetCoreSchemaHandler, PrivateAttr, model_validator
+from pydantic_core import core_schema
+from typing import List, Any, Callable, Dict, Optional, Union, Literal
 from typing_extensions import Self
+import numpy as np
+import shapely
 
 from pydggsapi.schemas.common_geojson import GeoJSONPoint, GeoJSONPolygon
 
 ZoneIdRepresentationType = Literal['textual', 'int', 'hexstring']
+# geometry of the zones list:
+#   eager - generated for all the zones
+#   lazy  - generated on request for a subset of the zones (DGGRSProviderZonesListReturn.get_geometry)
+#   none  - not generated, zone IDs and areas only
+ZonesListGeometryMode = Literal['eager', 'lazy', 'none']
+
+
+class ZonesGeometry:
+    # geometry of a list of zones as a shapely 2 geometry array, filled by the providers and consumed as is,
+    # the GeoJSON models are only built at the API edge (to_geojson)
+
+    def __init__(self, geometry: Any):
+        self.geometry = np.asarray(geometry, dtype=object).reshape(-1)
+
+    @classmethod
+    def from_geojson(cls, geometry: List[GeoJSONPolygon | GeoJSONPoint | Dict | None]) -> ZonesGeometry:
+        return cls([shapely.geometry.shape(g if (isinstance(g, dict)) else g.model_dump()) if (g is not None) else None
+                    for g in geometry])
+
+    @classmethod
+    def _validate(cls, value: Any) -> ZonesGeometry:
+        # also accepts the GeoJSON models and the shapely geometry of the zones
+        if (isinstance(value, ZonesGeometry)):
+            return value
+        value = list(value)
+        if (any(isinstance(g, (BaseModel, dict)) for g in value)):
+            return cls.from_geojson(value)
+        return cls(value)
+
+    @classmethod
+    def __get_pydantic_core_schema__(cls, source: Any, handler: GetCoreSchemaHandler) -> core_schema.CoreSchema:
+        return core_schema.no_info_plain_validator_function(
+            cls._validate,
+            serialization=core_schema.plain_serializer_function_ser_schema(
+                lambda v: [g.model_dump() if (g is not None) else None for g in v.to_geojson()]))
+
+    def __len__(self) -> int:
+        return len(self.geometry)
+
+    def __iter__(self):
+        return iter(self.geometry)
+
+    def __getitem__(self, key):
+        # a shapely geometry for an integer, a ZonesGeometry for positions, masks and slices
+        if (isinstance(key, (int, np.integer))):
+            return self.geometry[key]
+        if (isinstance(key, list)):
+            key = np.asarray(key, dtype=np.int64)
+        return ZonesGeometry(self.geometry[key])
+
+    def __eq__(self, other) -> bool:
+        if (not isinstance(other, ZonesGeometry)):
+            return NotImplemented
+        return (len(self) == len(other)) and bool(np.all(shapely.equals(self.geometry, other.geometry)))
+
+    def to_shapely(self) -> np.ndarray:
+        return self.geometry
+
+    def to_geojson(self, positions: Optional[List[int]] = None) -> List[GeoJSONPolygon | GeoJSONPoint | None]:
+        geometry = self.geometry if (positions is None) else self.geometry[np.asarray(positions, dtype=np.int64)]
+        if (len(geometry) == 0):
+            return []
+        types = shapely.get_type_id(geometry)
+        if (np.all(types == shapely.GeometryType.POINT)):
+            return [GeoJSONPoint(type='Point', coordinates=c) for c in shapely.get_coordinates(geometry).tolist()]
+        if (np.all(types == shapely.GeometryType.POLYGON)):
+            # the rings are cut from the flat coordinates buffer
+            _, coords, (ring_offsets, offsets) = shapely.to_ragged_array(geometry, include_z=False)
+            coords = coords.tolist()
+            rings = [coords[start:end] for start, end in zip(ring_offsets[:-1], ring_offsets[1:])]
+            return [GeoJSONPolygon(type='Polygon', coordinates=rings[start:end]) for start, end in zip(offsets[:-1], offsets[1:])]
+        return [None if (g is None) else (GeoJSONPolygon if (g.geom_type == 'Polygon') else GeoJSONPoint)(**shapely.geometry.mapping(g))
+                for g in geometry]
 
 
 class DGGRSProviderZoneInfoReturn(BaseModel):
     zone_level: int
     shapeType: str
-    centroids: List[GeoJSONPoint] | None
-    geometry: List[GeoJSONPolygon] | None
+    centroids: ZonesGeometry | None
+    geometry: ZonesGeometry | None
     bbox: List[List[float]]
     areaMetersSquare: float
 
 
 class DGGRSProviderZonesListReturn(BaseModel):
-    geometry: List[GeoJSONPolygon] | List[GeoJSONPoint]
+    geometry: ZonesGeometry | None = None
     zones: List[str] | List[int]
     returnedAreaMetersSquare: List[float]
+    _geometry_loader: Optional[Callable[[List[Any]], ZonesGeometry]] = PrivateAttr(default=None)
+
+    def set_geometry_loader(self, loader: Callable[[List[Any]], ZonesGeometry]) -> Self:
+        # loader: zone IDs -> geometry of the zones, in the same order
+        self._geometry_loader = loader
+        return self
+
+    def get_geometry(self, positions: List[int]) -> ZonesGeometry:
+        # geometry of the zones at the positions of the zones list
+        if (self.geometry is not None):
+            return self.geometry[list(positions)]
+        if (self._geometry_loader is None):
+            raise ValueError('zones list is returned without geometry')
+        return ZonesGeometry._validate(self._geometry_loader([self.zones[i] for i in positions]))
 
 
 class DGGRSProviderZonesElement(BaseModel):
     zoneIds: List[Any]
-    geometry: List[GeoJSONPolygon] | List[GeoJSONPoint] | None
+    geometry: ZonesGeometry | None
 
     @model_validator(mode='after')
     def validator(self) -> Self:
@@ -1,5 +1,6 @@
 from __future__ import annotations
-from pydggsapi.schemas.ogc_dggs.common_ogc_dggs_api import CrsModel, Feature, ReturnGeometryTypes
+from pydggsapi.schemas.ogc_dggs.common_ogc_dggs_api import CrsModel, Feature, Link, ReturnGeometryTypes
+from pydggsapi.schemas.common_basemodel import CommonBaseModel, OmitIfNone
 
 from fastapi import Depends, Query
 from fastapi.openapi.constants import REF_TEMPLATE
@@ -93,7 +94,18 @@ class ZonesRequest(BaseModel):
             "Used together with `zone-level`, it allows to explore the response for a large zone query in a hierarchical manner."
         )
     )
-    limit: Optional[int] = Field(default=1000)
+    limit: Optional[conint(ge=1)] = Field(default=1000)
+    offset: Optional[conint(ge=0)] = Field(
+        default=0,
+        description="The number of matching zones to skip before the first returned zone (from the `cursor` position if set)."
+    )
+    cursor: Optional[str] = Field(
+        default=None,
+        description=(
+            "Opaque continuation token, returned in the `next` link of the previous page (also in the `Link` header). "
+            "It is only valid for the same query, `limit` and `f` can be changed between the pages."
+        )
+    )
     bbox_crs: Optional[str] = Field(default=None, alias="bbox-crs")
     bbox: Optional[str] = Field(default=None)
     geometry: Optional[ReturnGeometryTypes] = Field(default=None)
@@ -122,20 +134,22 @@ class ZonesRequest(BaseModel):
         return self
 
 
-class ZonesResponse(BaseModel):
+class ZonesResponse(CommonBaseModel):
     """
     DGGS zones list in JSON format, directly providing the zone IDs in textual representation.
     """
     zones: List[str]
     returnedAreaMetersSquare: Optional[float]
+    links: Annotated[Optional[List[Link]], OmitIfNone] = None
 
 
-class ZonesGeoJson(BaseModel):
+class ZonesGeoJson(CommonBaseModel):
     """
     DGGS zones list in GeoJSON format, with each zone represented as a GeoJSON feature.
     """
     type: str
     features: List[Feature]
+    links: Annotated[Optional[List[Link]], OmitIfNone] = None
 
 
 zone_query_support_formats = {
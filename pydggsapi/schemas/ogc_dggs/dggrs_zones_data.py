@@ -10,6 +10,7 @@ from fastapi.openapi.constants import REF_TEMPLATE
 from fastapi.exceptions import HTTPException
 from fastapi import Query
 from pydantic import AnyUrl, Field, ConfigDict, model_validator
+from pydantic.json_schema import SkipJsonSchema
 
 
 ZoneDataFormatTypes = Literal[
@@ -21,6 +22,9 @@ ZoneDataFormatTypes = Literal[
     'zarr',
     'geojson',
     'geo+json',
+    'arrow',
+    'parquet',
+    'geoparquet',
 ]
 
 
@@ -97,6 +101,19 @@ class ZonesDataRequest(CommonBaseModel):
         return self
 
 
+class ZonesDataBatchRequest(ZonesDataRequest):
+    """
+    DGGS Zones Data Batch Request Body Model, the zone depth, filter and properties options apply to all the zones.
+    """
+    zoneIds: List[str] = Field(
+        ...,
+        min_length=1,
+        description="Identifiers of the zones to request within the DGGRS, they can be of different refinement levels, the zones are grouped by level.",
+    )
+    # the format is negotiated with the 'Accept' header or the 'f' query parameter
+    f: SkipJsonSchema[str] = Field(default=None, exclude=True)
+
+
 class Shape(CommonBaseModel):
     count: int
     subZones: Annotated[Optional[int], OmitIfNone] = None
@@ -159,6 +176,20 @@ class ZonesDataGeoJson(CommonBaseModel):
     features: List[Feature]
 
 
+class ZonesDataBatchDggsJsonResponse(CommonBaseModel):
+    """
+    DGGS Zones Data of several zones in DGGS-JSON format, keyed by zone ID (null for the zones without data).
+    """
+    zones: Dict[str, Optional[ZonesDataDggsJsonResponse]]
+
+
+class ZonesDataBatchGeoJson(CommonBaseModel):
+    """
+    DGGS Zones Data of several zones in GeoJSON format, keyed by zone ID (null for the zones without data).
+    """
+    zones: Dict[str, Optional[ZonesDataGeoJson]]
+
+
 zone_data_support_formats = {
     'json': 'application/json',
     'dggs-json': 'application/json',
@@ -168,7 +199,13 @@ zone_data_support_formats = {
     'zarr': 'application/zarr+zip',
     'geojson': 'application/geo+json',
     'geo+json': 'application/geo+json',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+    'geoparquet': 'application/vnd.apache.parquet',
 }
+zone_data_arrow_returntype = 'application/vnd.apache.arrow.stream'
+zone_data_parquet_returntype = 'application/vnd.apache.parquet'
+zone_data_columnar_returntype = [zone_data_arrow_returntype, zone_data_parquet_returntype]
 zone_data_support_responses = {
     'application/json': {
         "schema": ZonesDataDggsJsonResponse.model_json_schema(ref_template=REF_TEMPLATE),
@@ -182,6 +219,24 @@ zone_data_support_responses = {
     'application/geo+json': {
         "schema": ZonesDataGeoJson.model_json_schema(ref_template=REF_TEMPLATE),
     },
+    zone_data_arrow_returntype: {
+        "schema": {"description": ("DGGS Zones Data as Apache Arrow IPC stream, with the columns zoneId, depth, "
+                                   "datetime (temporal collections), the properties and geometry (WKB, if requested).")},
+    },
+    zone_data_parquet_returntype: {
+        "schema": {"description": ("DGGS Zones Data as (Geo)Parquet, with the columns zoneId, depth, "
+                                   "datetime (temporal collections), the properties and geometry (WKB, if requested).")},
+    },
 }
 zone_data_support_returntype = list(zone_data_support_responses)
 zone_data_support_formats.update({typ: typ for typ in zone_data_support_returntype})
+
+zone_data_batch_support_responses = {
+    'application/json': {
+        "schema": ZonesDataBatchDggsJsonResponse.model_json_schema(ref_template=REF_TEMPLATE),
+    },
+    'application/geo+json': {
+        "schema": ZonesDataBatchGeoJson.model_json_schema(ref_template=REF_TEMPLATE),
+    },
+}
+zone_data_batch_support_returntype = list(zone_data_batch_support_responses)
@@ -0,0 +1,98 @@
+from datetime import datetime, timezone
+
+from fastapi import Request, Response
+
+from pydggsapi.dependencies.api.conditional_requests import (
+    get_collections_version,
+    get_validators,
+    not_modified,
+    set_validators,
+)
+from pydggsapi.dependencies.collections_providers.abstract_collection_provider import AbstractCollectionProvider
+from pydggsapi.schemas.api.collection_providers import (
+    CollectionProviderGetDataDictReturn,
+    CollectionProviderGetDataReturn,
+    CollectionProviderGetVersionReturn,
+)
+from pydggsapi.schemas.api.collections import Collection
+
+
+class VersionedCollectionProvider(AbstractCollectionProvider):
+
+    def __init__(self, versions):
+        self.datasources = {}
+        self.versions = versions
+
+    def get_data(self, zoneIds, res, datasource_id, cql_filter=None, include_datetime=False,
+                 include_properties=None, exclude_properties=None, input_zoneIds_padding=True):
+        return CollectionProviderGetDataReturn(zoneIds=[], cols_meta={}, data=[])
+
+    def get_datadictionary(self, datasource_id, include_zone_id=True):
+        return CollectionProviderGetDataDictReturn(data={})
+
+    def get_version(self, datasource_id):
+        return self.versions.get(datasource_id)
+
+
+def _collection(datasource_id):
+    return Collection(id=datasource_id, title=datasource_id, collection_provider={
+        'providerId': 'test', 'dggrsId': 'igeo7', 'max_refinement_level': 9, 'min_refinement_level': 0,
+        'datasource_id': datasource_id,
+    })
+
+
+def _request(headers):
+    return Request({'type': 'http', 'method': 'GET', 'path': '/', 'query_string': b'',
+                    'headers': [(k.lower().encode(), v.encode()) for k, v in headers.items()]})
+
+
+modified = datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+
+
+def test_collections_version():
+    provider = VersionedCollectionProvider({
+        'a': CollectionProviderGetVersionReturn(version='1', last_modified=modified),
+        'b': CollectionProviderGetVersionReturn(version='2'),
+    })
+    version = get_collections_version({'a': _collection('a'), 'b': _collection('b')}, {'test': provider})
+    assert version.last_modified == modified
+    # a datasource without version disables the validators
+    assert get_collections_version({'a': _collection('a'), 'c': _collection('c')}, {'test': provider}) is None
+    assert get_validators(None, 'zones-data') is None
+
+
+def test_validators():
+    version = CollectionProviderGetVersionReturn(version='1', last_modified=modified)
+    validators = get_validators(version, 'zones-data', '0001', [0, 1])
+    assert validators.etag == get_validators(version, 'zones-data', '0001', [0, 1]).etag
+    assert validators.etag != get_validators(version, 'zones-data', '0001', [0, 2]).etag
+    changed = CollectionProviderGetVersionReturn(version='2', last_modified=modified)
+    assert validators.etag != get_validators(changed, 'zones-data', '0001', [0, 1]).etag
+    assert validators.headers['Last-Modified'] == 'Thu, 02 Jan 2025 03:04:05 GMT'
+
+
+def test_not_modified():
+    version = CollectionProviderGetVersionReturn(version='1', last_modified=modified)
+    validators = get_validators(version, 'zones-data')
+    assert not_modified(_request({}), validators) is None
+    response = not_modified(_request({'If-None-Match': f'"other", W/{validators.etag}'}), validators)
+    assert response.status_code == 304
+    assert response.headers['ETag'] == validators.etag and response.headers['Vary'] == 'Accept'
+    assert not_modified(_request({'If-None-Match': '"other"'}), validators) is None
+    assert not_modified(_request({'If-Modified-Since': 'Thu, 02 Jan 2025 03:04:05 GMT'}), validators).status_code == 304
+    assert not_modified(_request({'If-Modified-Since': 'Thu, 02 Jan 2025 03:04:04 GMT'}), validators) is None
+    # If-None-Match takes precedence
+    assert not_modified(_request({'If-None-Match': '"other"', 'If-Modified-Since': 'Thu, 02 Jan 2025 03:04:05 GMT'}),
+                        validators) is None
+
+
+def test_set_validators_vary():
+    validators = get_validators(CollectionProviderGetVersionReturn(version='1', last_modified=modified), 'zones-data')
+    response = Response()
+    set_validators(response, validators)
+    assert response.headers['Vary'] == 'Accept' and response.headers['ETag'] == validators.etag
+    response = Response(headers={'Vary': 'Accept-Encoding'})
+    set_validators(response, validators)
+    assert response.headers['Vary'] == 'Accept-Encoding, Accept'
+    set_validators(response, validators)
+    assert response.headers['Vary'] == 'Accept-Encoding, Accept'
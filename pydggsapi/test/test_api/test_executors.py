@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from pydggsapi.dependencies.api import executors
+from pydggsapi.dependencies.api.executors import ExecutorSaturatedError, fan_out, get_executor_pool, run_in_executor
+
+
+@pytest.fixture(autouse=True)
+def reset_pools(monkeypatch):
+    monkeypatch.setenv('EXECUTOR_POOLS', '{"test": {"workers": 1, "max_queue": 1, "retry_after": 5}}')
+    executors.shutdown_executors()
+    yield
+    executors.shutdown_executors()
+
+
+def test_pool_config():
+    pool = get_executor_pool('test')
+    assert pool.config.workers == 1
+    assert pool.config.max_queue == 1
+    assert pool.config.retry_after == 5
+    assert get_executor_pool('IGEO7Provider').config.workers == 4
+    assert get_executor_pool('other').config.max_queue == executors.default_pool_config['default']['max_queue']
+
+
+def test_run_in_executor():
+    def job(a, b=0):
+        return threading.current_thread().name, a + b
+
+    name, value = asyncio.run(run_in_executor('test', job, 1, b=2))
+    assert name.startswith('pydggsapi-test')
+    assert value == 3
+    assert get_executor_pool('test').inflight == 0
+
+
+def test_run_in_executor_saturated():
+    release = threading.Event()
+
+    async def run():
+        jobs = [asyncio.ensure_future(run_in_executor('test', release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(ExecutorSaturatedError) as e:
+            await run_in_executor('test', release.wait)
+        assert e.value.retry_after == 5
+        release.set()
+        return await asyncio.gather(*jobs)
+
+    assert asyncio.run(run()) == [True, True]
+    assert get_executor_pool('test').inflight == 0
+
+
+def test_fan_out_order():
+    def job(i, delay):
+        time.sleep(delay)
+        return i, threading.current_thread().name
+
+    results = fan_out(job, [(i, 0.05 * (3 - i)) for i in range(4)])
+    assert [r[0] for r in results] == [0, 1, 2, 3]
+    assert all(r[1].startswith('pydggsapi-fanout') for r in results)
+
+
+def test_fan_out_nested():
+    def job(i):
+        return fan_out(lambda a, b: a + b, [(i, 1), (i, 2)])
+
+    assert fan_out(job, [(0,), (10,)]) == [[1, 2], [11, 12]]
+
+
+def test_process_executor_not_forked(monkeypatch):
+    monkeypatch.setenv('EXECUTOR_POOLS', '{"test": {"process_workers": 1}}')
+    executor = get_executor_pool('test').get_process_executor()
+    assert executor._mp_context.get_start_method() in ('forkserver', 'spawn')
+    assert executor.submit(pow, 2, 3).result() == 8
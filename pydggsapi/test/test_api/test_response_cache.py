@@ -0,0 +1,114 @@
+import asyncio
+import json
+import time
+
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from pydggsapi.dependencies.api.response_cache import (
+    CachedResponse,
+    DiskResponseCache,
+    MemoryResponseCache,
+    TieredResponseCache,
+    cache_response,
+    response_cache_key,
+)
+from pydggsapi.schemas.ogc_dggs.dggrs_zones_data import Shape
+
+
+def test_memory_cache_lru_bytes():
+    cache = MemoryResponseCache(max_bytes=10)
+    cache.set('a', CachedResponse(b'1234'))
+    cache.set('b', CachedResponse(b'1234'))
+    assert cache.get('a') is not None  # 'b' becomes the least recently used
+    cache.set('c', CachedResponse(b'1234'))
+    assert cache.get('b') is None
+    assert cache.get('a').body == b'1234'
+    assert cache.get('c').body == b'1234'
+    assert cache.current_bytes == 8
+    cache.set('d', CachedResponse(b'x' * 11))  # larger than the budget, ignored
+    assert cache.get('d') is None
+
+
+def test_memory_cache_ttl():
+    cache = MemoryResponseCache(max_bytes=10)
+    cache.set('a', CachedResponse(b'1234', expires=time.time() - 1))
+    assert cache.get('a') is None
+    assert cache.current_bytes == 0
+
+
+def test_disk_cache(tmp_path):
+    cache = DiskResponseCache(str(tmp_path), prune_interval=1)
+    cache.set('aa01', CachedResponse(b'123456', headers={'content-type': 'application/json'}))
+    shared = DiskResponseCache(str(tmp_path))
+    assert shared.get('aa01').headers == {'content-type': 'application/json'}
+    # raw body and JSON header, nothing pickled
+    assert (tmp_path / 'aa' / 'aa01.body').read_bytes() == b'123456'
+    assert json.loads((tmp_path / 'aa' / 'aa01.json').read_text())['size'] == 6
+    # room for a single response
+    cache.max_bytes = sum(p.stat().st_size for p in tmp_path.glob('*/aa01.*')) + 1
+    time.sleep(0.01)
+    cache.set('bb01', CachedResponse(b'123456', headers={'content-type': 'application/json'}))
+    assert cache.get('bb01') is not None
+    assert sorted(p.name for p in tmp_path.glob('*/*')) == ['bb01.body', 'bb01.json']
+    # a body not matching its header is not returned
+    (tmp_path / 'bb' / 'bb01.body').write_bytes(b'1234')
+    assert cache.get('bb01') is None
+
+
+def test_tiered_cache_promote(tmp_path):
+    memory = MemoryResponseCache(max_bytes=100)
+    disk = DiskResponseCache(str(tmp_path))
+    disk.set('cc01', CachedResponse(b'123'))
+    cache = TieredResponseCache([memory, disk])
+    assert cache.get('cc01').body == b'123'
+    assert memory.get('cc01').body == b'123'
+
+
+def test_response_cache_key():
+    key = response_cache_key('zones-data', 'igeo7', [1, 2], None)
+    assert key == response_cache_key('zones-data', 'igeo7', [1, 2], None)
+    assert key != response_cache_key('zones-data', 'igeo7', [1, 3], None)
+
+
+def test_cache_response_model():
+    cache = MemoryResponseCache(max_bytes=1000)
+    response = asyncio.run(cache_response(cache, 'k', Shape(count=2), ttl=10))
+    assert isinstance(response, JSONResponse)
+    assert response.body == b'{"count":2}'
+    assert response.headers['X-Cache'] == 'MISS'
+    hit = cache.get('k').to_response()
+    assert hit.body == response.body
+    assert hit.headers['content-type'] == 'application/json'
+    assert hit.headers['X-Cache'] == 'HIT'
+
+
+def test_cache_response_streaming():
+    cache = MemoryResponseCache(max_bytes=1000)
+
+    async def body():
+        yield b'{"a":'
+        yield b'1}'
+
+    async def consume(response):
+        return b''.join([chunk async for chunk in response.body_iterator])
+
+    response = asyncio.run(cache_response(cache, 'k', StreamingResponse(body(), media_type='application/json'), ttl=10))
+    assert cache.get('k') is None
+    assert asyncio.run(consume(response)) == b'{"a":1}'
+    assert cache.get('k').body == b'{"a":1}'
+
+
+def test_cache_response_streaming_too_large(monkeypatch):
+    monkeypatch.setenv('RESPONSE_CACHE_STREAM_MAX_BYTES', '4')
+    cache = MemoryResponseCache(max_bytes=1000)
+
+    async def body():
+        yield b'{"a":'
+        yield b'1}'
+
+    async def consume(response):
+        return b''.join([chunk async for chunk in response.body_iterator])
+
+    response = asyncio.run(cache_response(cache, 'k', StreamingResponse(body(), media_type='application/json'), ttl=10))
+    assert asyncio.run(consume(response)) == b'{"a":1}'
+    assert cache.get('k') is None
@@ -0,0 +1,28 @@
+import numpy as np
+import shapely
+from dggrid4py.auxlat import authalic_to_geodetic, geodetic_to_authalic
+
+from pydggsapi.dependencies.dggrs_providers.auxiliary_latitude import get_latitude_converter
+
+
+def test_latitude_conversion():
+    converter = get_latitude_converter()
+    assert get_latitude_converter() is converter
+    lat = np.linspace(-90, 90, 721)
+    assert np.abs(converter.to_authalic(lat) - [float(geodetic_to_authalic(v)) for v in lat]).max() < 1e-11
+    assert np.abs(converter.to_geodetic(lat) - [float(authalic_to_geodetic(v)) for v in lat]).max() < 1e-11
+    assert np.abs(converter.to_geodetic(converter.to_authalic(lat)) - lat).max() < 1e-12
+
+
+def test_geometry_conversion():
+    converter = get_latitude_converter()
+    polygon = shapely.Polygon(shapely.box(0, 10, 20, 40).exterior.coords, [shapely.box(5, 15, 10, 20).exterior.coords])
+    geometry = np.array([shapely.Point(10, 45), None, polygon, shapely.MultiPoint([(1, -30), (2, 60)])], dtype=object)
+    result = converter.geometry_to_geodetic(geometry)
+    assert result[1] is None and shapely.get_num_interior_rings(result[2]) == 1
+    coords, expected = shapely.get_coordinates(result), shapely.get_coordinates(geometry)
+    assert (coords[:, 0] == expected[:, 0]).all()
+    assert np.abs(coords[:, 1] - [float(authalic_to_geodetic(v)) for v in expected[:, 1]]).max() < 1e-11
+    # the input geometry is not modified
+    assert shapely.get_coordinates(geometry[0]).tolist() == [[10, 45]]
+    assert shapely.equals_exact(converter.geometry_to_authalic(result), geometry, tolerance=1e-12)[[0, 2, 3]].all()
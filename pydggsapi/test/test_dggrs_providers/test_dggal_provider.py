@@ -0,0 +1,65 @@
+from concurrent.futures import ThreadPoolExecutor
+from dggal import wholeWorld
+import pytest
+import shapely
+
+from pydggsapi.dependencies.api.executors import ExecutorPool, ExecutorPoolConfig
+from pydggsapi.dependencies.dggrs_providers import dggal_dggrs_provider
+from pydggsapi.dependencies.dggrs_providers.dggal_dggrs_provider import DGGALProvider, _zones_array, generateZoneGeometry
+from pydggsapi.dependencies.dggrs_providers.geometry_cache import ZoneGeometryCache
+
+
+@pytest.fixture
+def provider():
+    provider = DGGALProvider(grid='IVEA7H')
+    # no geometry cache
+    provider.geometry_cache = ZoneGeometryCache(0)
+    return provider
+
+
+def _zone_geometry(provider, zone, returngeometry):
+    geometry = generateZoneGeometry(provider.mygrid, zone, None, (returngeometry == 'zone-centroid'))
+    return shapely.geometry.shape(geometry.model_dump())
+
+
+@pytest.mark.parametrize('returngeometry', ['zone-region', 'zone-centroid'])
+def test_zones_geometry(provider, returngeometry):
+    zones = _zones_array(provider.mygrid.listZones(1, wholeWorld)).tolist()
+    geometry = provider._zones_geometry(zones, returngeometry).to_shapely()
+    assert len(geometry) == len(zones)
+    for zone, zone_geometry in zip(zones, geometry):
+        assert shapely.equals_exact(zone_geometry, _zone_geometry(provider, zone, returngeometry), 1e-9)
+
+
+def test_zones_geometry_lock_chunks(provider, monkeypatch):
+    zoneIds = provider.level_zone_ids(1)
+    expected = provider.generate_zones_geometry(zoneIds, 'zone-region')
+    monkeypatch.setattr(dggal_dggrs_provider, '_lock_chunk_zones', 5)
+    assert provider.generate_zones_geometry(zoneIds, 'zone-region') == expected
+
+
+def test_zone_text_ids():
+    provider = DGGALProvider(grid='ISEA7H_Z7')
+    zones = _zones_array(provider.mygrid.listZones(2, wholeWorld))
+    assert provider.level_zone_ids(2) == [provider.mygrid.getZoneTextID(z) for z in zones.tolist()]
+
+
+def test_zones_geometry_processes(provider, monkeypatch):
+    pool = ExecutorPool('DGGALProvider', ExecutorPoolConfig(workers=1, process_workers=2))
+    monkeypatch.setattr(dggal_dggrs_provider, 'dggal_process_min_zones', 10)
+    monkeypatch.setattr(dggal_dggrs_provider, 'get_executor_pool', lambda name: pool)
+    zones = _zones_array(provider.mygrid.listZones(2, wholeWorld)).tolist()
+    try:
+        geometry = provider._zones_geometry(zones, 'zone-region')
+    finally:
+        pool.shutdown()
+    monkeypatch.setattr(dggal_dggrs_provider, 'dggal_process_min_zones', len(zones) + 1)
+    assert geometry == provider._zones_geometry(zones, 'zone-region')
+
+
+def test_zones_geometry_threads(provider):
+    zoneIds = provider.level_zone_ids(2)
+    expected = provider.generate_zones_geometry(zoneIds, 'zone-region')
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda i: provider.generate_zones_geometry(zoneIds, 'zone-region'), range(8)))
+    assert all(r == expected for r in results)
@@ -0,0 +1,68 @@
+import os
+import stat
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from pydggsapi.dependencies.dggrs_providers.dggrid_pool import DGGRIDWorkerPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = DGGRIDWorkerPool('dggrid', 1, str(tmp_path / 'pool'))
+    yield pool
+    pool.close()
+
+
+def test_worker_run(tmp_path):
+    # a fake DGGRID writing its working directory and its metafile into the output file
+    executable = tmp_path / 'dggrid'
+    executable.write_text('#!/bin/sh\npwd > out.txt\ncat "$1" >> out.txt\necho done\n')
+    executable.chmod(executable.stat().st_mode | stat.S_IEXEC)
+    pool = DGGRIDWorkerPool(str(executable), 2, str(tmp_path / 'pool'))
+    cwd = os.getcwd()
+    with pool.worker() as worker:
+        assert worker.run(['dggrid_operation GENERATE_GRID']) == 0
+    assert os.getcwd() == cwd
+    out = (tmp_path / 'pool' / 'worker_1' / 'out.txt').read_text().splitlines()
+    assert out == [str(tmp_path / 'pool' / 'worker_1'), 'dggrid_operation GENERATE_GRID']
+    assert worker.last_run_successful and worker.last_run_logs == 'done'
+    assert os.listdir(worker.working_dir) == ['out.txt']
+    assert pool.metrics()['runs'] == 1 and pool.metrics()['busy'] == 0
+
+
+def test_run_batched(pool):
+    calls = []
+
+    def lookup(worker, cellIds):
+        calls.append(cellIds)
+        return pd.DataFrame({'name': cellIds, 'value': [len(c) for c in cellIds]})
+
+    requests = [['0800', '0801'], ['0801', '08012'], ['0802']]
+    results = [None] * len(requests)
+
+    def request(i):
+        results[i] = pool.run_batched('key', requests[i], lookup)
+
+    # the calls arriving while the only worker is busy are merged
+    with pool.worker():
+        threads = [threading.Thread(target=request, args=(i,)) for i in range(len(requests))]
+        [t.start() for t in threads]
+        while (pool.metrics()['merged_calls'] < 2):
+            time.sleep(0.01)
+    [t.join() for t in threads]
+    assert len(calls) == 1 and sorted(calls[0]) == sorted(set(sum(requests, [])))
+    assert [sorted(r['name'].tolist()) for r in results] == requests
+    assert pool.run_batched('key', ['09'], lookup)['name'].tolist() == ['09']
+    assert pool.metrics()['runs'] == 3
+
+
+def test_run_batched_error(pool):
+    def lookup(worker, cellIds):
+        raise ValueError('DGGRID failed')
+
+    with pytest.raises(ValueError):
+        pool.run_batched('key', ['0800'], lookup)
+    assert pool.metrics()['busy'] == 0
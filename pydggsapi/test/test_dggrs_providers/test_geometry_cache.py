@@ -0,0 +1,101 @@
+import numpy as np
+import shapely
+
+from pydggsapi.dependencies.dggrs_providers.geometry_cache import GeometrySegment, ZoneGeometryCache
+from pydggsapi.schemas.api.dggrs_providers import ZonesGeometry
+
+
+def _hexagon(i):
+    return shapely.Point(i, 0).buffer(0.4, quad_segs=2)
+
+
+class Compute:
+
+    def __init__(self, zoneIds, geometry_type='zone-region'):
+        self.zoneIds, self.geometry_type, self.calls = zoneIds, geometry_type, []
+
+    def __call__(self, positions):
+        self.calls.append([self.zoneIds[i] for i in positions])
+        if (self.geometry_type == 'zone-region'):
+            return ZonesGeometry([_hexagon(self.zoneIds[i]) for i in positions])
+        return ZonesGeometry([shapely.Point(self.zoneIds[i], 1) for i in positions])
+
+
+def test_memory_cache():
+    cache = ZoneGeometryCache(10 ** 6)
+    zoneIds = [3, 1, 2]
+    compute = Compute(zoneIds)
+    first = cache.zones_geometry('test', 'zone-region', zoneIds, None, compute)
+    assert first == ZonesGeometry([_hexagon(z) for z in zoneIds])
+    zoneIds = [2, 4, 3]
+    compute = Compute(zoneIds)
+    assert cache.zones_geometry('test', 'zone-region', zoneIds, None, compute) == ZonesGeometry([_hexagon(z) for z in zoneIds])
+    assert compute.calls == [[4]]
+    # the geometry types and the cache ids are cached separately
+    compute = Compute(zoneIds, 'zone-centroid')
+    assert cache.zones_geometry('test', 'zone-centroid', zoneIds, None, compute)[0] == shapely.Point(2, 1)
+    assert compute.calls == [zoneIds]
+    compute = Compute(zoneIds)
+    cache.zones_geometry('other', 'zone-region', zoneIds, None, compute)
+    assert compute.calls == [zoneIds]
+    assert cache.metrics()['hits'] == 2 and cache.metrics()['entries'] == 10
+
+
+def test_memory_cache_bytes():
+    # room for 2 hexagons (9 coordinates of 16 bytes and the entry overhead)
+    cache = ZoneGeometryCache(2 * (9 * 16 + 96))
+    cache.zones_geometry('test', 'zone-region', [1, 2, 3], None, Compute([1, 2, 3]))
+    assert cache.metrics()['entries'] == 2 and cache.metrics()['bytes'] <= cache.max_bytes
+    compute = Compute([1, 3])
+    cache.zones_geometry('test', 'zone-region', [1, 3], None, compute)
+    assert compute.calls == [[1]]
+    # not cached
+    compute = Compute([5])
+    cache.zones_geometry('test', 'zone-region', [5], None, lambda positions: ZonesGeometry([None]))
+    cache.zones_geometry('test', 'zone-region', [5], None, compute)
+    assert compute.calls == [[5]]
+
+
+def test_disk_cache(tmp_path):
+    zoneIds = [30, 10, 20]
+    keys = np.array(zoneIds, dtype=np.uint64)
+    writer = ZoneGeometryCache(0, str(tmp_path), segment_zones=2)
+    writer.zones_geometry('test', 'zone-region', zoneIds, keys, Compute(zoneIds))
+    writer.zones_geometry('test', 'zone-centroid', zoneIds[:1], keys[:1], Compute(zoneIds[:1], 'zone-centroid'))
+    writer.flush()
+    # one segment per geometry type
+    segments = {len(s): s for s in [GeometrySegment(str(path)) for path in tmp_path.glob('*/*.seg')]}
+    assert sorted(segments.keys()) == [1, 3]
+    segment = segments[3]
+    assert segment.keys.tolist() == [10, 20, 30] and segment.offsets.tolist() == [0, 9, 18, 27]
+    # another worker sharing the directory
+    reader = ZoneGeometryCache(10 ** 6, str(tmp_path))
+    zoneIds = [20, 40, 30]
+    compute = Compute(zoneIds)
+    result = reader.zones_geometry('test', 'zone-region', zoneIds, np.array(zoneIds, dtype=np.uint64), compute)
+    assert result == ZonesGeometry([_hexagon(z) for z in zoneIds]) and compute.calls == [[40]]
+    assert reader.metrics()['disk_hits'] == 2
+    compute = Compute(zoneIds, 'zone-centroid')
+    result = reader.zones_geometry('test', 'zone-centroid', zoneIds, np.array(zoneIds, dtype=np.uint64), compute)
+    assert result[2] == shapely.Point(30, 1) and compute.calls == [[20, 40]]
+
+
+def test_disk_cache_merge_and_prune(tmp_path):
+    cache = ZoneGeometryCache(0, str(tmp_path), segment_zones=1, directory_max_segments=2)
+    for zoneIds in ([1], [2], [2, 3]):
+        keys = np.array(zoneIds, dtype=np.uint64)
+        cache.put('test', 'zone-region', zoneIds, keys, [_hexagon(z) for z in zoneIds])
+    # the third segment is merged with the first two, the zone 2 is kept once
+    segments = [GeometrySegment(str(path)) for path in tmp_path.glob('*/*.seg')]
+    assert [s.keys.tolist() for s in segments] == [[1, 2, 3]]
+    compute = Compute([3, 1])
+    assert cache.zones_geometry('test', 'zone-region', [3, 1], np.array([3, 1], dtype=np.uint64), compute) == \
+        ZonesGeometry([_hexagon(3), _hexagon(1)])
+    assert compute.calls == []
+    # the oldest segments are removed beyond the size limit
+    cache.disk.max_bytes = 1
+    cache.put('test', 'zone-region', [4], np.array([4], dtype=np.uint64), [_hexagon(4)])
+    assert list(tmp_path.glob('*/*.seg')) == []
+    compute = Compute([3])
+    cache.zones_geometry('test', 'zone-region', [3], np.array([3], dtype=np.uint64), compute)
+    assert compute.calls == [[3]]
@@ -0,0 +1,23 @@
+from pydggsapi.dependencies.dggrs_providers.geometry_cache import GeometrySegment, ZoneGeometryCache
+from pydggsapi.dependencies.dggrs_providers.geometry_store import build_geometry_store
+from pydggsapi.dependencies.dggrs_providers.h3_dggrs_provider import H3Provider, h3textual_to_h3int
+
+
+def test_geometry_store(tmp_path):
+    provider = H3Provider()
+    paths = build_geometry_store(provider, str(tmp_path), 1, chunk_zones=100)
+    assert sorted(p.split('/')[-1] for p in paths) == ['h3-zone-centroid.seg', 'h3-zone-region.seg']
+    segment = GeometrySegment(str(tmp_path / 'h3-zone-region.seg'))
+    cells = h3textual_to_h3int(provider.level_zone_ids(0) + provider.level_zone_ids(1))
+    assert len(segment) == 122 + 842 and segment.keys.tolist() == sorted(cells.tolist())
+    # served from the store, without generating the geometry
+    cache = ZoneGeometryCache(0, store_directory=str(tmp_path))
+    provider.geometry_cache = cache
+    zones = cells[[900, 3, 500]]
+    for geometry_type in ['zone-region', 'zone-centroid']:
+        expected = provider._generate_cells_geometry(zones, geometry_type)
+        assert provider._cells_geometry(zones, geometry_type) == expected
+    assert cache.metrics()['store_hits'] == 6 and cache.metrics()['misses'] == 0
+    # the zones beyond the store levels are generated
+    provider._cells_geometry(h3textual_to_h3int(provider.level_zone_ids(2)[:2]), 'zone-region')
+    assert cache.metrics()['misses'] == 2
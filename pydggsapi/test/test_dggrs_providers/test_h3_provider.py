@@ -0,0 +1,79 @@
+import geopandas as gpd
+import h3
+import numpy as np
+import pytest
+import shapely
+
+from pydggsapi.dependencies.dggrs_providers.h3_dggrs_provider import H3Provider, h3int_to_h3textual, h3textual_to_h3int
+
+provider = H3Provider()
+parent = '85283473fffffff'
+
+
+def test_h3_textual_int():
+    cells = h3.cell_to_children(parent, 8) + ['8001fffffffffff', '8f283473fffffff'.upper()]
+    ints = h3textual_to_h3int(cells)
+    assert ints.dtype == np.uint64 and ints.tolist() == [h3.str_to_int(c) for c in cells]
+    assert h3int_to_h3textual(ints) == [c.lower() for c in cells]
+    assert provider.zone_id_to_textual([str(i) for i in ints[:2]], 'int', 8) == cells[:2]
+    assert provider.zone_id_keys(['not-a-zone']) is None
+    assert h3int_to_h3textual([]) == [] and len(h3textual_to_h3int([])) == 0
+
+
+def test_h3_zone_level():
+    assert provider.get_cells_zone_level([parent, h3.cell_to_children(parent, 9)[0]]).tolist() == [5, 9]
+    with pytest.raises(Exception):
+        provider.get_cells_zone_level(['85283473ffffff0'])
+
+
+@pytest.mark.parametrize('geometry', ['zone-region', 'zone-centroid'])
+def test_h3_children_geometry(geometry):
+    children = h3.cell_to_children(parent, 7)
+    element = provider.get_relative_zonelevels(parent, 5, [7], geometry).relative_zonelevels[7]
+    assert element.zoneIds == children
+    method, shape = (h3.cell_to_boundary, shapely.Polygon) if (geometry == 'zone-region') else (h3.cell_to_latlng, shapely.Point)
+    expected = [shape([p[::-1] for p in method(c)]) if (shape is shapely.Polygon) else shape(method(c)[::-1]) for c in children]
+    assert all(shapely.equals_exact(element.geometry.to_shapely(), expected, 1e-12))
+
+
+def test_h3_zoneslist():
+    bbox = shapely.box(-122.1, 37.3, -121.9, 37.4)
+    result = provider.zoneslist(bbox, 7, parent, 'zone-region', compact=True, geometry_mode='none')
+    cells = [c for c in h3.h3shape_to_cells_experimental(h3.geo_to_h3shape(bbox), 7, contain='overlap')
+             if (h3.cell_to_parent(c, 5) == parent)]
+    assert sorted(result.zones) == sorted(h3.compact_cells(cells)) and result.geometry is None
+    assert result.returnedAreaMetersSquare == [h3.cell_area(c, 'm^2') for c in result.zones]
+
+
+class FakeIGEO7Provider:
+    # the centroids of the h3 zones 2 levels below stand for the igeo7 centroids
+
+    def __init__(self):
+        self.data = {k: {'Area (km^2)': h3.average_hexagon_area(k + 2, 'km^2')} for k in range(14)}
+        self.calls = []
+
+    def generate_hexcentroid(self, extent, level):
+        self.calls.append(level)
+        cells = h3.h3shape_to_cells_experimental(h3.geo_to_h3shape(extent), level + 2, contain='overlap')
+        return gpd.GeoDataFrame({'name': cells}, geometry=[shapely.Point(h3.cell_to_latlng(c)[::-1]) for c in cells])
+
+
+def test_h3_to_igeo7_conversion():
+    igeo7 = FakeIGEO7Provider()
+    zones = h3.cell_to_children(parent, 7)[:3] + [parent, h3.cell_to_children(parent, 7)[0]]
+    targets, levels = {}, {}
+    for z in zones:
+        levels[z] = next(k for k, v in igeo7.data.items() if (h3.cell_area(z, 'km^2') > v['Area (km^2)']))
+        extent = shapely.box(*shapely.Polygon([p[::-1] for p in h3.cell_to_boundary(z)]).bounds)
+        targets[z] = [c for c in igeo7.generate_hexcentroid(extent, levels[z])['name']
+                      if (h3.latlng_to_cell(*h3.cell_to_latlng(c), h3.get_resolution(z)) == z)]
+    igeo7.calls = []
+    provider = H3Provider()
+    result = provider._convert_to_igeo7(zones, igeo7)
+    assert result.zoneIds == [z for z in zones for _ in targets[z]]
+    assert result.target_zoneIds == [c for z in zones for c in targets[z]]
+    assert result.target_res == [levels[z] for z in zones for _ in targets[z]]
+    # one DGGRID run per level pair, then memoized
+    assert sorted(igeo7.calls) == sorted(set(levels.values()))
+    assert provider._convert_to_igeo7(zones[::-1], igeo7).target_zoneIds == [c for z in zones[::-1] for c in targets[z]]
+    assert len(igeo7.calls) == 2
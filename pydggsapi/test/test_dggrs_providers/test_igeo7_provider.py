@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+import shapely
+
+from pydggsapi.dependencies.dggrs_providers.igeo7_dggrs_provider import IGEO7Provider
+from pydggsapi.dependencies.dggrs_providers.z7_index import z7_children, z7_keys_to_textual, z7_textual_to_keys
+from pydggsapi.schemas.api.dggrs_providers import ZonesGeometry
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    monkeypatch.setenv('DGGRID_PATH', '/nonexistent/dggrid')
+    provider = IGEO7Provider()
+    provider.geometry_calls = []
+    # the zones of the bbox are the descendants of 0801 and 00, without the ones of 08016
+
+    def cellids_from_extent(clip_geom, zoomlevel):
+        keys = z7_children(z7_textual_to_keys(['0801', '00']), zoomlevel)[0]
+        return pd.DataFrame({'name': [z for z in z7_keys_to_textual(keys) if (not z.startswith('08016'))]})
+
+    def zones_geometry(cellIds, returngeometry):
+        provider.geometry_calls.append(list(cellIds))
+        return ZonesGeometry([shapely.Point(len(c), 0) for c in cellIds])
+
+    monkeypatch.setattr(provider, 'cellids_from_extent', cellids_from_extent)
+    monkeypatch.setattr(provider, '_zones_geometry', zones_geometry)
+    monkeypatch.setattr(provider.dggrid_pool, 'worker', None)
+    return provider
+
+
+def test_zoneslist_compact(provider):
+    result = provider.zoneslist(shapely.box(0, 0, 1, 1), 4, None, 'zone-centroid', compact=True)
+    expected = ['00', '08010', '08011', '08012', '08013', '08014', '08015']
+    assert sorted(result.zones) == expected
+    # the geometry of the compacted zones is fetched once
+    assert provider.geometry_calls == [result.zones]
+    area = dict(zip(result.zones, result.returnedAreaMetersSquare))
+    assert area['00'] == provider.data[0]['Area (km^2)'] * 1000000
+    assert area['08010'] == provider.data[3]['Area (km^2)'] * 1000000
+
+
+def test_zoneslist_parent_zone(provider):
+    result = provider.zoneslist(shapely.box(0, 0, 1, 1), 4, '0801', 'zone-region', compact=True, geometry_mode='none')
+    assert sorted(result.zones) == ['08010', '08011', '08012', '08013', '08014', '08015'] and result.geometry is None
+    assert provider.geometry_calls == []
+    result = provider.zoneslist(None, 3, '080', 'zone-region', compact=False, geometry_mode='none')
+    # pentagon: 6 children, 1 pentagon and 5 hexagons at the next level
+    assert len(result.zones) == 6 + 5 * 7
+    assert provider.zoneslist(None, 3, '080', 'zone-region', compact=True, geometry_mode='none').zones == ['080']
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from pydggsapi.dependencies.dggrs_providers.igeo7_dggrs_provider import IGEO7Provider, z7textual_to_z7int
+from pydggsapi.dependencies.dggrs_providers.z7_index import (
+    z7_children,
+    z7_compact,
+    z7_hexstring_to_keys,
+    z7_is_pentagon,
+    z7_keys_to_hexstring,
+    z7_keys_to_textual,
+    z7_parent,
+    z7_resolution,
+    z7_textual_to_keys,
+    z7_to_uint64,
+)
+
+zones = ['08', '0800432', '11', '00000', '0123456012345601234560']
+
+
+def test_z7_textual_keys():
+    keys = z7_textual_to_keys(zones)
+    assert keys.tolist() == [z7textual_to_z7int(z) for z in zones]
+    assert z7_keys_to_textual(keys) == zones
+    assert z7_resolution(keys).tolist() == [0, 5, 0, 3, 20]
+    assert z7_keys_to_textual(z7_parent(keys[1:2], 3)) == ['08004']
+    assert z7_is_pentagon(keys).tolist() == [True, False, True, True, False]
+    for invalid in ['12', '0', '08a', '0870', '08 1', '']:
+        with pytest.raises(ValueError):
+            z7_textual_to_keys([invalid])
+
+
+def test_z7_hexstring():
+    values = [0, 1, 0x803fffffffffffff, 2 ** 64 - 1, 0x10]
+    hexstrings = z7_keys_to_hexstring(np.array(values, dtype=np.uint64))
+    assert hexstrings == [hex(v) for v in values]
+    assert z7_hexstring_to_keys(hexstrings).tolist() == values
+    assert z7_hexstring_to_keys(['803FFFFFFFFFFFFF', '0x0000803fffffffffffff']).tolist() == [values[2]] * 2
+    for invalid in ['0x', '', '0x1g', '0x' + 'f' * 17]:
+        with pytest.raises(ValueError):
+            z7_hexstring_to_keys([invalid])
+    # the int64 columns hold the keys of the base cells 8 to 11 as negative values
+    assert z7_to_uint64(np.array([-1])).tolist() == [2 ** 64 - 1] and z7_to_uint64([2 ** 63 + 5]).tolist() == [2 ** 63 + 5]
+    assert z7_to_uint64([-1, 2 ** 63 + 5]).tolist() == [2 ** 64 - 1, 2 ** 63 + 5]
+    assert z7_to_uint64(np.array([-1, 5], dtype=object)).tolist() == [2 ** 64 - 1, 5] and z7_to_uint64(['5']).tolist() == [5]
+
+
+def test_igeo7_zone_id_repr(monkeypatch):
+    monkeypatch.setenv('DGGRID_PATH', '/nonexistent/dggrid')
+    provider = IGEO7Provider()
+    ints = provider.zone_id_from_textual(zones, 'int')
+    assert ints == [z7textual_to_z7int(z) for z in zones]
+    assert provider.zone_id_from_textual(zones, 'hexstring') == [hex(i) for i in ints]
+    assert provider.zone_id_to_textual(ints, 'int', 20) == zones
+    assert provider.zone_id_to_textual(np.array(ints, dtype=np.uint64).astype(np.int64), 'int', 3) == [z[:5] for z in zones]
+    assert provider.zone_id_to_textual([hex(i) for i in ints], 'hexstring', 20) == zones
+    assert provider.zone_id_keys(zones).tolist() == ints and provider.zone_id_keys(['99']) is None
+
+
+def _children(zone, level):
+    children, owners = z7_children(z7_textual_to_keys([zone]), level)
+    return z7_keys_to_textual(children)
+
+
+def test_z7_children():
+    # the pentagons skip the digit 2 (base cells 0 to 5) or 5 (base cells 6 to 11)
+    assert _children('03', 1) == ['030', '031', '033', '034', '035', '036']
+    assert _children('080', 2) == ['0800', '0801', '0802', '0803', '0804', '0806']
+    assert _children('0801', 4) == [f'0801{a}{b}' for a in range(7) for b in range(7)]
+    assert len(_children('00', 3)) == 6 + 5 * 7 + 35 * 7
+    children, owners = z7_children(z7_textual_to_keys(['0801', '00', '08012']), 4)
+    assert np.bincount(owners).tolist() == [49, 2001, 7]
+    assert all(c.startswith(['0801', '00', '08012'][o]) for c, o in zip(z7_keys_to_textual(children), owners))
+    with pytest.raises(ValueError):
+        z7_children(z7_textual_to_keys(['0801']), 1)
+
+
+def test_z7_compact():
+    keys = z7_children(z7_textual_to_keys(['00', '0801']), 5)[0]
+    assert z7_keys_to_textual(z7_compact(keys)) == ['00', '0801']
+    partial = z7_keys_to_textual(z7_compact(keys[:-1]))
+    assert '00' in partial and '08016' not in partial and len(partial) == 1 + 6 + 6 + 6
+    assert z7_keys_to_textual(z7_compact(z7_textual_to_keys(['080', '081', '082', '083', '084', '086']))) == ['08']
+
+
+def test_igeo7_children_without_dggrid(monkeypatch):
+    monkeypatch.setenv('DGGRID_PATH', '/nonexistent/dggrid')
+    provider = IGEO7Provider()
+    monkeypatch.setattr(provider.dggrid_pool, 'worker', None)
+    result = provider.get_relative_zonelevels('0801', 2, [3, 4], None).relative_zonelevels
+    assert result[3].zoneIds == _children('0801', 3) and result[3].geometry is None
+    assert len(result[4].zoneIds) == 49
+    batch = provider.get_relative_zonelevels_batch(['081', '080'], 1, [2], None)
+    assert batch['080'].relative_zonelevels[2].zoneIds == ['0800', '0801', '0802', '0803', '0804', '0806']
+    assert batch['081'].relative_zonelevels[2].zoneIds == _children('081', 2)
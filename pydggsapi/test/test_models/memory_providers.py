@@ -0,0 +1,109 @@
+# In-memory DGGRS and collection providers shared by the model tests
+from dataclasses import dataclass
+import numpy as np
+
+from pydggsapi.dependencies.collections_providers.abstract_collection_provider import (
+    AbstractCollectionProvider,
+    AbstractDatasourceInfo,
+)
+from pydggsapi.dependencies.dggrs_providers.abstract_dggrs_provider import AbstractDGGRSProvider
+from pydggsapi.schemas.api.collection_providers import CollectionProviderGetDataDictReturn, CollectionProviderGetDataReturn
+from pydggsapi.schemas.api.collections import Collection
+from pydggsapi.schemas.api.dggrs_providers import (
+    DGGRSProviderGetRelativeZoneLevelsReturn,
+    DGGRSProviderZonesElement,
+    DGGRSProviderZonesListReturn,
+)
+from pydggsapi.schemas.ogc_dggs.dggrs_descrption import DggrsDescription
+from pydggsapi.schemas.ogc_dggs.common_ogc_dggs_api import GeoJSONPoint
+
+
+class PrefixDGGRSProvider(AbstractDGGRSProvider):
+    # textual zone IDs where the children append a digit (0-2) to the parent ID
+
+    def __init__(self):
+        self.batch_calls = 0
+        self.zoneslist_calls = 0
+        self.geometry_zones = []
+
+    def zone_id_from_textual(self, cellIds, zone_id_repr):
+        return [int(c) for c in cellIds] if (zone_id_repr == 'int') else cellIds
+
+    def zone_id_to_textual(self, cellIds, zone_id_repr, refinement_level=None):
+        return cellIds
+
+    def get_cls_by_zone_level(self, zone_level):
+        return 1.0
+
+    def get_zone_level_by_cls(self, cls_km):
+        return 1
+
+    def get_cells_zone_level(self, cellIds):
+        return np.array([len(c) for c in cellIds], dtype=np.int8)
+
+    def get_relative_zonelevels(self, cellId, base_level, zone_levels, geometry='zone-region'):
+        children = {}
+        for z in zone_levels:
+            ids = [cellId]
+            for _ in range(z - base_level):
+                ids = [f'{i}{d}' for i in ids for d in '012']
+            children[z] = DGGRSProviderZonesElement(zoneIds=ids, geometry=None)
+        return DGGRSProviderGetRelativeZoneLevelsReturn(relative_zonelevels=children)
+
+    def get_relative_zonelevels_batch(self, cellIds, base_level, zone_levels, geometry='zone-region'):
+        self.batch_calls += 1
+        return super().get_relative_zonelevels_batch(cellIds, base_level, zone_levels, geometry)
+
+    def zoneslist(self, bbox, zone_level, parent_zone, returngeometry, compact=True, geometry_mode='eager'):
+        self.zoneslist_calls += 1
+        zoneIds = self.get_relative_zonelevels(parent_zone, len(parent_zone), [zone_level]).relative_zonelevels[zone_level].zoneIds
+        geometry = self.zones_geometry(zoneIds) if (geometry_mode == 'eager') else None
+        result = DGGRSProviderZonesListReturn(zones=zoneIds, geometry=geometry, returnedAreaMetersSquare=[1.0] * len(zoneIds))
+        if (geometry_mode == 'lazy'):
+            result.set_geometry_loader(self.zones_geometry)
+        return result
+
+    def zones_geometry(self, zoneIds):
+        # the point of a zone is its ID as a number
+        self.geometry_zones += list(zoneIds)
+        return [GeoJSONPoint(type='Point', coordinates=[float(z), 0.0]) for z in zoneIds]
+
+    def zonesinfo(self, cellIds):
+        raise NotImplementedError
+
+    def convert(self, zoneIds, targetdggrs, zone_id_repr='textual'):
+        raise NotImplementedError
+
+
+@dataclass
+class MemoryDatasourceInfo(AbstractDatasourceInfo):
+    pass
+
+
+class MemoryCollectionProvider(AbstractCollectionProvider):
+    # the value of a zone is its ID as a number, zones ending with '2' have no data
+
+    def __init__(self):
+        self.datasources = {'ds': MemoryDatasourceInfo()}
+        self.calls = []
+
+    def get_data(self, zoneIds, res, datasource_id, cql_filter=None, include_datetime=False,
+                 include_properties=None, exclude_properties=None, input_zoneIds_padding=True):
+        self.calls.append((res, list(zoneIds)))
+        zoneIds = [z for z in zoneIds if (not z.endswith('2'))]
+        return CollectionProviderGetDataReturn(zoneIds=zoneIds, cols_meta={'v': 'float64'},
+                                               data=[[float(z)] for z in zoneIds])
+
+    def get_datadictionary(self, datasource_id, include_zone_id=True):
+        return CollectionProviderGetDataDictReturn(data={'v': 'float64'})
+
+
+dggrs_desc = DggrsDescription(**{
+    'id': 'prefix', 'title': 'prefix', 'description': 'prefix', 'uri': 'https://example.com/dggs/prefix', 'crs': 'EPSG:4326',
+    'defaultDepth': 1, 'maxRefinementLevel': 9, 'maxRelativeDepth': 2,
+    'links': [{'href': 'https://example.com/dggs/prefix', 'rel': '[ogc-rel:dggrs-definition]'}],
+})
+collections = {'c': Collection(id='c', title='c', collection_provider={
+    'providerId': 'memory', 'dggrsId': 'prefix', 'max_refinement_level': 9, 'min_refinement_level': 0,
+    'datasource_id': 'ds',
+})}
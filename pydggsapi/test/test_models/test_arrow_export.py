@@ -0,0 +1,66 @@
+import asyncio
+import io
+import json
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+import shapely
+
+from pydggsapi.models.ogc_dggs.arrow_export import zone_data_columnar_response
+from pydggsapi.schemas.ogc_dggs.dggrs_zones_data import zone_data_arrow_returntype, zone_data_parquet_returntype
+
+
+def _data(with_geometry):
+    level_3 = pd.DataFrame({'zoneId': ['0001'], 'c.a': [1.5], 'c.b': ['x']}).set_index('zoneId')
+    level_4 = pd.DataFrame({'zoneId': ['00010', '00011'], 'c.a': [np.nan, 2.0]}).set_index('zoneId')
+    if (with_geometry):
+        level_3 = gpd.GeoDataFrame(level_3, geometry=[shapely.box(0, 0, 2, 2)])
+        level_4 = gpd.GeoDataFrame(level_4, geometry=[shapely.box(0, 0, 1, 1), shapely.box(1, 1, 2, 2)])
+    return {3: level_3, 4: level_4}
+
+
+async def _consume(response):
+    return b''.join([chunk async for chunk in response.body_iterator])
+
+
+def test_arrow_stream():
+    response = zone_data_columnar_response(_data(False), 3, ['c.a', 'c.b'], zone_data_arrow_returntype)
+    assert response.media_type == zone_data_arrow_returntype
+    table = pa.ipc.open_stream(asyncio.run(_consume(response))).read_all()
+    assert table.column_names == ['zoneId', 'depth', 'c.a', 'c.b']
+    assert table.column('zoneId').to_pylist() == ['0001', '00010', '00011']
+    assert table.column('depth').to_pylist() == [0, 1, 1]
+    # NaN and missing columns are nulls
+    assert table.column('c.a').to_pylist() == [1.5, None, 2.0]
+    assert table.column('c.b').to_pylist() == ['x', None, None]
+
+
+@pytest.mark.parametrize('with_geometry', [False, True])
+def test_geoparquet(with_geometry):
+    response = zone_data_columnar_response(_data(with_geometry), 3, ['c.a', 'c.b'], zone_data_parquet_returntype,
+                                           'zone-region' if (with_geometry) else None)
+    assert response.media_type == zone_data_parquet_returntype
+    table = pq.read_table(io.BytesIO(response.body))
+    assert table.column('c.a').to_pylist() == [1.5, None, 2.0]
+    if (not with_geometry):
+        assert 'geometry' not in table.column_names
+        return
+    assert table.column_names[-1] == 'geometry'
+    geo = json.loads(table.schema.metadata[b'geo'])
+    assert geo['primary_column'] == 'geometry'
+    assert geo['columns']['geometry']['geometry_types'] == ['Polygon']
+    assert geo['columns']['geometry']['bbox'] == [0.0, 0.0, 2.0, 2.0]
+    assert shapely.from_wkb(table.column('geometry').to_pylist()[1]).equals(shapely.box(0, 0, 1, 1))
+
+
+def test_datetime():
+    dates = pd.to_datetime(['2020-01-01', '2021-01-01'], utc=True)
+    level = pd.DataFrame({'zoneId': ['0001', '0001'], 'datetime': dates, 'c.a': [1.0, 2.0]}).set_index(['zoneId', 'datetime'])
+    response = zone_data_columnar_response({3: level}, 3, ['c.a'], zone_data_parquet_returntype)
+    table = pq.read_table(io.BytesIO(response.body))
+    assert table.column_names == ['zoneId', 'depth', 'datetime', 'c.a']
+    assert table.column('datetime').to_pylist()[1].year == 2021
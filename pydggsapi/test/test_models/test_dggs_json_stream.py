@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from pydggsapi.models.ogc_dggs.dggs_json_stream import DggsJsonStreamWriter, DggsJsonValue
+from pydggsapi.schemas.ogc_collections.schema import Property
+from pydggsapi.schemas.ogc_dggs.dggrs_zones_data import (
+    Dimension,
+    DimensionGrid,
+    Schema,
+    Shape,
+    ZonesDataDggsJsonResponse,
+)
+
+
+def _envelope(dimensions=None):
+    return ZonesDataDggsJsonResponse(
+        dggrs='https://example.com/dggs/igeo7',
+        zoneId='0001',
+        depths=[0, 1],
+        schema=Schema(properties={'c.a': Property(type='number'), 'c.b': Property(type='string')}, id_=None),
+        dimensions=dimensions,
+        values={},
+    )
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 1000])
+@pytest.mark.parametrize('dimensions', [
+    None,
+    [Dimension(name='datetime', interval=['2020', '2021'], grid=DimensionGrid(cellsCount=2, coordinates=['2020', '2021']))],
+])
+def test_byte_compatible(chunk_size, dimensions):
+    values = {
+        'c.a': [
+            DggsJsonValue(depth=0, shape=Shape(count=1, subZones=1), data=np.array([1.5])),
+            DggsJsonValue(depth=1, shape=Shape(count=3, subZones=3, dimensions={}),
+                          data=np.array([np.nan, 2.0, np.inf])),
+        ],
+        'c.b': [
+            DggsJsonValue(depth=0, shape=Shape(count=1, subZones=1), data=np.array(['é'], dtype=object)),
+            DggsJsonValue(depth=1, shape=Shape(count=3, subZones=3, dimensions={}),
+                          data=np.array(['x', np.nan, 3], dtype=object)),
+        ],
+    }
+    writer = DggsJsonStreamWriter(_envelope(dimensions), values, chunk_size=chunk_size)
+    expected = JSONResponse(content=jsonable_encoder(writer.to_model())).body
+    assert b''.join(writer) == expected
+
+
+def test_empty_values():
+    writer = DggsJsonStreamWriter(_envelope(), {})
+    assert b''.join(writer) == JSONResponse(content=jsonable_encoder(writer.to_model())).body
@@ -0,0 +1,32 @@
+import numpy as np
+
+from memory_providers import MemoryCollectionProvider, PrefixDGGRSProvider, collections, dggrs_desc
+from pydggsapi.models.ogc_dggs.zone_query import query_zones_list
+
+
+class ProbeCollectionProvider(MemoryCollectionProvider):
+    # existence probe without property reads
+
+    def __init__(self):
+        super().__init__()
+        self.probes = []
+
+    def get_data(self, *args, **kwargs):
+        raise AssertionError('the properties must not be read')
+
+    def has_data(self, zoneIds, res, datasource_id, cql_filter=None, include_datetime=False):
+        self.probes.append((res, list(zoneIds)))
+        return np.array([z for z in zoneIds if (not z.endswith('2'))])
+
+
+def test_has_data_default():
+    # falls back to get_data
+    assert MemoryCollectionProvider().has_data(['10', '11', '12', '10'], 2, 'ds').tolist() == ['10', '11']
+
+
+def test_zones_list_uses_has_data():
+    collection_provider = ProbeCollectionProvider()
+    result = query_zones_list(None, 3, 10, dggrs_desc, PrefixDGGRSProvider(), collections,
+                              {'memory': collection_provider}, False, '1', 'application/json', 'zone-centroid')
+    assert result.zones == ['100', '101', '110', '111', '120', '121']
+    assert collection_provider.probes == [(3, ['100', '101', '102', '110', '111', '112', '120', '121', '122'])]
@@ -0,0 +1,125 @@
+import threading
+import numpy as np
+import pytest
+
+import pydggsapi.dependencies.api.presence_index as presence_index
+from memory_providers import MemoryCollectionProvider, PrefixDGGRSProvider, dggrs_desc
+from pydggsapi.dependencies.api.presence_index import (
+    ZonePresenceBitmap,
+    build_presence_index,
+    get_presence_bitmap,
+    get_presence_index_path,
+)
+from pydggsapi.models.ogc_dggs.zone_query import query_zones_list
+from pydggsapi.schemas.api.collections import Collection
+from pydggsapi.schemas.api.collection_providers import CollectionProviderGetVersionReturn
+
+
+def _collection(presence_index):
+    return Collection(id='c', title='c', collection_provider={
+        'providerId': 'memory', 'dggrsId': 'prefix', 'max_refinement_level': 9, 'min_refinement_level': 0,
+        'datasource_id': 'ds', 'presence_index': presence_index,
+    })
+
+
+class IndexedCollectionProvider(MemoryCollectionProvider):
+
+    def __init__(self, zoneIds):
+        super().__init__()
+        self.zoneIds = zoneIds
+        self.version = 'v1'
+        self.builds = 0
+
+    def has_data(self, *args, **kwargs):
+        raise AssertionError('the datasource must not be queried')
+
+    def get_zone_ids(self, res, datasource_id):
+        self.builds += 1
+        return np.array([z for z in self.zoneIds if (len(z) == res)])
+
+    def get_version(self, datasource_id):
+        return CollectionProviderGetVersionReturn(version=self.version)
+
+
+@pytest.fixture(autouse=True)
+def _reset(monkeypatch, tmp_path):
+    monkeypatch.setattr(presence_index, '_bitmaps', {})
+    monkeypatch.setattr(presence_index, '_build_locks', {})
+    monkeypatch.setenv('PRESENCE_INDEX_DIR', str(tmp_path))
+    monkeypatch.setenv('PRESENCE_INDEX_CHECK_INTERVAL', '0')
+
+
+@pytest.mark.parametrize('size', [0, 10, 100000])
+def test_bitmap_contains(tmp_path, size):
+    rng = np.random.default_rng(0)
+    # dense (bitset) and sparse (array) containers
+    keys = np.concatenate([rng.integers(0, 1 << 18, size), rng.integers(0, np.iinfo(np.int64).max, size)]).astype(np.uint64)
+    probe = np.concatenate([keys, rng.integers(0, 1 << 18, 1000).astype(np.uint64), np.array([0, 2 ** 64 - 1], dtype=np.uint64)])
+    bitmap = ZonePresenceBitmap.from_keys(keys)
+    assert len(bitmap) == len(np.unique(keys))
+    expected = np.isin(probe, keys)
+    np.testing.assert_array_equal(bitmap.contains(probe), expected)
+    bitmap.save(str(tmp_path / 'b.npz'), 'v1')
+    loaded, version = ZonePresenceBitmap.load(str(tmp_path / 'b.npz'))
+    assert version == 'v1'
+    np.testing.assert_array_equal(loaded.contains(probe), expected)
+
+
+def test_lazy_presence_index(tmp_path):
+    cp = IndexedCollectionProvider(['100', '121', '1210'])
+    result = query_zones_list(None, 3, 10, dggrs_desc, PrefixDGGRSProvider(), {'c': _collection('lazy')},
+                              {'memory': cp}, False, '1', 'application/json', 'zone-centroid')
+    assert result.zones == ['100', '121']
+    assert (tmp_path / 'c' / '3.npz').exists()
+    # reused while the version of the datasource is the same, rebuilt when it changes
+    get_presence_bitmap('c', _collection('lazy'), cp, PrefixDGGRSProvider(), 3)
+    assert cp.builds == 1
+    cp.version, cp.zoneIds = 'v2', ['101']
+    bitmap = get_presence_bitmap('c', _collection('lazy'), cp, PrefixDGGRSProvider(), 3)
+    assert cp.builds == 2 and bitmap.contains(np.array([100, 101], dtype=np.uint64)).tolist() == [False, True]
+
+
+def test_prebuilt_presence_index(tmp_path, monkeypatch):
+    cp = IndexedCollectionProvider(['100'])
+    # missing index, the datasource is queried
+    assert get_presence_bitmap('c', _collection('prebuilt'), cp, PrefixDGGRSProvider(), 3) is None
+    ZonePresenceBitmap.from_keys(np.array([100], dtype=np.uint64)).save(get_presence_index_path('c', 3), 'v1')
+    assert get_presence_bitmap('c', _collection('prebuilt'), cp, PrefixDGGRSProvider(), 3) is not None
+    # outdated
+    cp.version = 'v2'
+    assert get_presence_bitmap('c', _collection('prebuilt'), cp, PrefixDGGRSProvider(), 3) is None
+    assert cp.builds == 0
+
+
+def test_presence_index_without_index():
+    assert get_presence_bitmap('c', _collection(None), IndexedCollectionProvider([]), PrefixDGGRSProvider(), 3) is None
+
+
+def test_build_presence_index(tmp_path):
+    cp = IndexedCollectionProvider(['100', '1210'])
+    paths = build_presence_index({'c': _collection('prebuilt'), 'd': _collection(None)}, {'memory': cp},
+                                 {'prefix': PrefixDGGRSProvider()}, str(tmp_path / 'out'), levels=[3, 4])
+    assert paths == [str(tmp_path / 'out' / 'c' / '3.npz'), str(tmp_path / 'out' / 'c' / '4.npz')]
+    bitmap, version = ZonePresenceBitmap.load(paths[1])
+    assert version == 'v1' and len(bitmap) == 1
+
+
+def test_presence_index_rebuild_not_blocking():
+    cp = IndexedCollectionProvider(['100'])
+    bitmap = get_presence_bitmap('c', _collection('lazy'), cp, PrefixDGGRSProvider(), 3)
+    started, release = threading.Event(), threading.Event()
+
+    def get_version(datasource_id):
+        started.set()
+        release.wait(5)
+        return CollectionProviderGetVersionReturn(version='v1')
+
+    cp.get_version = get_version
+    thread = threading.Thread(target=get_presence_bitmap, args=('c', _collection('lazy'), cp, PrefixDGGRSProvider(), 3))
+    thread.start()
+    started.wait(5)
+    # the previous bitmap is returned while the version is checked, the other levels are not locked
+    assert get_presence_bitmap('c', _collection('lazy'), cp, PrefixDGGRSProvider(), 3) is bitmap
+    assert get_presence_bitmap('c', _collection('lazy'), IndexedCollectionProvider(['1000']), PrefixDGGRSProvider(), 4) is not None
+    release.set()
+    thread.join()
@@ -0,0 +1,43 @@
+import asyncio
+import io
+import zipfile
+
+import numpy as np
+import pytest
+import xarray as xr
+import zarr
+
+from pydggsapi.models.ogc_dggs.zarr_zip import get_zarr_encoding, zarr_zip_response
+from pydggsapi.schemas.api.collections import ZarrCompressor
+
+
+def _datatree():
+    ds = xr.Dataset({'c.a': (('zoneId',), np.arange(100, dtype='float64'))},
+                    coords={'zoneId': [f'{i:04d}' for i in range(100)]})
+    return xr.DataTree().assign({'zone_level_3': xr.DataTree(ds)})
+
+
+async def _consume(response):
+    body = b''.join([chunk async for chunk in response.body_iterator])
+    await response.background()
+    return body
+
+
+@pytest.mark.parametrize('spool_max_bytes', [1 << 20, 16])
+def test_zarr_zip_response(tmp_path, monkeypatch, spool_max_bytes):
+    scratch = tmp_path / 'scratch'
+    monkeypatch.setenv('ZARR_ZIP_SPOOL_MAX_BYTES', str(spool_max_bytes))
+    monkeypatch.setenv('ZARR_ZIP_SCRATCH_DIR', str(scratch))
+    encoding = {'/zone_level_3': {'c.a': get_zarr_encoding(ZarrCompressor(cname='lz4', clevel=5, shuffle='shuffle'))}}
+    response = zarr_zip_response(_datatree(), encoding)
+    assert response.media_type == 'application/zarr+zip'
+    body = asyncio.run(_consume(response))
+    assert int(response.headers['content-length']) == len(body)
+    # the scratch file is removed once the response is sent
+    assert list(scratch.iterdir()) == []
+    path = tmp_path / 'out.zip'
+    path.write_bytes(body)
+    with zipfile.ZipFile(io.BytesIO(body)) as zf:
+        assert zf.testzip() is None
+    result = xr.open_datatree(zarr.storage.ZipStore(str(path), mode='r'), engine='zarr')
+    np.testing.assert_array_equal(result['zone_level_3']['c.a'].values, np.arange(100, dtype='float64'))
@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+from starlette.requests import Request
+
+from memory_providers import MemoryCollectionProvider, PrefixDGGRSProvider, collections, dggrs_desc
+from pydggsapi.models.ogc_dggs.data_retrieval import query_zone_data, query_zones_data_batch, query_zones_data_batch_levels
+
+
+request = Request({'type': 'http', 'method': 'POST', 'scheme': 'http', 'server': ('localhost', 80),
+                   'path': '/collections/c/dggs/prefix/zones/data', 'query_string': b'', 'headers': []})
+
+
+async def _consume(response):
+    return b''.join([chunk async for chunk in response.body_iterator])
+
+
+def test_zones_data_batch():
+    dggrs_provider, collection_provider = PrefixDGGRSProvider(), MemoryCollectionProvider()
+    response = query_zones_data_batch(request, ['11', '22'], 2, [2, 3], dggrs_desc, dggrs_provider, collections,
+                                      {'memory': collection_provider}, returngeometry=None)
+    result = json.loads(asyncio.run(_consume(response)))
+    # a single provider pass and a single get_data per zone level for all the zones
+    assert dggrs_provider.batch_calls == 1
+    assert collection_provider.calls == [(2, ['11', '22']), (3, ['110', '111', '112', '220', '221', '222'])]
+    assert list(result['zones'].keys()) == ['11', '22']
+    # same document as the single zone request
+    for zoneId in ['11', '22']:
+        single = query_zone_data(request, zoneId, 2, [2, 3], dggrs_desc, PrefixDGGRSProvider(), collections,
+                                 {'memory': MemoryCollectionProvider()}, returngeometry=None)
+        assert result['zones'][zoneId] == json.loads(asyncio.run(_consume(single)))
+    assert result['zones']['11']['values']['c.v'][1]['data'] == [110.0, 111.0, None]
+
+
+def test_zones_data_batch_without_data():
+    response = query_zones_data_batch(request, ['11', '12'], 2, [2], dggrs_desc, PrefixDGGRSProvider(), collections,
+                                      {'memory': MemoryCollectionProvider()}, returngeometry=None)
+    result = json.loads(asyncio.run(_consume(response)))
+    assert result['zones']['12'] is None
+    assert result['zones']['11']['values']['c.v'][0]['data'] == [11.0]
+
+
+def test_zones_data_batch_mixed_levels():
+    dggrs_provider, collection_provider = PrefixDGGRSProvider(), MemoryCollectionProvider()
+    zoneIds = ['111', '11', '22']
+    zone_levels = dggrs_provider.get_cells_zone_level(zoneIds)
+    assert zone_levels.dtype == 'int8' and zone_levels.tolist() == [3, 2, 2]
+    levels = []
+
+    def level_collections(level, zoneId):
+        levels.append((level, zoneId))
+        return collections
+    response = query_zones_data_batch_levels(request, zoneIds, [0, 1], dggrs_desc, dggrs_provider, level_collections,
+                                             {'memory': collection_provider}, returngeometry=None)
+    result = json.loads(asyncio.run(_consume(response)))
+    # one batch per refinement level, the zones in the order of the request
+    assert dggrs_provider.batch_calls == 2
+    assert sorted(collection_provider.calls) == [(2, ['11', '22']), (3, ['110', '111', '112', '220', '221', '222']),
+                                                 (3, ['111']), (4, ['1110', '1111', '1112'])]
+    assert list(result['zones'].keys()) == zoneIds and levels == [(3, '111'), (2, '11')]
+    single = query_zone_data(request, '111', 3, [3, 4], dggrs_desc, PrefixDGGRSProvider(), collections,
+                             {'memory': MemoryCollectionProvider()}, returngeometry=None)
+    assert result['zones']['111'] == json.loads(asyncio.run(_consume(single)))
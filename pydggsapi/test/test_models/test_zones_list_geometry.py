@@ -0,0 +1,33 @@
+import pytest
+
+from memory_providers import MemoryCollectionProvider, PrefixDGGRSProvider, collections, dggrs_desc
+from pydggsapi.models.ogc_dggs.zone_query import query_zones_list
+
+
+def _query(dggrs_provider, returntype, limit=3, offset=0):
+    return query_zones_list(None, 3, limit, dggrs_desc, dggrs_provider, collections,
+                            {'memory': MemoryCollectionProvider()}, False, '1', returntype, 'zone-centroid', offset=offset)
+
+
+@pytest.mark.parametrize('returntype', ['application/json', 'application/x-binary'])
+def test_zones_list_without_geometry(returntype):
+    dggrs_provider = PrefixDGGRSProvider()
+    assert _query(dggrs_provider, returntype) is not None
+    assert dggrs_provider.geometry_zones == []
+
+
+def test_zones_list_geometry_of_the_page():
+    dggrs_provider = PrefixDGGRSProvider()
+    result = _query(dggrs_provider, 'application/geo+json', limit=2, offset=1)
+    assert [f.properties['zoneId'] for f in result.features] == ['101', '110']
+    assert [f.geometry.coordinates[0] for f in result.features] == [101.0, 110.0]
+    assert dggrs_provider.geometry_zones == ['101', '110']
+
+
+def test_zones_list_geometry_modes():
+    dggrs_provider = PrefixDGGRSProvider()
+    eager = dggrs_provider.zoneslist(None, 2, '1', 'zone-centroid')
+    lazy = dggrs_provider.zoneslist(None, 2, '1', 'zone-centroid', geometry_mode='lazy')
+    assert lazy.geometry is None and lazy.get_geometry([2, 0]) == eager.get_geometry([2, 0])
+    with pytest.raises(ValueError):
+        dggrs_provider.zoneslist(None, 2, '1', 'zone-centroid', geometry_mode='none').get_geometry([0])
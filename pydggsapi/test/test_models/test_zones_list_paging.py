@@ -0,0 +1,137 @@
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pytest
+from starlette.requests import Request
+
+import pydggsapi.models.ogc_dggs.zone_query as zone_query
+from memory_providers import MemoryCollectionProvider, PrefixDGGRSProvider, collections, dggrs_desc
+from pydggsapi.models.ogc_dggs.zone_query import query_zones_list
+from pydggsapi.schemas.api.collections import Collection
+
+# zones of level 4 under '1', the zones ending with '2' have no data
+expected = [z for z in PrefixDGGRSProvider().zoneslist(None, 4, '1', 'zone-centroid').zones if (not z.endswith('2'))]
+
+
+def _request(query_string):
+    return Request({'type': 'http', 'method': 'GET', 'scheme': 'http', 'server': ('localhost', 80),
+                    'path': '/collections/c/dggs/prefix/zones', 'query_string': query_string.encode(), 'headers': []})
+
+
+class TextualPrefixDGGRSProvider(PrefixDGGRSProvider):
+    # without integer zone IDs
+
+    def zone_id_from_textual(self, cellIds, zone_id_repr):
+        if (zone_id_repr == 'int'):
+            raise ValueError('int representation is not supported')
+        return cellIds
+
+
+class IntMemoryCollectionProvider(MemoryCollectionProvider):
+    # zone IDs stored in integer representation
+
+    def get_data(self, zoneIds, res, datasource_id, cql_filter=None, include_datetime=False,
+                 include_properties=None, exclude_properties=None, input_zoneIds_padding=True):
+        assert all(isinstance(z, int) for z in zoneIds)
+        result = super().get_data([str(z) for z in zoneIds], res, datasource_id)
+        result.zoneIds = [int(z) for z in result.zoneIds]
+        return result
+
+
+@pytest.fixture(autouse=True)
+def _reset(monkeypatch):
+    monkeypatch.setattr(zone_query, '_zones_lists', zone_query.OrderedDict())
+
+
+def _query(query_string, limit, offset=0, cursor=None, returntype='application/json', collection_provider=None,
+           dggrs_provider=None, collections=collections):
+    collection_provider = collection_provider if (collection_provider is not None) else MemoryCollectionProvider()
+    dggrs_provider = dggrs_provider if (dggrs_provider is not None) else PrefixDGGRSProvider()
+    return query_zones_list(None, 4, limit, dggrs_desc, dggrs_provider, collections,
+                            {'memory': collection_provider}, False, '1', returntype, 'zone-centroid',
+                            offset=offset, cursor=cursor, request=_request(query_string))
+
+
+def _next_cursor(links):
+    return parse_qs(urlsplit(links[0].href).query)['cursor'][0]
+
+
+def test_zones_list_cursor_pages(monkeypatch):
+    monkeypatch.setattr(zone_query, 'zones_list_min_window', 4)
+    zones, cursor = [], None
+    while True:
+        result = _query('parent-zone=1&zone-level=4&limit=5', 5, cursor=cursor)
+        zones += result.zones
+        assert result.returnedAreaMetersSquare == len(result.zones)
+        if (result.links is None):
+            break
+        assert result.links[0].rel == 'next'
+        cursor = _next_cursor(result.links)
+    assert zones == expected
+
+
+def test_zones_list_limit_pushdown(monkeypatch):
+    monkeypatch.setattr(zone_query, 'zones_list_min_window', 4)
+    collection_provider = MemoryCollectionProvider()
+    result = _query('parent-zone=1&zone-level=4', 2, offset=1, collection_provider=collection_provider)
+    assert result.zones == expected[1:3]
+    # only the first windows are sent to the provider
+    queried = [z for _, zoneIds in collection_provider.calls for z in zoneIds]
+    assert len(queried) < len(expected)
+
+
+def test_zones_list_geojson_and_binary():
+    result = _query('parent-zone=1&zone-level=4', 3, offset=2, returntype='application/geo+json')
+    assert [f.properties['zoneId'] for f in result.features] == expected[2:5]
+    assert result.links is not None
+    response = _query('parent-zone=1&zone-level=4', 3, returntype='application/x-binary')
+    content = np.frombuffer(response.body, dtype=np.uint64)
+    assert content[0] == 3 and content[1:].tolist() == [int(z) for z in expected[:3]]
+    assert 'rel="next"' in response.headers['link']
+
+
+def test_zones_list_last_page():
+    assert _query('parent-zone=1&zone-level=4', len(expected)).links is None
+    assert _query('parent-zone=1&zone-level=4', 5, offset=len(expected)) is None
+
+
+def test_zones_list_cursor_of_another_query():
+    result = _query('parent-zone=1&zone-level=4', 5)
+    cursor = _next_cursor(result.links)
+    # limit and offset can change between the pages
+    assert _query('parent-zone=1&zone-level=4&limit=2', 2, cursor=cursor).zones == expected[5:7]
+    with pytest.raises(ValueError):
+        _query('parent-zone=1&zone-level=4&filter=v>1', 5, cursor=cursor)
+    with pytest.raises(ValueError):
+        _query('parent-zone=1&zone-level=4', 5, cursor='not-a-cursor')
+
+
+def test_zones_list_without_integer_keys():
+    result = _query('parent-zone=1&zone-level=4', 5, dggrs_provider=TextualPrefixDGGRSProvider())
+    assert result.zones == expected[:5]
+
+
+def test_zones_list_integer_collection():
+    int_collections = {'c': Collection(id='c', title='c', collection_provider={
+        'providerId': 'memory', 'dggrsId': 'prefix', 'max_refinement_level': 9, 'min_refinement_level': 0,
+        'datasource_id': 'ds', 'dggrs_zoneid_repr': 'int',
+    })}
+    result = _query('parent-zone=1&zone-level=4', 5, collection_provider=IntMemoryCollectionProvider(),
+                    collections=int_collections)
+    assert result.zones == expected[:5]
+
+
+def test_zones_list_generated_once(monkeypatch):
+    monkeypatch.setattr(zone_query, 'zones_list_min_window', 4)
+    dggrs_provider = PrefixDGGRSProvider()
+    result = _query('parent-zone=1&zone-level=4&limit=5', 5, dggrs_provider=dggrs_provider)
+    result = _query('parent-zone=1&zone-level=4&limit=5', 5, cursor=_next_cursor(result.links), dggrs_provider=dggrs_provider)
+    assert result.zones == expected[5:10] and dggrs_provider.zoneslist_calls == 1
+    # another query, or the cache disabled
+    _query('parent-zone=1&zone-level=3', 5, dggrs_provider=dggrs_provider)
+    assert dggrs_provider.zoneslist_calls == 2
+    monkeypatch.setenv('ZONES_LIST_CACHE_ZONES', '0')
+    monkeypatch.setattr(zone_query, '_zones_lists', zone_query.OrderedDict())
+    result = _query('parent-zone=1&zone-level=4&limit=5', 5, dggrs_provider=dggrs_provider)
+    _query('parent-zone=1&zone-level=4&limit=5', 5, cursor=_next_cursor(result.links), dggrs_provider=dggrs_provider)
+    assert dggrs_provider.zoneslist_calls == 4
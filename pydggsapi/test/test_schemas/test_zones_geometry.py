@@ -0,0 +1,37 @@
+import pytest
+import shapely
+
+from pydggsapi.schemas.api.dggrs_providers import DGGRSProviderZonesElement, ZonesGeometry
+from pydggsapi.schemas.common_geojson import GeoJSONPoint, GeoJSONPolygon
+
+
+polygons = [shapely.box(0, 0, 1, 1), shapely.Polygon([(1, 1), (2, 1), (1, 2)])]
+
+
+def test_zones_geometry_geojson():
+    geometry = ZonesGeometry(polygons)
+    geojson = geometry.to_geojson()
+    assert all(isinstance(g, GeoJSONPolygon) for g in geojson)
+    assert geojson[1].coordinates == [[(1.0, 1.0), (2.0, 1.0), (1.0, 2.0), (1.0, 1.0)]]
+    assert geojson == [GeoJSONPolygon(**shapely.geometry.mapping(g)) for g in polygons]
+    assert ZonesGeometry.from_geojson(geojson) == geometry
+    points = ZonesGeometry(shapely.points([[0, 1], [2, 3]]))
+    assert points.to_geojson([1]) == [GeoJSONPoint(type='Point', coordinates=(2, 3))]
+    assert ZonesGeometry([shapely.Point(0, 1), polygons[0], None]).to_geojson()[::2] == [GeoJSONPoint(type='Point', coordinates=(0, 1)), None]
+
+
+def test_zones_geometry_positions():
+    geometry = ZonesGeometry(polygons)
+    assert geometry[1] is polygons[1]
+    assert geometry[[1, 0]].to_shapely().tolist() == polygons[::-1]
+    assert len(geometry[[]]) == 0 and geometry[[]].to_geojson() == []
+
+
+def test_zones_element_geometry():
+    # the providers can fill the geometry with shapely or GeoJSON
+    shapely_element = DGGRSProviderZonesElement(zoneIds=['a', 'b'], geometry=polygons)
+    geojson_element = DGGRSProviderZonesElement(zoneIds=['a', 'b'], geometry=ZonesGeometry(polygons).to_geojson())
+    assert isinstance(geojson_element.geometry, ZonesGeometry) and shapely_element.geometry == geojson_element.geometry
+    assert shapely_element.model_dump()['geometry'][0]['type'] == 'Polygon'
+    with pytest.raises(ValueError):
+        DGGRSProviderZonesElement(zoneIds=['a'], geometry=polygons)